@@ -5,23 +5,50 @@ import numpy as np
 import pygame
 import asyncio
 import json
-import base64
 import time
-from typing import Optional, Dict, Any, List, Tuple
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from functools import partial
+from typing import Optional, Dict, Any, List, Set, Tuple
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import mediapipe as mp
 from dotenv import load_dotenv
 
 # NUEVO: pipeline de drowsiness por eventos (parpadeo, micro-sueño, bostezo, pitch, frotado)
 from detection.pipeline import DrowsinessPipeline
+from detection.extract_points.face_mesh_processor import REQUIRED_LANDMARKS
+from detection.extract_points.face_roi import FaceRoiTracker
+from detection.extract_points.hands_processor import create_hands
+from detection.extract_points.landmark_frame import LandmarkFrame
+from detection.data_processing.face_features import extract_features
+from runtime.capture import CaptureThread, FrameRing
+from runtime.inference import InferenceWorker, StageBusy, StageDown
+from runtime.ingest import IngestSlot
+from runtime.scheduler import FrameScheduler
+from runtime.sources import CameraSource, open_source
+from runtime.spool import Spool
+from runtime.timeseries import TimeSeriesStore
+from runtime.preview import PreviewFrame, DEFAULT_MAX_WIDTH, DEFAULT_QUALITY
+from runtime.render import preview_size, render_landmark_cloud, render_processed
+from runtime.flusher import Flusher
+from runtime.health import HealthMonitor
+from runtime.config_snapshot import ConfigSnapshot, etag_matches
+from runtime.clients import KIND_EVENT, KIND_PRIORITY, KIND_TICK, PREVIEW_STREAMS, WsClient
+from runtime.event_routes import SAFETY_EVENTS, EventRouter, parse_routes
+from runtime.metric_buckets import FullRateWindow, MetricBucketer
+from runtime.ws_protocol import (
+    MSG_INGEST_JPEG, PROTOCOL_JSON, LandmarkCountError, ProtocolError, negotiate, pack_frame,
+    unpack_ingest,
+)
+from runtime.messages import (
+    Message, MetricsMessage, WindowReportMessage, event_message,
+)
 
 # =====================
 # Supabase (persistencia)
 # =====================
-from supabase import create_client, Client
-from supabase.lib.client_options import ClientOptions
 import concurrent.futures
+from runtime.rest_writer import RowWriter, WriteError, supabase_writer
 
 # Carga variables de entorno desde drowsy-backend/.env (si existe)
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
@@ -29,105 +56,62 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").strip()
 SUPABASE_KEY = (os.getenv("SUPABASE_SERVICE_ROLE_KEY", "") or os.getenv("SUPABASE_SERVICE_ROLE", "")).strip()
 
-supabase: Optional[Client] = None
+# Escritor PostgREST asíncrono (pool keep-alive, gzip, reintentos); None sin Supabase configurado
+rest_writer: Optional[RowWriter] = None
 DEVICE_ID: Optional[int] = None
-SESSION_ID: Optional[int] = None
 
 # Identidad del dispositivo
 DEVICE_NAME = os.getenv("DEVICE_NAME", os.getenv("COMPUTERNAME", os.getenv("HOSTNAME", "SomnoDevice"))).strip()
 DEVICE_MODEL = os.getenv("DEVICE_MODEL", "UnknownModel").strip()
 
-# Buffers para inserts en lote (no bloquear el loop)
-METRICS_BUFFER: List[dict] = []
-EVENTS_BUFFER: List[dict] = []
-WINDOW_BUFFER: List[dict] = []
-
-# Locks
-buffers_lock = asyncio.Lock()
-
-# Límites/lotes
-MAX_METRICS_BATCH = 50
-MAX_EVENTS_BATCH = 50
-FLUSH_EVERY_SECS = 2.0
-
-# ThreadPool para no bloquear el event loop
-db_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
-
-
-def _to_jsonable(obj):
-    """Convert numpy/scalars/arrays to JSON-serializable types recursively."""
-    try:
-        import numpy as _np  # type: ignore
-    except Exception:
-        _np = None
-
-    if isinstance(obj, dict):
-        return {k: _to_jsonable(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple, set)):
-        return [_to_jsonable(v) for v in obj]
-    if _np is not None:
-        if isinstance(obj, (_np.floating,)):
-            return float(obj)
-        if isinstance(obj, (_np.integer,)):
-            return int(obj)
-        if isinstance(obj, _np.ndarray):
-            return obj.tolist()
-    return obj
-
-# Reemplaza la función init_supabase en tu app.py
-
-def init_supabase() -> None:
-    """Inicializa el cliente supabase con schema 'public' (default)."""
-    global supabase
+# Spool local (SQLite WAL): toda fila persistente pasa primero por disco y de ahí
+# se sube en lotes; sobrevive cortes de red y reinicios
+SPOOL_PATH = os.getenv("SPOOL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool.db"))
+SPOOL_SYNC_SECS = float(os.getenv("SPOOL_SYNC_SECS", "1.0"))     # ventana de fsync por lote
+SPOOL_MAX_ROWS = int(os.getenv("SPOOL_MAX_ROWS", "2000000"))
+spool: Optional[Spool] = None
+
+# Límites/lotes: se sube en cuanto hay un lote lleno o, como máximo, cada
+# FLUSH_MAX_LATENCY_SECS; cada ronda vacía el spool completo
+MAX_METRICS_BATCH = int(os.getenv("MAX_METRICS_BATCH", "200"))
+MAX_EVENTS_BATCH = int(os.getenv("MAX_EVENTS_BATCH", "100"))
+FLUSH_MAX_LATENCY_SECS = float(os.getenv("FLUSH_MAX_LATENCY_SECS", "2.0"))
+# Inserts simultáneos a Supabase (entre todas las tablas)
+FLUSH_MAX_INFLIGHT = int(os.getenv("FLUSH_MAX_INFLIGHT", "2"))
+# Requests HTTP simultáneos (y conexiones keep-alive) del escritor, reintentos por
+# request y tamaño desde el que el cuerpo va comprimido (-1 = nunca)
+SUPABASE_MAX_CONCURRENCY = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "4"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+SUPABASE_GZIP_MIN_BYTES = int(os.getenv("SUPABASE_GZIP_MIN_BYTES", "1024"))
+# Tope del backoff tras un lote fallido
+FLUSH_BACKOFF_MAX_SECS = float(os.getenv("FLUSH_BACKOFF_MAX_SECS", "60"))
+# Métricas: se sube un agregado por ventana de METRICS_BUCKET_SECS (metric_buckets) y
+# las filas completas de metrics solo desde METRICS_FULL_PRE_SECS antes de un evento
+# de seguridad hasta METRICS_FULL_POST_SECS después
+METRICS_BUCKET_SECS = float(os.getenv("METRICS_BUCKET_SECS", "1.0"))
+METRICS_FULL_PRE_SECS = float(os.getenv("METRICS_FULL_PRE_SECS", "10"))
+METRICS_FULL_POST_SECS = float(os.getenv("METRICS_FULL_POST_SECS", "10"))
+# Reintento de conexión a Supabase si no estaba disponible al arrancar
+SUPABASE_RETRY_SECS = float(os.getenv("SUPABASE_RETRY_SECS", "30"))
+_supabase_retry_at = 0.0
+
+# Único hilo dueño de la conexión SQLite del spool
+spool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+
+def _open_writer() -> Optional[RowWriter]:
     if not SUPABASE_URL or not SUPABASE_KEY:
         print("⚠️ Supabase deshabilitado: faltan SUPABASE_URL o SUPABASE_SERVICE_ROLE_KEY")
-        supabase = None
-        return
-    
-    try:
-        # CAMBIO IMPORTANTE: Usar schema público (default)
-        # No especificamos schema, usa 'public' por defecto
-        supabase = create_client(
-            SUPABASE_URL,
-            SUPABASE_KEY,
-            options=ClientOptions(
-                postgrest_client_timeout=120_000,
-                storage_client_timeout=120_000
-            ),
-        )
-        
-        # Test de conexión
-        test_resp = supabase.table("devices").select("id").limit(1).execute()
-        print(f"✅ Supabase inicializado (schema=public, test ok: {len(test_resp.data) if test_resp.data else 0} devices)")
-        
-    except Exception as e:
-        print(f"❌ Error inicializando Supabase: {e}")
-        supabase = None
-
-def supa_upsert_device_by_name(name: str, model: str) -> Optional[int]:
-    """UPSERT de device por 'name' y retorna id."""
-    if not supabase:
-        return None
-    resp = supabase.table("devices").upsert({"name": name, "model": model}, on_conflict="name").execute()
-    data = resp.data or []
-    if not data:
-        # Si el driver no retorna filas en upsert, intentamos select
-        sel = supabase.table("devices").select("*").eq("name", name).limit(1).execute()
-        row = (sel.data or [None])[0]
-        return row["id"] if row else None
-    return data[0]["id"]
-
-def supa_create_session(device_id: int) -> Optional[int]:
-    if not supabase:
         return None
-    resp = supabase.table("sessions").insert({"device_id": device_id}).execute()
-    data = resp.data or []
-    return data[0]["id"] if data else None
-
-def supa_upsert_device_config(device_id: int, cfg: Dict[str, Any]) -> None:
-    if not supabase:
-        return
-    payload = {
+    return supabase_writer(
+        SUPABASE_URL, SUPABASE_KEY,
+        max_concurrency=SUPABASE_MAX_CONCURRENCY,
+        max_retries=SUPABASE_MAX_RETRIES,
+        gzip_min_bytes=SUPABASE_GZIP_MIN_BYTES,
+    )
+
+def device_config_row(device_id: int, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "device_id": device_id,
         "ear_threshold": cfg.get("EAR_THRESHOLD"),
         "mar_threshold": cfg.get("MAR_THRESHOLD"),
@@ -139,52 +123,176 @@ def supa_upsert_device_config(device_id: int, cfg: Dict[str, Any]) -> None:
         "fusion_threshold": cfg.get("FUSION_THRESHOLD"),
         "use_python_alarm": cfg.get("USE_PYTHON_ALARM"),
     }
-    supabase.table("device_config").upsert(payload, on_conflict="device_id").execute()
 
-def supa_insert_batch(table: str, rows: List[dict]) -> None:
-    """Inserta un lote en un hilo aparte (sin bloquear)."""
-    if not supabase or not rows:
-        return
+async def supa_upsert_device_by_name(name: str, model: str) -> Optional[int]:
+    """UPSERT de device por 'name' y retorna id."""
+    rows = await rest_writer.insert("devices", [{"name": name, "model": model}],
+                                    returning=True, on_conflict="name")
+    if not rows:
+        # Si el servidor no retorna filas en el upsert, intentamos select
+        rows = await rest_writer.select("devices", {"select": "id", "name": f"eq.{name}", "limit": "1"})
+    return rows[0]["id"] if rows else None
+
+async def supa_create_session(device_id: int) -> Optional[int]:
+    rows = await rest_writer.insert("sessions", [{"device_id": device_id}], returning=True)
+    return rows[0]["id"] if rows else None
+
+async def supa_upsert_device_config(device_id: int, cfg: Dict[str, Any]) -> None:
+    await rest_writer.insert("device_config", [device_config_row(device_id, cfg)], on_conflict="device_id")
+
+def _open_spool() -> Optional[Spool]:
+    """El spool solo tiene sentido si hay adónde subir (Supabase configurado)."""
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        return None
     try:
-        clean_rows = _to_jsonable(rows)
-        supabase.table(table).insert(clean_rows).execute()
+        return Spool(SPOOL_PATH, SPOOL_MAX_ROWS)
     except Exception as e:
-        print(f"[Supabase] Error batch insert en {table}: {e}")
+        print(f"[spool] no se pudo abrir {SPOOL_PATH}: {e}")
+        return None
 
-async def flush_loop():
-    """Cada FLUSH_EVERY_SECS envía lotes de METRICS/EVENTS/WINDOW_REPORTS."""
+
+async def _ensure_supabase() -> bool:
+    """Device registrado; si no lo estaba, reintenta cada SUPABASE_RETRY_SECS."""
+    global DEVICE_ID, _supabase_retry_at
+    if rest_writer is None:
+        return False
+    if DEVICE_ID is not None:
+        return True
+    now = time.monotonic()
+    if now < _supabase_retry_at:
+        return False
+    _supabase_retry_at = now + SUPABASE_RETRY_SECS
+    try:
+        DEVICE_ID = await supa_upsert_device_by_name(DEVICE_NAME, DEVICE_MODEL)
+    except WriteError as e:
+        print(f"[Supabase] no se pudo registrar el device: {e}")
+    return DEVICE_ID is not None
+
+
+# Las tablas suben en paralelo: sin este lock dos de ellas podrían crear la misma sesión
+_remote_session_lock = asyncio.Lock()
+
+
+async def _remote_session(session_key: str) -> Optional[int]:
+    """Id de sesión en Supabase para una clave local; la crea si aún no existe."""
+    remote = spool.remote_session(session_key)
+    if remote is not None:
+        return remote
+    async with _remote_session_lock:
+        remote = spool.remote_session(session_key)
+        if remote is not None:
+            return remote
+        try:
+            remote = await supa_create_session(DEVICE_ID)
+        except WriteError as e:
+            print(f"[Supabase] no se pudo crear la sesión {session_key}: {e}")
+            return None
+        if remote is None:
+            return None
+        await asyncio.get_running_loop().run_in_executor(spool_executor, spool.bind_session, session_key, remote)
+    for s in list(sessions.values()) + [s for s, _ in ingest_sessions.values()]:
+        if s.session_key == session_key:
+            s.session_id = remote
+    return remote
+
+
+async def _read_spool_batch(table: str, limit: int):
+    if spool is None:
+        return []
+    return await asyncio.get_running_loop().run_in_executor(spool_executor, spool.read_batch, table, limit)
+
+
+async def _prepare_spool_batch(table: str, batch) -> Optional[List[Dict[str, Any]]]:
+    """Filas listas para insertar con su session_id remoto; None si aún no hay Supabase/sesión."""
+    if not await _ensure_supabase():
+        return None
+    rows = []
+    for _, session_key, row in batch:
+        remote = await _remote_session(session_key)
+        if remote is None:
+            return None
+        row["session_id"] = remote
+        rows.append(row)
+    return rows
+
+
+async def _insert_spool_batch(table: str, rows: List[Dict[str, Any]]) -> bool:
+    """Se espera el resultado: un WriteError llega al flusher y el lote queda en el spool."""
+    await rest_writer.insert(table, rows)
+    return True
+
+
+async def _ack_spool_batch(table: str, batch) -> None:
+    if spool is not None:
+        await asyncio.get_running_loop().run_in_executor(spool_executor, spool.ack, table, batch[-1][0])
+
+
+async def _quarantine_spool_batch(table: str, batch, error: str) -> None:
+    if spool is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            spool_executor, spool.quarantine, table, [seq for seq, _, _ in batch], error)
+
+
+def _rejected_by_server(error: Exception) -> bool:
+    """
+    Rechazo definitivo de filas (4xx que no se arregla reintentando): van a cuarentena.
+    401/403 no cuentan: es la credencial, no las filas, y rechazaría todo.
+    """
+    return isinstance(error, WriteError) and not error.retryable and error.status not in (401, 403)
+
+
+async def _sync_spool() -> None:
+    if spool is not None:
+        await asyncio.get_running_loop().run_in_executor(spool_executor, spool.sync)
+
+
+# Subida del spool: por tamaño o latencia, tablas en paralelo con backoff propio,
+# sin perder lotes fallidos (las filas rechazadas por el servidor van a cuarentena)
+flusher = Flusher(
+    {"metrics": MAX_METRICS_BATCH, "metric_buckets": MAX_METRICS_BATCH,
+     "events": MAX_EVENTS_BATCH, "window_reports": MAX_EVENTS_BATCH},
+    read_batch=_read_spool_batch,
+    prepare=_prepare_spool_batch,
+    insert=_insert_spool_batch,
+    ack=_ack_spool_batch,
+    quarantine=_quarantine_spool_batch,
+    rejected=_rejected_by_server,
+    max_inflight=FLUSH_MAX_INFLIGHT,
+    max_latency_s=FLUSH_MAX_LATENCY_SECS,
+    backoff_max_s=FLUSH_BACKOFF_MAX_SECS,
+)
+
+
+async def spool_sync_loop():
+    """Cada SPOOL_SYNC_SECS lleva al disco lo encolado (un fsync por lote)."""
+    loop = asyncio.get_running_loop()
     while running:
-        await asyncio.sleep(FLUSH_EVERY_SECS)
+        await asyncio.sleep(SPOOL_SYNC_SECS)
         try:
-            async with buffers_lock:
-                metrics_batch = METRICS_BUFFER[:MAX_METRICS_BATCH]
-                events_batch = EVENTS_BUFFER[:MAX_EVENTS_BATCH]
-                window_batch = WINDOW_BUFFER[:MAX_EVENTS_BATCH]
-
-                del METRICS_BUFFER[:len(metrics_batch)]
-                del EVENTS_BUFFER[:len(events_batch)]
-                del WINDOW_BUFFER[:len(window_batch)]
-
-            if metrics_batch:
-                asyncio.get_running_loop().run_in_executor(db_executor, supa_insert_batch, "metrics", metrics_batch)
-            if events_batch:
-                asyncio.get_running_loop().run_in_executor(db_executor, supa_insert_batch, "events", events_batch)
-            if window_batch:
-                asyncio.get_running_loop().run_in_executor(db_executor, supa_insert_batch, "window_reports", window_batch)
+            await loop.run_in_executor(spool_executor, spool.sync)
         except Exception as e:
-            print(f"[flush_loop] error: {e}")
+            print(f"[spool] error: {e}")
 
-async def queue_metric(row: Dict[str, Any]):
-    async with buffers_lock:
-        METRICS_BUFFER.append(row)
 
-async def queue_event(row: Dict[str, Any]):
-    async with buffers_lock:
-        EVENTS_BUFFER.append(row)
+async def flush_loop():
+    """Sube el spool: lleva lo encolado al disco y vacía todas las tablas en cada ronda."""
+    await flusher.run(lambda: running, before_round=_sync_spool)
+
+def queue_metric(session_key: str, row: Dict[str, Any]):
+    spool.append("metrics", session_key, row)
+    flusher.notify(spool.pending)
+
+def queue_metric_bucket(session_key: str, row: Dict[str, Any]):
+    spool.append("metric_buckets", session_key, row)
+    flusher.notify(spool.pending)
 
-async def queue_window_report(row: Dict[str, Any]):
-    async with buffers_lock:
-        WINDOW_BUFFER.append(row)
+def queue_event(session_key: str, row: Dict[str, Any]):
+    spool.append("events", session_key, row)
+    flusher.notify(spool.pending)
+
+def queue_window_report(session_key: str, row: Dict[str, Any]):
+    spool.append("window_reports", session_key, row)
+    flusher.notify(spool.pending)
 
 # =====================
 # Config inicial (umbrales y pesos)
@@ -237,138 +345,16 @@ THRESHOLD_PRESETS: Dict[str, Dict[str, Any]] = {
     },
 }
 
-EAR_THRESHOLD = THRESHOLD_PRESETS["drowsy"]["ear"]
-MAR_THRESHOLD = THRESHOLD_PRESETS["drowsy"]["mar"]
-PITCH_DEG_THRESHOLD = THRESHOLD_PRESETS["drowsy"]["pitch"]
-CONSEC_FRAMES = THRESHOLD_PRESETS["drowsy"]["consecFrames"]
-FUSION_THRESHOLD = THRESHOLD_PRESETS["drowsy"]["fusion"]
-
-
 def _clamp(value: float, min_v: float, max_v: float) -> float:
     return max(min_v, min(max_v, value))
 
 
-def _copy_thresholds() -> Dict[str, Dict[str, Any]]:
-    return {
-        tier: {
-            "ear": float(cfg.get("ear", EAR_THRESHOLD_BASE)),
-            "mar": float(cfg.get("mar", MAR_THRESHOLD_BASE)),
-            "pitch": float(cfg.get("pitch", PITCH_DEG_THRESHOLD_BASE)),
-            "fusion": float(cfg.get("fusion", FUSION_THRESHOLD_BASE)),
-            "consecFrames": int(cfg.get("consecFrames", CONSEC_FRAMES_BASE)),
-        }
-        for tier, cfg in THRESHOLD_PRESETS.items()
-    }
-
-
-def _refresh_threshold_aliases() -> None:
-    global EAR_THRESHOLD, MAR_THRESHOLD, PITCH_DEG_THRESHOLD, CONSEC_FRAMES, FUSION_THRESHOLD
-    drowsy = THRESHOLD_PRESETS.get("drowsy", {})
-    EAR_THRESHOLD = float(drowsy.get("ear", EAR_THRESHOLD_BASE))
-    MAR_THRESHOLD = float(drowsy.get("mar", MAR_THRESHOLD_BASE))
-    PITCH_DEG_THRESHOLD = float(drowsy.get("pitch", PITCH_DEG_THRESHOLD_BASE))
-    FUSION_THRESHOLD = float(drowsy.get("fusion", FUSION_THRESHOLD_BASE))
-    CONSEC_FRAMES = int(drowsy.get("consecFrames", CONSEC_FRAMES_BASE))
-
-
-def _update_threshold_tier(tier: str, payload: Dict[str, Any]) -> None:
-    if tier not in THRESHOLD_PRESETS:
-        return
-
-    cfg = dict(THRESHOLD_PRESETS[tier])
-
-    if "ear" in payload:
-        try:
-            cfg["ear"] = _clamp(float(payload["ear"]), 0.05, 0.6)
-        except (TypeError, ValueError):
-            pass
-    if "mar" in payload:
-        try:
-            cfg["mar"] = _clamp(float(payload["mar"]), 0.2, 1.5)
-        except (TypeError, ValueError):
-            pass
-    if "pitch" in payload:
-        try:
-            cfg["pitch"] = _clamp(float(payload["pitch"]), 1.0, 90.0)
-        except (TypeError, ValueError):
-            pass
-    if "fusion" in payload:
-        try:
-            cfg["fusion"] = _clamp(float(payload["fusion"]), 0.05, 1.0)
-        except (TypeError, ValueError):
-            pass
-    if "consecFrames" in payload:
-        try:
-            cfg["consecFrames"] = max(1, int(payload["consecFrames"]))
-        except (TypeError, ValueError):
-            pass
-
-    THRESHOLD_PRESETS[tier] = cfg
-    if tier == "drowsy":
-        _refresh_threshold_aliases()
-
-
-def _sync_drowsy_map() -> None:
-    THRESHOLD_PRESETS["drowsy"] = {
-        "ear": EAR_THRESHOLD,
-        "mar": MAR_THRESHOLD,
-        "pitch": PITCH_DEG_THRESHOLD,
-        "fusion": FUSION_THRESHOLD,
-        "consecFrames": CONSEC_FRAMES,
-    }
-
-
 STAGE_LABELS = {
     "normal": "Normal",
     "signs": "Signos de somnolencia",
     "drowsy": "Somnolencia",
 }
 
-
-def evaluate_drowsiness_stage(
-    ear: Optional[float],
-    mar: Optional[float],
-    pitch: Optional[float],
-    fused_score: Optional[float],
-    closed_frames_count: int,
-) -> Tuple[str, List[str]]:
-    stage = "normal"
-    stage_reasons: List[str] = []
-
-    for tier in THRESHOLD_TIERS:
-        if tier == "normal":
-            continue
-
-        cfg = THRESHOLD_PRESETS.get(tier, {})
-        tier_label = STAGE_LABELS.get(tier, tier)
-        tier_reasons: List[str] = []
-
-        ear_thr = cfg.get("ear")
-        if ear is not None and ear_thr is not None and ear <= ear_thr:
-            tier_reasons.append(f"{tier_label}: EAR ≤ {ear_thr:.2f}")
-
-        mar_thr = cfg.get("mar")
-        if mar is not None and mar_thr is not None and mar >= mar_thr:
-            tier_reasons.append(f"{tier_label}: MAR ≥ {mar_thr:.2f}")
-
-        pitch_thr = cfg.get("pitch")
-        if pitch is not None and pitch_thr is not None and abs(pitch) >= pitch_thr:
-            tier_reasons.append(f"{tier_label}: |Pitch| ≥ {pitch_thr:.1f}°")
-
-        fusion_thr = cfg.get("fusion")
-        if fused_score is not None and fusion_thr is not None and fused_score >= fusion_thr:
-            tier_reasons.append(f"{tier_label}: Fusión ≥ {fusion_thr:.2f}")
-
-        consec_thr = cfg.get("consecFrames")
-        if consec_thr is not None and closed_frames_count >= consec_thr:
-            tier_reasons.append(f"{tier_label}: Cerrados ≥ {consec_thr}")
-
-        if tier_reasons:
-            stage = tier
-            stage_reasons = tier_reasons
-
-    return stage, stage_reasons
-
 # Pesos para la fusión (0..1, suman 1 idealmente)
 W_EAR = float(os.getenv("W_EAR", "0.5"))
 W_MAR = float(os.getenv("W_MAR", "0.3"))
@@ -379,7 +365,6 @@ USE_PYTHON_ALARM = os.getenv("USE_PYTHON_ALARM", "1") == "1"
 ALARM_GRACE_S = float(os.getenv("ALARM_GRACE_S", "5"))   # no sonar los primeros N segundos
 ALARM_HOLD_S = float(os.getenv("ALARM_HOLD_S", "3"))     # exigir N segundos sostenidos
 _APP_START_TS = time.time()
-_alarm_candidate_since = None  # tipo: Optional[float]
 
 # =====================
 # Configuración de video
@@ -390,6 +375,10 @@ CAMERA_HEIGHT = int(os.getenv("CAMERA_HEIGHT", "720"))
 CAMERA_FPS = int(os.getenv("CAMERA_FPS", "30"))
 FRAME_ORIENTATION = os.getenv("FRAME_ORIENTATION", "none").lower()
 CAMERA_CODEC = os.getenv("CAMERA_CODEC", "MJPG").upper()
+# Frames que retiene el hilo de captura (siempre se analiza el más reciente)
+CAPTURE_RING_SIZE = int(os.getenv("CAPTURE_RING_SIZE", "3"))
+# Fuente de frames: "camera" o una grabación/sintética ("video:<ruta>", "images:<dir>", "synthetic")
+CAPTURE_SOURCE = os.getenv("CAPTURE_SOURCE", "camera").strip() or "camera"
 
 _ENV_CODECS = [c.strip().upper() for c in os.getenv("CAMERA_CODECS", "MJPG,YUY2,H264,XVID").split(",") if c.strip()]
 
@@ -420,19 +409,6 @@ PREFERRED_FPS: List[int] = sorted({CAMERA_FPS, 60, 30, 24}, reverse=True)
 
 CAPTURE_BACKEND = cv2.CAP_DSHOW if os.name == "nt" else cv2.CAP_ANY
 
-config_lock = asyncio.Lock()
-camera_reset_event = asyncio.Event()
-
-CURRENT_VIDEO_INFO: Dict[str, Any] = {
-    "index": None,
-    "width": None,
-    "height": None,
-    "fps": None,
-    "codec": None,
-    "orientation": FRAME_ORIENTATION,
-}
-
-
 def _normalize_orientation(value: str) -> str:
     allowed = {"none", "flip_h", "flip_v", "rotate180", "rotate_180", "mirror", "mirror_h"}
     value = (value or "none").lower()
@@ -443,51 +419,6 @@ def _normalize_orientation(value: str) -> str:
     return value if value in allowed else "none"
 
 
-def _config_dict() -> Dict[str, Any]:
-    """Snapshot del estado actual de configuración para exponer vía API + persistencia device_config."""
-    return {
-        "EAR_THRESHOLD": EAR_THRESHOLD,
-        "MAR_THRESHOLD": MAR_THRESHOLD,
-        "PITCH_DEG_THRESHOLD": PITCH_DEG_THRESHOLD,
-        "CONSEC_FRAMES": CONSEC_FRAMES,
-        "W_EAR": W_EAR,
-        "W_MAR": W_MAR,
-        "W_POSE": W_POSE,
-        "FUSION_THRESHOLD": FUSION_THRESHOLD,
-        "USE_PYTHON_ALARM": USE_PYTHON_ALARM,
-        "thresholds": _copy_thresholds(),
-        "thresholdOrder": list(THRESHOLD_TIERS),
-        "camera": {
-            "requested": {
-                "index": CAMERA_INDEX,
-                "width": CAMERA_WIDTH,
-                "height": CAMERA_HEIGHT,
-                "fps": CAMERA_FPS,
-                "codec": CAMERA_CODEC,
-                "orientation": FRAME_ORIENTATION,
-            },
-            "active": CURRENT_VIDEO_INFO.copy(),
-            "options": {
-                "codecs": PREFERRED_CODECS,
-                "resolutions": [[int(w), int(h)] for (w, h) in DEFAULT_RESOLUTIONS],
-                "fps": PREFERRED_FPS,
-            },
-        },
-    }
-
-
-def _update_preferred_video(codec: Optional[str] = None, resolution: Optional[Tuple[int, int]] = None, fps: Optional[int] = None) -> None:
-    global PREFERRED_CODECS, DEFAULT_RESOLUTIONS, PREFERRED_FPS
-
-    if codec:
-        codec = codec.upper()
-        PREFERRED_CODECS = _unique_sequence([codec] + PREFERRED_CODECS)
-    if resolution:
-        DEFAULT_RESOLUTIONS = _unique_sequence([resolution] + DEFAULT_RESOLUTIONS)
-    if fps:
-        PREFERRED_FPS = sorted(set(PREFERRED_FPS + [fps]), reverse=True)
-
-
 def apply_orientation(frame: np.ndarray, orientation: str) -> np.ndarray:
     orient = _normalize_orientation(orientation)
     if orient == "flip_h":
@@ -573,39 +504,71 @@ def _open_camera_device(index_candidates: List[int], codecs: List[str], resoluti
     print("❌ No se encontró cámara disponible")
     return None, info
 
-# Landmarks MP FaceMesh
-LEFT_EYE_IDX  = [33, 160, 158, 133, 153, 144]
-RIGHT_EYE_IDX = [362, 385, 387, 263, 373, 380]
-
-# Boca (conjunto estándar para MAR)
-MOUTH_L_CORNER = 61
-MOUTH_R_CORNER = 291
-MOUTH_TOP_IN   = 13
-MOUTH_BOT_IN   = 14
-MOUTH_TOP_OUT1 = 81
-MOUTH_BOT_OUT1 = 311
-MOUTH_TOP_OUT2 = 78
-MOUTH_BOT_OUT2 = 308
-
-# PnP: índices útiles
-PNP_NOSE_TIP = 4
-PNP_CHIN     = 152
-PNP_LEYE_OUT = 263
-PNP_REYE_OUT = 33
-PNP_LMOUTH   = 291
-PNP_RMOUTH   = 61
-
 # =====================
 # FaceMesh
 # =====================
 mp_face = mp.solutions.face_mesh
-face_mesh = mp_face.FaceMesh(
-    static_image_mode=False,
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# Jobs encolados como máximo en la etapa de inferencia antes de rechazar frames
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "2"))
+# Jobs de render/JPEG de vistas previa encolados como máximo
+PREVIEW_MAX_PENDING = int(os.getenv("PREVIEW_MAX_PENDING", "4"))
+# Cadencia por defecto de métricas/vistas previa (y de persistencia de métricas)
+METRICS_EVERY_N_FRAMES = max(1, int(os.getenv("METRICS_EVERY_N_FRAMES", "5")))
+# Cola de salida por cliente /ws y tolerancia antes de desconectar a un cliente lento
+WS_MAX_QUEUE = int(os.getenv("WS_MAX_QUEUE", "32"))
+WS_EVICT_AFTER_S = float(os.getenv("WS_EVICT_AFTER_S", "5"))
+# /ingest: streams remotos simultáneos como máximo (el resto se rechaza al conectar)
+# y antigüedad máxima de un frame esperando análisis antes de descartarlo
+INGEST_MAX_STREAMS = int(os.getenv("INGEST_MAX_STREAMS", "8"))
+INGEST_MAX_AGE_MS = float(os.getenv("INGEST_MAX_AGE_MS", "500"))
+# Espera entre reintentos cuando la etapa de inferencia está llena
+INGEST_RETRY_S = 0.005
+# Hands (frotado de ojos): 1 de cada N frames mientras no haya manos cerca del rostro
+HANDS_IDLE_EVERY_N = max(1, int(os.getenv("HANDS_IDLE_EVERY_N", "6")))
+# Tasa objetivo del loop de análisis y máximo de frames sin inferencia tras un overrun
+ANALYSIS_FPS = float(os.getenv("ANALYSIS_FPS", "30"))
+MAX_SKIP_FRAMES = int(os.getenv("MAX_SKIP_FRAMES", "3"))
+# FaceMesh solo sobre un recorte alrededor del último rostro (vuelve al frame completo si lo pierde)
+FACE_ROI_TRACKING = os.getenv("FACE_ROI_TRACKING", "1") == "1"
+# Ruteo de eventos por tipo (persistir/difundir/muestrear/coalescer), ver runtime/event_routes.py
+EVENT_ROUTES = parse_routes(os.getenv("EVENT_ROUTES"))
+
+
+def _create_face_mesh():
+    """Se ejecuta dentro del hilo de inferencia: el grafo le pertenece a esa etapa."""
+    face_mesh = mp_face.FaceMesh(
+        static_image_mode=False,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+    return FaceRoiTracker(face_mesh, enabled=FACE_ROI_TRACKING)
+
+
+class StreamGraphs:
+    """
+    Grafos de MediaPipe de un stream, propiedad de su hilo de inferencia: ambos
+    siguen al rostro/manos del frame anterior, así que no se comparten entre
+    cámaras. Hands se crea al primer uso (sin rostro en cuadro no se llama).
+    """
+    __slots__ = ("face", "_hands")
+
+    def __init__(self):
+        self.face = _create_face_mesh()
+        self._hands = None
+
+    @property
+    def hands(self):
+        if self._hands is None:
+            self._hands = create_hands()
+        return self._hands
+
+    def close(self) -> None:
+        self.face.close()
+        if self._hands is not None:
+            self._hands.close()
+            self._hands = None
 
 # =====================
 # Alarma opcional Python
@@ -621,131 +584,22 @@ if USE_PYTHON_ALARM:
 # =====================
 # Utilidades geométricas
 # =====================
-def dist(a, b):
-    return np.linalg.norm(a - b)
-
-def eye_aspect_ratio(landmarks, idxs, frame_w, frame_h):
-    pts = []
-    for i in idxs:
-        lm = landmarks[i]
-        pts.append(np.array([int(lm.x * frame_w), int(lm.y * frame_h)], dtype=np.float32))
-    A = dist(pts[1], pts[5])
-    B = dist(pts[2], pts[4])
-    C = dist(pts[0], pts[3]) + 1e-6
-    return (A + B) / (2.0 * C)
-
-def mouth_aspect_ratio(landmarks, w, h):
-    """MAR clásico usando varios pares verticales / ancho de boca."""
-    def p(idx):
-        lm = landmarks[idx]
-        return np.array([lm.x * w, lm.y * h], dtype=np.float32)
-    v1 = dist(p(MOUTH_TOP_IN),  p(MOUTH_BOT_IN))
-    v2 = dist(p(MOUTH_TOP_OUT1),p(MOUTH_BOT_OUT1))
-    v3 = dist(p(MOUTH_TOP_OUT2),p(MOUTH_BOT_OUT2))
-    vertical = (v1 + v2 + v3) / 3.0
-    horizontal = dist(p(MOUTH_L_CORNER), p(MOUTH_R_CORNER)) + 1e-6
-    return vertical / horizontal
-
-def estimate_head_pose(landmarks, w, h):
-    """
-    Estima yaw/pitch/roll (grados) con solvePnP usando 6 puntos.
-    Convención: yaw (+ izquierda), pitch (+ arriba), roll (+ CW).
-    """
-    def p2d(idx):
-        lm = landmarks[idx]
-        return (lm.x * w, lm.y * h)
-
-    image_points = np.array([
-        p2d(PNP_NOSE_TIP),   # Nose tip
-        p2d(PNP_CHIN),       # Chin
-        p2d(PNP_LEYE_OUT),   # Left eye left corner (desde cámara)
-        p2d(PNP_REYE_OUT),   # Right eye right corner
-        p2d(PNP_LMOUTH),     # Left mouth corner
-        p2d(PNP_RMOUTH)      # Right mouth corner
-    ], dtype=np.float32)
-
-    # Modelo 3D simplificado (en mm, aproximado al cráneo genérico)
-    model_points = np.array([
-        (0.0,   0.0,   0.0),     # Nose tip
-        (0.0, -90.0, -25.0),     # Chin
-        (-60.0, 40.0, -50.0),    # Left eye (desde el sujeto)
-        (60.0,  40.0, -50.0),    # Right eye
-        (-40.0,-30.0, -50.0),    # Left mouth
-        (40.0, -30.0, -50.0)     # Right mouth
-    ], dtype=np.float32)
-
-    focal_length = w
-    center = (w / 2, h / 2)
-    camera_matrix = np.array([
-        [focal_length, 0, center[0]],
-        [0, focal_length, center[1]],
-        [0, 0, 1]], dtype=np.float32)
-    dist_coeffs = np.zeros((4, 1), dtype=np.float32)
-
-    ok, rvec, tvec = cv2.solvePnP(model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_EPNP)
-    if not ok:
-        return None, None, None
-
-    R, _ = cv2.Rodrigues(rvec)
-    # Extracción de Euler angles
-    sy = np.sqrt(R[0,0]*R[0,0] + R[1,0]*R[1,0])
-    singular = sy < 1e-6
-    if not singular:
-        pitch = np.degrees(np.arctan2(R[2,1], R[2,2]))
-        yaw   = np.degrees(np.arctan2(-R[2,0], sy))
-        roll  = np.degrees(np.arctan2(R[1,0], R[0,0]))
-    else:
-        pitch = np.degrees(np.arctan2(-R[1,2], R[1,1]))
-        yaw   = np.degrees(np.arctan2(-R[2,0], sy))
-        roll  = 0.0
-    return yaw, pitch, roll
-
 def clamp01(x):
     return max(0.0, min(1.0, x))
 
-def frame_to_base64(frame):
+
+def frame_to_jpeg(frame, max_width: int = DEFAULT_MAX_WIDTH, quality: int = DEFAULT_QUALITY) -> Optional[bytes]:
     try:
         h, w = frame.shape[:2]
-        if w > 1280:
-            scale = 1280 / w
+        if w > max_width:
+            scale = max_width / w
             frame = cv2.resize(frame, (int(w*scale), int(h*scale)))
-        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90, cv2.IMWRITE_JPEG_PROGRESSIVE, 1])
-        return base64.b64encode(buffer).decode('utf-8')
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_PROGRESSIVE, 1])
+        return buffer.tobytes()
     except Exception as e:
-        print(f"Error converting frame to base64: {e}")
+        print(f"Error encoding frame to JPEG: {e}")
         return None
 
-def draw_landmarks_on_frame(frame, landmarks):
-    try:
-        f = frame.copy()
-        h, w = f.shape[:2]
-        for idx in LEFT_EYE_IDX + RIGHT_EYE_IDX + \
-                   [MOUTH_L_CORNER, MOUTH_R_CORNER, MOUTH_TOP_IN, MOUTH_BOT_IN,
-                    MOUTH_TOP_OUT1, MOUTH_BOT_OUT1, MOUTH_TOP_OUT2, MOUTH_BOT_OUT2]:
-            if idx < len(landmarks):
-                lm = landmarks[idx]
-                x, y = int(lm.x*w), int(lm.y*h)
-                cv2.circle(f, (x, y), 2, (0, 255, 0), -1)
-        return f
-    except Exception as e:
-        print(f"Error drawing landmarks: {e}")
-        return frame
-
-
-def render_landmark_cloud(landmarks, width: int, height: int) -> np.ndarray:
-    try:
-        canvas = np.zeros((height, width, 3), dtype=np.uint8)
-        canvas[:] = (16, 24, 40)
-        color = (210, 255, 255)
-        for lm in landmarks:
-            x = int(lm.x * width)
-            y = int(lm.y * height)
-            if 0 <= x < width and 0 <= y < height:
-                cv2.circle(canvas, (x, y), 2, color, -1, lineType=cv2.LINE_AA)
-        return canvas
-    except Exception as e:
-        print(f"Error rendering landmark cloud: {e}")
-        return np.zeros((height, width, 3), dtype=np.uint8)
 
 # =====================
 # FastAPI
@@ -759,116 +613,681 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Estado runtime
-closed_frames = 0
-last_ear: Optional[float] = None
-last_mar: Optional[float] = None
-last_yaw = last_pitch = last_roll = None
-is_drowsy = False
-running = True
-
-# NUEVO: pipeline por eventos (parpadeo, micro-sueño, bostezo, frotado, cabeceo)
-pipeline = DrowsinessPipeline()
-
 # =====================
-# REST: get/set config
+# Streams: una sesión por cámara
 # =====================
-@app.get("/config")
-def get_config():
-    return _config_dict()
+# Cámaras a monitorear: entradas "id=fuente" separadas por coma. La fuente es
+# "camera[:índice]" o un spec de runtime.sources ("video:<ruta>", "images:<dir>",
+# "synthetic[:WxH]"). Vacío = un único stream "default" con CAMERA_INDEX/CAPTURE_SOURCE.
+STREAMS_SPEC = os.getenv("STREAMS", "").strip()
+# Hilos de inferencia compartidos por todos los streams (cada stream queda fijo a uno)
+INFERENCE_WORKERS = max(1, int(os.getenv("INFERENCE_WORKERS", "1")))
+# Historial local por frame (archivo mapeado por stream, últimas HISTORY_HOURS horas; 0 = apagado)
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"))
+HISTORY_HOURS = float(os.getenv("HISTORY_HOURS", "4"))
+HISTORY_COLUMNS = ("ear", "mar", "yaw", "pitch", "roll", "fused_score", "stage", "is_drowsy")
+HISTORY_MAX_POINTS = 5000
+# Intervalos de las sondas de salud (cada dependencia se sondea por separado y /health lee el caché)
+HEALTH_DB_SECS = float(os.getenv("HEALTH_DB_SECS", "30"))
+HEALTH_CAMERA_SECS = float(os.getenv("HEALTH_CAMERA_SECS", "2"))
+HEALTH_INFERENCE_SECS = float(os.getenv("HEALTH_INFERENCE_SECS", "2"))
+HEALTH_CLIENTS_SECS = float(os.getenv("HEALTH_CLIENTS_SECS", "5"))
+
+
+def _parse_streams(spec: str) -> List[Tuple[str, str, int]]:
+    """(stream_id, fuente, índice de cámara) por cada entrada de STREAMS."""
+    out: List[Tuple[str, str, int]] = []
+    for entry in (e.strip() for e in spec.split(",")):
+        if not entry:
+            continue
+        stream_id, sep, source = entry.partition("=")
+        if not sep:
+            stream_id, source = f"stream{len(out)}", entry
+        stream_id, source = stream_id.strip(), source.strip() or "camera"
+        index = CAMERA_INDEX
+        kind, _, arg = source.partition(":")
+        if kind.strip().lower() == "camera":
+            source = "camera"
+            try:
+                index = int(arg) if arg.strip() else CAMERA_INDEX
+            except ValueError:
+                pass
+        if stream_id and all(stream_id != sid for sid, _, _ in out):
+            out.append((stream_id, source, index))
+    return out or [("default", CAPTURE_SOURCE, CAMERA_INDEX)]
 
 
-@app.post("/config")
-async def set_config(cfg: dict):
-    global EAR_THRESHOLD, MAR_THRESHOLD, PITCH_DEG_THRESHOLD, CONSEC_FRAMES
-    global W_EAR, W_MAR, W_POSE, FUSION_THRESHOLD, USE_PYTHON_ALARM
-    global CAMERA_INDEX, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS, CAMERA_CODEC, FRAME_ORIENTATION
+class StreamSession:
+    """
+    Una cámara monitoreada con todo su estado: captura, detectores (pipeline y
+    scheduler propios), umbrales/pesos, estado de alarma, sesión Supabase y los
+    clientes /ws suscritos a ella. El proceso corre N sesiones a la vez; las etapas
+    de inferencia y de vistas previa son compartidas.
+    """
+
+    def __init__(self, stream_id: str, source: str = "camera", camera_index: int = CAMERA_INDEX,
+                 worker: Optional[InferenceWorker] = None, probe_other_cameras: bool = True,
+                 local_alarm: bool = True, started_ts: Optional[float] = _APP_START_TS):
+        self.stream_id = stream_id
+        self.source = source
+        self.worker = worker
+        # Con varias cámaras no se prueban otros índices: serían las de otro stream
+        self.probe_other_cameras = probe_other_cameras
+        # Los streams remotos (/ingest) no hacen sonar la alarma de esta máquina
+        self.local_alarm = local_alarm
+        # Inicio del periodo de gracia de la alarma (None: el primer frame analizado)
+        self.started_ts = started_ts
+
+        # Video solicitado / activo
+        self.camera_index = camera_index
+        self.camera_width = CAMERA_WIDTH
+        self.camera_height = CAMERA_HEIGHT
+        self.camera_fps = CAMERA_FPS
+        self.camera_codec = CAMERA_CODEC
+        self.frame_orientation = FRAME_ORIENTATION
+        self.preferred_codecs: List[str] = list(PREFERRED_CODECS)
+        self.default_resolutions: List[Tuple[int, int]] = list(DEFAULT_RESOLUTIONS)
+        self.preferred_fps: List[int] = list(PREFERRED_FPS)
+        self.video_info: Dict[str, Any] = {
+            "index": None,
+            "codec": None,
+            "width": None,
+            "height": None,
+            "fps": None,
+            "orientation": self.frame_orientation,
+        }
+        self.config_lock = asyncio.Lock()
+        self.reset_event = asyncio.Event()
+
+        # Umbrales por nivel y pesos de fusión
+        self.threshold_presets: Dict[str, Dict[str, Any]] = {
+            tier: dict(cfg) for tier, cfg in THRESHOLD_PRESETS.items()
+        }
+        self.refresh_threshold_aliases()
+        self.w_ear, self.w_mar, self.w_pose = W_EAR, W_MAR, W_POSE
+
+        # Estado runtime
+        self.closed_frames = 0
+        self.last_ear: Optional[float] = None
+        self.last_mar: Optional[float] = None
+        self.last_yaw = self.last_pitch = self.last_roll = None
+        self.is_drowsy = False
+        self.alarm_candidate_since: Optional[float] = None
+        self.capture: Optional[CaptureThread] = None
+        # Pipeline por eventos (parpadeo, micro-sueño, bostezo, frotado, cabeceo)
+        self.pipeline = DrowsinessPipeline(hands_every_n=HANDS_IDLE_EVERY_N)
+        # Cadencia del loop de análisis (deadline por frame, saltos tras overrun)
+        self.scheduler = FrameScheduler(ANALYSIS_FPS, MAX_SKIP_FRAMES)
+        self.clients: Set[WsClient] = set()
+        # Qué eventos se guardan/envían y cuáles se coalescen hasta el próximo tick
+        self.events = EventRouter(EVENT_ROUTES)
+        # Métricas agregadas por ventana y filas completas solo alrededor de eventos de seguridad
+        self.metric_buckets = MetricBucketer(METRICS_BUCKET_SECS)
+        self.full_rate = FullRateWindow(METRICS_FULL_PRE_SECS, METRICS_FULL_POST_SECS)
+        # Historial local consultable por /history (solo streams locales, se abre al arrancar)
+        self.history: Optional[TimeSeriesStore] = None
+        self.session_id: Optional[int] = None
+        # Config vigente (inmutable; se reemplaza por otra versión solo si algo cambió)
+        self._config: Optional[ConfigSnapshot] = None
+        # Clave local de la sesión en el spool (única por stream y arranque)
+        self.session_key = f"{stream_id}:{int(_APP_START_TS * 1000)}"
+
+    # ---- umbrales ----
+    def copy_thresholds(self) -> Dict[str, Dict[str, Any]]:
+        return {tier: dict(values) for tier, values in self.threshold_presets.items()}
+
+    def refresh_threshold_aliases(self) -> None:
+        drowsy = self.threshold_presets.get("drowsy", {})
+        self.ear_threshold = float(drowsy.get("ear", EAR_THRESHOLD_BASE))
+        self.mar_threshold = float(drowsy.get("mar", MAR_THRESHOLD_BASE))
+        self.pitch_deg_threshold = float(drowsy.get("pitch", PITCH_DEG_THRESHOLD_BASE))
+        self.fusion_threshold = float(drowsy.get("fusion", FUSION_THRESHOLD_BASE))
+        self.consec_frames = int(drowsy.get("consecFrames", CONSEC_FRAMES_BASE))
+
+    def update_threshold_tier(self, tier: str, payload: Dict[str, Any]) -> None:
+        if tier not in self.threshold_presets:
+            return
+
+        cfg = dict(self.threshold_presets[tier])
+
+        if "ear" in payload:
+            try:
+                cfg["ear"] = _clamp(float(payload["ear"]), 0.05, 0.6)
+            except (TypeError, ValueError):
+                pass
+        if "mar" in payload:
+            try:
+                cfg["mar"] = _clamp(float(payload["mar"]), 0.2, 1.5)
+            except (TypeError, ValueError):
+                pass
+        if "pitch" in payload:
+            try:
+                cfg["pitch"] = _clamp(float(payload["pitch"]), 1.0, 90.0)
+            except (TypeError, ValueError):
+                pass
+        if "fusion" in payload:
+            try:
+                cfg["fusion"] = _clamp(float(payload["fusion"]), 0.05, 1.0)
+            except (TypeError, ValueError):
+                pass
+        if "consecFrames" in payload:
+            try:
+                cfg["consecFrames"] = max(1, int(payload["consecFrames"]))
+            except (TypeError, ValueError):
+                pass
+
+        self.threshold_presets[tier] = cfg
+        if tier == "drowsy":
+            self.refresh_threshold_aliases()
+
+    def sync_drowsy_map(self) -> None:
+        self.threshold_presets["drowsy"] = {
+            "ear": self.ear_threshold,
+            "mar": self.mar_threshold,
+            "pitch": self.pitch_deg_threshold,
+            "fusion": self.fusion_threshold,
+            "consecFrames": self.consec_frames,
+        }
+
+    def evaluate_drowsiness_stage(
+        self,
+        ear: Optional[float],
+        mar: Optional[float],
+        pitch: Optional[float],
+        fused_score: Optional[float],
+        closed_frames_count: int,
+    ) -> Tuple[str, List[str]]:
+        stage = "normal"
+        stage_reasons: List[str] = []
+
+        for tier in THRESHOLD_TIERS:
+            if tier == "normal":
+                continue
+
+            cfg = self.threshold_presets.get(tier, {})
+            tier_label = STAGE_LABELS.get(tier, tier)
+            tier_reasons: List[str] = []
+
+            ear_thr = cfg.get("ear")
+            if ear is not None and ear_thr is not None and ear <= ear_thr:
+                tier_reasons.append(f"{tier_label}: EAR ≤ {ear_thr:.2f}")
+
+            mar_thr = cfg.get("mar")
+            if mar is not None and mar_thr is not None and mar >= mar_thr:
+                tier_reasons.append(f"{tier_label}: MAR ≥ {mar_thr:.2f}")
+
+            pitch_thr = cfg.get("pitch")
+            if pitch is not None and pitch_thr is not None and abs(pitch) >= pitch_thr:
+                tier_reasons.append(f"{tier_label}: |Pitch| ≥ {pitch_thr:.1f}°")
+
+            fusion_thr = cfg.get("fusion")
+            if fused_score is not None and fusion_thr is not None and fused_score >= fusion_thr:
+                tier_reasons.append(f"{tier_label}: Fusión ≥ {fusion_thr:.2f}")
+
+            consec_thr = cfg.get("consecFrames")
+            if consec_thr is not None and closed_frames_count >= consec_thr:
+                tier_reasons.append(f"{tier_label}: Cerrados ≥ {consec_thr}")
+
+            if tier_reasons:
+                stage = tier
+                stage_reasons = tier_reasons
+
+        return stage, stage_reasons
+
+    def fuse_scores(self, ear, mar, pitch) -> Tuple[float, List[str]]:
+        """
+        Fusión de señales: normalizaciones simples 0..1 ponderadas con los pesos del stream.
+        Retorna (fused_score, razones MAR>thr / Pitch>thr).
+        """
+        reason: List[str] = []
+        ear_thr, mar_thr, pitch_thr = self.ear_threshold, self.mar_threshold, self.pitch_deg_threshold
+        # EAR_score: 1 (muy somnoliento) cuando ear << thr
+        ear_score = 0.0
+        if ear is not None:
+            ear_score = clamp01((ear_thr - ear) / max(1e-6, ear_thr*0.6))
+
+        # MAR_score: 1 cuando mar >> thr (bostezo grande)
+        mar_score = 0.0
+        if mar is not None:
+            mar_score = clamp01((mar - mar_thr) / max(1e-6, mar_thr*0.8))
+            if mar > mar_thr:
+                reason.append("MAR>thr")
+
+        # Pose_score: 1 cuando |pitch| excede umbral
+        pose_score = 0.0
+        if pitch is not None:
+            pose_score = clamp01((abs(pitch) - pitch_thr) / max(1e-6, pitch_thr))
+            if abs(pitch) > pitch_thr:
+                reason.append("Pitch>thr")
+
+        return self.w_ear*ear_score + self.w_mar*mar_score + self.w_pose*pose_score, reason
+
+    # ---- video ----
+    def camera_config(self) -> Dict[str, Any]:
+        active = self.video_info.copy()
+        if active.get("orientation") is None:
+            active["orientation"] = self.frame_orientation
+        return {
+            "requested": {
+                "index": self.camera_index,
+                "width": self.camera_width,
+                "height": self.camera_height,
+                "fps": self.camera_fps,
+                "codec": self.camera_codec,
+                "orientation": self.frame_orientation,
+            },
+            "active": active,
+            "options": {
+                "codecs": self.preferred_codecs,
+                "resolutions": [[int(w), int(h)] for (w, h) in self.default_resolutions],
+                "fps": self.preferred_fps,
+            },
+        }
+
+    def update_preferred_video(self, codec: Optional[str] = None, resolution: Optional[Tuple[int, int]] = None, fps: Optional[int] = None) -> None:
+        if codec:
+            codec = codec.upper()
+            self.preferred_codecs = _unique_sequence([codec] + self.preferred_codecs)
+        if resolution:
+            self.default_resolutions = _unique_sequence([resolution] + self.default_resolutions)
+        if fps:
+            self.preferred_fps = sorted(set(self.preferred_fps + [fps]), reverse=True)
+
+    # ---- config ----
+    def config_dict(self) -> Dict[str, Any]:
+        """Estado actual de configuración; se lee vía config_snapshot() (solo refresh_config lo arma)."""
+        return {
+            "stream": self.stream_id,
+            "EAR_THRESHOLD": self.ear_threshold,
+            "MAR_THRESHOLD": self.mar_threshold,
+            "PITCH_DEG_THRESHOLD": self.pitch_deg_threshold,
+            "CONSEC_FRAMES": self.consec_frames,
+            "W_EAR": self.w_ear,
+            "W_MAR": self.w_mar,
+            "W_POSE": self.w_pose,
+            "FUSION_THRESHOLD": self.fusion_threshold,
+            "USE_PYTHON_ALARM": USE_PYTHON_ALARM,
+            "thresholds": self.copy_thresholds(),
+            "thresholdOrder": list(THRESHOLD_TIERS),
+            "camera": self.camera_config(),
+        }
 
-    print(f"Nueva configuración: {cfg}")
+    def config_fields(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Claves que el cliente combina con cada tick de métricas (antes viajaban en él)."""
+        return {
+            "thresholds": config["thresholds"],
+            "thresholdOrder": config["thresholdOrder"],
+            "weights": {"ear": config["W_EAR"], "mar": config["W_MAR"], "pose": config["W_POSE"]},
+            "config": {"usePythonAlarm": config["USE_PYTHON_ALARM"], "camera": config["camera"]},
+        }
 
-    video_changed = False
+    def config_snapshot(self) -> ConfigSnapshot:
+        if self._config is None:
+            self.refresh_config()
+        return self._config
+
+    def refresh_config(self) -> bool:
+        """Compara el estado con el snapshot vigente; si cambió, arma la versión siguiente (True)."""
+        config = self.config_dict()
+        current = self._config
+        if current is not None and current.same(config):
+            return False
+        fields = self.config_fields(config)
+        self._config = current.next(config, fields) if current is not None else ConfigSnapshot(1, config, fields)
+        return True
+
+    def apply_config(self, cfg: Dict[str, Any]) -> bool:
+        """Aplica umbrales/pesos/video de `cfg` (con config_lock tomado). True si cambió el video."""
+        video_changed = False
 
-    async with config_lock:
         thresholds_payload = cfg.get("thresholds")
         if isinstance(thresholds_payload, dict):
             for tier, values in thresholds_payload.items():
                 if isinstance(values, dict):
-                    _update_threshold_tier(tier, values)
-            _refresh_threshold_aliases()
+                    self.update_threshold_tier(tier, values)
+            self.refresh_threshold_aliases()
 
         aliases_changed = False
         if "EAR_THRESHOLD" in cfg or "earThreshold" in cfg:
-            EAR_THRESHOLD = float(cfg.get("EAR_THRESHOLD", cfg.get("earThreshold", EAR_THRESHOLD)))
+            self.ear_threshold = float(cfg.get("EAR_THRESHOLD", cfg.get("earThreshold", self.ear_threshold)))
             aliases_changed = True
         if "MAR_THRESHOLD" in cfg:
-            MAR_THRESHOLD = float(cfg["MAR_THRESHOLD"])
+            self.mar_threshold = float(cfg["MAR_THRESHOLD"])
             aliases_changed = True
         if "PITCH_DEG_THRESHOLD" in cfg:
-            PITCH_DEG_THRESHOLD = float(cfg["PITCH_DEG_THRESHOLD"])
+            self.pitch_deg_threshold = float(cfg["PITCH_DEG_THRESHOLD"])
             aliases_changed = True
         if "CONSEC_FRAMES" in cfg or "consecFrames" in cfg:
-            CONSEC_FRAMES = int(cfg.get("CONSEC_FRAMES", cfg.get("consecFrames", CONSEC_FRAMES)))
+            self.consec_frames = int(cfg.get("CONSEC_FRAMES", cfg.get("consecFrames", self.consec_frames)))
             aliases_changed = True
         if "W_EAR" in cfg:
-            W_EAR = float(cfg["W_EAR"])
+            self.w_ear = float(cfg["W_EAR"])
         if "W_MAR" in cfg:
-            W_MAR = float(cfg["W_MAR"])
+            self.w_mar = float(cfg["W_MAR"])
         if "W_POSE" in cfg:
-            W_POSE = float(cfg["W_POSE"])
+            self.w_pose = float(cfg["W_POSE"])
         if "FUSION_THRESHOLD" in cfg:
-            FUSION_THRESHOLD = float(cfg["FUSION_THRESHOLD"])
+            self.fusion_threshold = float(cfg["FUSION_THRESHOLD"])
             aliases_changed = True
 
         if aliases_changed:
-            _sync_drowsy_map()
-
-        if "USE_PYTHON_ALARM" in cfg:
-            USE_PYTHON_ALARM = bool(cfg["USE_PYTHON_ALARM"])
+            self.sync_drowsy_map()
 
         if "cameraIndex" in cfg:
             idx = int(cfg["cameraIndex"])
-            if idx != CAMERA_INDEX:
-                CAMERA_INDEX = idx
+            if idx != self.camera_index:
+                self.camera_index = idx
                 video_changed = True
 
         if "frameWidth" in cfg:
             width = int(cfg["frameWidth"])
-            if width != CAMERA_WIDTH:
-                CAMERA_WIDTH = max(160, width)
+            if width != self.camera_width:
+                self.camera_width = max(160, width)
                 video_changed = True
 
         if "frameHeight" in cfg:
             height = int(cfg["frameHeight"])
-            if height != CAMERA_HEIGHT:
-                CAMERA_HEIGHT = max(120, height)
+            if height != self.camera_height:
+                self.camera_height = max(120, height)
                 video_changed = True
 
         if "cameraFps" in cfg:
             fps = int(cfg["cameraFps"])
-            if fps != CAMERA_FPS:
-                CAMERA_FPS = max(5, fps)
+            if fps != self.camera_fps:
+                self.camera_fps = max(5, fps)
                 video_changed = True
 
         if "cameraCodec" in cfg:
             codec = str(cfg["cameraCodec"]).upper()[:4]
-            if codec and codec != CAMERA_CODEC:
-                CAMERA_CODEC = codec
+            if codec and codec != self.camera_codec:
+                self.camera_codec = codec
                 video_changed = True
 
         if "frameOrientation" in cfg:
             orient = _normalize_orientation(str(cfg["frameOrientation"]))
-            if orient != FRAME_ORIENTATION:
-                FRAME_ORIENTATION = orient
+            if orient != self.frame_orientation:
+                self.frame_orientation = orient
                 video_changed = True
 
-        _update_preferred_video(CAMERA_CODEC, (CAMERA_WIDTH, CAMERA_HEIGHT), CAMERA_FPS)
+        if video_changed:
+            self.update_preferred_video(self.camera_codec, (self.camera_width, self.camera_height), self.camera_fps)
+        return video_changed
+
+    def stats(self) -> Dict[str, Any]:
+        contexts = self.worker.context if self.worker is not None else None
+        graphs = contexts.get(self.stream_id) if contexts else None
+        return {
+            "source": self.source,
+            "session_id": self.session_id,
+            "is_drowsy": self.is_drowsy,
+            "clients_connected": len(self.clients),
+            "inference_worker": self.worker.name if self.worker is not None else None,
+            "capture": self.capture.stats() if self.capture is not None else None,
+            "face_roi": graphs.face.stats() if graphs is not None else None,
+            "hands": self.pipeline.hands.stats(),
+            "scheduler": self.scheduler.stats(),
+            "events": self.events.stats(),
+            "metric_buckets": self.metric_buckets.stats(),
+            "full_rate": self.full_rate.stats(),
+            "history": self.history.stats() if self.history is not None else None,
+        }
+
+
+def _create_stream_graphs(stream_ids: List[str]) -> Dict[str, StreamGraphs]:
+    """
+    Contexto de un hilo de inferencia: FaceMesh y Hands por stream asignado (los
+    grafos de seguimiento guardan estado del frame anterior, no se comparten entre cámaras).
+    """
+    return {stream_id: StreamGraphs() for stream_id in stream_ids}
+
+
+_STREAM_DEFS = _parse_streams(STREAMS_SPEC)
+
+# Etapas de inferencia compartidas: poseen los grafos FaceMesh/Hands de sus streams fuera del event loop
+inference_workers: List[InferenceWorker] = [
+    InferenceWorker(
+        f"inference-{n}" if INFERENCE_WORKERS > 1 else "inference",
+        INFERENCE_MAX_PENDING,
+        initializer=partial(
+            _create_stream_graphs,
+            [sid for i, (sid, _, _) in enumerate(_STREAM_DEFS) if i % INFERENCE_WORKERS == n],
+        ),
+    )
+    for n in range(INFERENCE_WORKERS)
+]
+
+sessions: Dict[str, StreamSession] = {
+    sid: StreamSession(sid, source, index, inference_workers[i % len(inference_workers)],
+                       probe_other_cameras=len(_STREAM_DEFS) == 1)
+    for i, (sid, source, index) in enumerate(_STREAM_DEFS)
+}
+DEFAULT_STREAM = _STREAM_DEFS[0][0]
+
+# Estado runtime del proceso
+running = True
+
+
+def get_session(stream_id: Optional[str]) -> Optional[StreamSession]:
+    """Sesión de `stream_id` (la primera si no se indica); None si no existe."""
+    return sessions.get(stream_id or DEFAULT_STREAM)
+
+
+def analyze_frame(graphs_by_stream: Dict[str, StreamGraphs], stream_id: str, pipeline: DrowsinessPipeline,
+                  frame, timings: Optional[Dict[str, float]] = None,
+                  ts: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Job de la etapa de inferencia (corre en el hilo del InferenceWorker):
+    FaceMesh una sola vez, EAR/MAR/pose y detectores por eventos del pipeline del stream.
+    Si se pasa `timings`, se anotan ahí los ms de facemesh/features/pipeline.
+    `ts` es el timestamp de captura del frame: los detectores miden duraciones con él.
+    """
+    graphs = graphs_by_stream.get(stream_id)
+    if graphs is None:
+        graphs = graphs_by_stream[stream_id] = StreamGraphs()
+    t0 = time.perf_counter()
+    # Única inferencia FaceMesh del frame (sobre el ROI de seguimiento si lo hay):
+    # la comparten EAR/MAR/pose y el pipeline, siempre en coords del frame completo
+    landmark_frame = graphs.face.process(frame)
+    t1 = time.perf_counter()
+    out = analyze_landmarks(pipeline, landmark_frame, frame, timings, ts, graphs)
+    if timings is not None:
+        timings["facemesh"] = (t1 - t0) * 1000.0
+    return out
+
+
+def analyze_landmarks(pipeline: DrowsinessPipeline, landmark_frame: LandmarkFrame, frame=None,
+                      timings: Optional[Dict[str, float]] = None,
+                      ts: Optional[float] = None,
+                      graphs: Optional[StreamGraphs] = None) -> Dict[str, Any]:
+    """
+    EAR/MAR/pose y detectores por eventos a partir de landmarks ya inferidos.
+    `frame` es el BGR del que salieron (para manos, con el Hands de `graphs`);
+    None si llegaron sin imagen.
+    """
+    t1 = time.perf_counter()
+    out: Dict[str, Any] = {
+        "landmarks": landmark_frame,
+        "ear": None, "mar": None,
+        "yaw": None, "pitch": None, "roll": None,
+        "events": [],
+    }
+    if landmark_frame.has_face:
+        # EAR (ambos ojos), MAR y pose desde el arreglo (N, 3) convertido una vez
+        feats = extract_features(landmark_frame.array, landmark_frame.width, landmark_frame.height)
+        out["ear"] = feats["ear"]
+        out["mar"] = feats["mar"]
+        out["yaw"], out["pitch"], out["roll"] = feats["yaw"], feats["pitch"], feats["roll"]
+    t2 = time.perf_counter()
+
+    # === NUEVO: pipeline de eventos de somnolencia (landmarks compartidos + frame BGR para manos) ===
+    try:
+        hands_graph = graphs.hands if graphs is not None and frame is not None else None
+        out["events"] = pipeline.step_landmarks(landmark_frame, frame, ts, hands_graph) or []
+    except Exception as ex:
+        print(f"[pipeline] error: {ex}")
+    if timings is not None:
+        timings["features"] = (t2 - t1) * 1000.0
+        timings["pipeline"] = (time.perf_counter() - t2) * 1000.0
+    return out
+
+
+def analyze_ingest(graphs_by_stream: Dict[str, StreamGraphs], stream_id: str, pipeline: DrowsinessPipeline,
+                   msg_type: int, payload, ts: float) -> Optional[Dict[str, Any]]:
+    """
+    Job de inferencia para un frame de /ingest: el JPEG se decodifica en el hilo de
+    la etapa y sigue el mismo camino que la cámara; los landmarks saltan FaceMesh.
+    None si el JPEG no se pudo decodificar.
+    """
+    if msg_type == MSG_INGEST_JPEG:
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+        return analyze_frame(graphs_by_stream, stream_id, pipeline, frame, None, ts)
+    width, height, points = payload
+    if points is None:
+        landmark_frame = LandmarkFrame(None, width, height)
+    else:
+        landmark_frame = LandmarkFrame.from_array(points, width, height)
+    return analyze_landmarks(pipeline, landmark_frame, None, None, ts)
+
+
+def release_graphs(graphs_by_stream: Dict[str, StreamGraphs], stream_id: str) -> None:
+    """Job de inferencia: libera FaceMesh y Hands de un stream que ya no existe."""
+    graphs = graphs_by_stream.pop(stream_id, None)
+    if graphs is not None:
+        graphs.close()
+
+
+# Etapa de vistas previa: render de overlays + JPEG, solo cuando alguien los pide
+preview_stage = InferenceWorker("preview", PREVIEW_MAX_PENDING)
+
+def render_stream(_ctx, stream: str, frame, points, hud, max_width: int):
+    """
+    Job de render de la etapa preview, ya a la resolución pedida por el suscriptor:
+    'processed' (overlays + HUD) o 'landmarks' (nube).
+    """
+    if stream == "processed":
+        return render_processed(frame, points, hud, max_width)
+    if stream == "landmarks" and points is not None:
+        h, w = frame.shape[:2]
+        return render_landmark_cloud(points, *preview_size(w, h, max_width))
+    return None
+
 
-    # Persistimos configuración del device a Supabase
+def encode_jpeg(_ctx, image, max_width: int, quality: int) -> Optional[bytes]:
+    return frame_to_jpeg(image, max_width, quality)
+
+
+def make_preview(frame_id: int, frame, points, hud) -> PreviewFrame:
+    """
+    Vista previa perezosa del frame: render/encode en preview_stage y solo bajo demanda.
+    `points` es el arreglo (N, 3) de landmarks del frame (o None).
+    """
+    async def render(stream: str, max_width: int):
+        if stream == "raw":
+            return frame
+        try:
+            return await preview_stage.submit(render_stream, stream, frame, points, hud, max_width)
+        except (StageBusy, StageDown):
+            return None
+
+    async def encode(image, max_width: int, quality: int):
+        try:
+            return await preview_stage.submit(encode_jpeg, image, max_width, quality)
+        except (StageBusy, StageDown):
+            return None
+
+    return PreviewFrame(frame_id, render, encode)
+
+# =====================
+# REST: get/set config (por stream: ?stream=<id>, por defecto el primero)
+# =====================
+def _session_or_404(stream: Optional[str]) -> StreamSession:
+    session = get_session(stream)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"stream desconocido: {stream}")
+    return session
+
+
+def _open_history(session: StreamSession) -> Optional[TimeSeriesStore]:
+    if HISTORY_HOURS <= 0:
+        return None
     try:
-        if supabase and DEVICE_ID is not None:
-            supa_upsert_device_config(DEVICE_ID, _config_dict())
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        capacity = int(HISTORY_HOURS * 3600 * ANALYSIS_FPS)
+        return TimeSeriesStore(os.path.join(HISTORY_DIR, f"{session.stream_id}.ts"), HISTORY_COLUMNS, capacity)
     except Exception as e:
-        print(f"[device_config] no se pudo guardar: {e}")
+        print(f"[history] no se pudo abrir el historial de {session.stream_id}: {e}")
+        return None
+
+
+@app.get("/history")
+async def get_history(stream: Optional[str] = None,
+                      start: Optional[float] = Query(None, alias="from"),
+                      end: Optional[float] = Query(None, alias="to"),
+                      points: int = 500,
+                      resolution: Optional[float] = None,
+                      columns: Optional[str] = None):
+    """
+    Historial local del stream entre `from` y `to` (epoch en segundos; por defecto
+    la última hora), decimado por min/max en `points` bins o en bins de
+    `resolution` segundos. `columns` filtra (separadas por coma).
+    """
+    session = _session_or_404(stream)
+    if session.history is None:
+        raise HTTPException(status_code=404, detail=f"sin historial local para {session.stream_id}")
+    end = time.time() if end is None else end
+    start = end - 3600.0 if start is None else start
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' debe ser mayor que 'from'")
+    if resolution is not None and resolution > 0:
+        points = int((end - start) / resolution) + 1
+    points = max(1, min(HISTORY_MAX_POINTS, points))
+    cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    result = await asyncio.to_thread(session.history.query, start, end, points, cols)
+    return {"stream": session.stream_id, **result}
+
+
+@app.get("/streams")
+def list_streams():
+    return {
+        "default": DEFAULT_STREAM,
+        "streams": [
+            {
+                "id": s.stream_id,
+                "source": s.source,
+                "session_id": s.session_id,
+                "clients_connected": len(s.clients),
+                "is_drowsy": s.is_drowsy,
+                "camera": s.camera_config()["active"],
+            }
+            for s in sessions.values()
+        ],
+    }
+
+
+@app.get("/config")
+async def get_config(request: Request, stream: Optional[str] = None):
+    """Config vigente del stream; con If-None-Match de la misma versión responde 304 sin cuerpo."""
+    snapshot = _session_or_404(stream).config_snapshot()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+
+@app.post("/config")
+async def set_config(cfg: dict, stream: Optional[str] = None):
+    global USE_PYTHON_ALARM
+
+    session = _session_or_404(stream)
+    print(f"Nueva configuración ({session.stream_id}): {cfg}")
+
+    async with session.config_lock:
+        video_changed = session.apply_config(cfg)
+        # La alarma sonora es una sola para todo el proceso
+        if "USE_PYTHON_ALARM" in cfg:
+            USE_PYTHON_ALARM = bool(cfg["USE_PYTHON_ALARM"])
 
     if USE_PYTHON_ALARM:
         if not pygame.mixer.get_init():
@@ -882,501 +1301,929 @@ async def set_config(cfg: dict):
         pygame.mixer.music.stop()
 
     if video_changed:
-        camera_reset_event.set()
+        session.reset_event.set()
+
+    # Versión nueva (y un único mensaje 'config' a los clientes) solo si algo cambió;
+    # la alarma figura en la config de todos los streams
+    changed = await publish_config(session)
+    if "USE_PYTHON_ALARM" in cfg:
+        for other in list(sessions.values()) + [s for s, _ in ingest_sessions.values()]:
+            if other is not session:
+                await publish_config(other)
+    snapshot = session.config_snapshot()
+
+    # Persistimos configuración del device a Supabase (device_config es una fila por
+    # dispositivo: la representa el stream por defecto)
+    try:
+        if changed and rest_writer is not None and DEVICE_ID is not None and session.stream_id == DEFAULT_STREAM:
+            await supa_upsert_device_config(DEVICE_ID, snapshot.config)
+    except WriteError as e:
+        print(f"[device_config] no se pudo guardar: {e}")
 
-    config_payload = _config_dict()
-    asyncio.create_task(broadcast({"message_type": "config", "config": config_payload}))
-    return {"ok": True, **config_payload}
+    return JSONResponse({"ok": True, "changed": changed, **snapshot.config},
+                        headers={"ETag": snapshot.etag})
 
 # =====================
 # WebSocket: métricas
 # =====================
-clients = set()
+# Claves del mensaje JSON legado para cada stream de vista previa
+LEGACY_FRAME_KEYS = {"raw": "rawFrame", "processed": "processedFrame", "landmarks": "landmarksFrame"}
 
 @app.websocket("/ws")
 async def metrics_ws(ws: WebSocket):
-    await ws.accept()
-    clients.add(ws)
-    print(f"Cliente WebSocket conectado. Total: {len(clients)}")
+    # Cámara: ?stream=<id> (por defecto la primera)
+    session = get_session(ws.query_params.get("stream"))
+    if session is None:
+        await ws.close(code=1008)
+        return
+    # Negociación: JSON legado por defecto; binario si el cliente lo pide al conectar
+    protocol, subprotocol = negotiate(ws.scope.get("subprotocols"), ws.query_params.get("protocol"))
+    await ws.accept(subprotocol=subprotocol)
+    client = WsClient(ws, protocol, max_queue=WS_MAX_QUEUE, evict_after_s=WS_EVICT_AFTER_S)
+    client.start()
+    session.clients.add(client)
+    # La config viaja una vez al conectar; los ticks solo traen su versión
+    client.enqueue([session.config_snapshot().message.encode()], KIND_PRIORITY)
+    print(f"Cliente WebSocket conectado a '{session.stream_id}' ({protocol}). Total: {len(session.clients)}")
     try:
         while True:
             msg = await ws.receive_text()
             if msg == "ping":
-                await ws.send_text("pong")
+                client.enqueue(["pong"])
+            elif msg.startswith("{"):
+                # Control: suscripción por stream con su propio rate/resolución
+                try:
+                    control = json.loads(msg)
+                except ValueError:
+                    continue
+                if isinstance(control, dict) and client.apply_control(control):
+                    client.enqueue([json.dumps({
+                        "message_type": "subscriptions",
+                        "subscriptions": client.describe(),
+                    })])
     except WebSocketDisconnect:
         print("Cliente WebSocket desconectado")
     finally:
-        clients.discard(ws)
+        session.clients.discard(client)
+        client.close()
+
+def plan_tick(session: StreamSession, frame_count: int, now: float) -> Dict[WsClient, List[str]]:
+    """Streams que toca enviar a cada cliente de la sesión en este frame según sus suscripciones."""
+    plan = {}
+    for c in session.clients:
+        if c.closed:
+            continue
+        due = c.due_streams(frame_count, METRICS_EVERY_N_FRAMES, now)
+        if due:
+            plan[c] = due
+    return plan
 
-async def broadcast(payload: dict):
-    if not clients:
+async def dispatch_tick(plan: Dict[WsClient, List[str]], metrics: MetricsMessage,
+                        preview: PreviewFrame, ts: float, now: float):
+    """
+    Envía el tick según protocolo y suscripción de cada cliente. Cada combinación
+    (stream, ancho, calidad) se codifica una sola vez (PreviewFrame la memoiza) y
+    cada mensaje resultante se serializa una sola vez y se comparte entre clientes.
+    - JSON legado: las vistas previa viajan en base64 dentro del mensaje de métricas,
+      así que una vista previa pendiente manda ese mensaje aunque el cliente no esté
+      suscrito a "metrics" (o no le toque en este frame)
+    - bin.v1: JSON pequeño de métricas + un mensaje binario por stream
+    Los mensajes se encolan por cliente (no se espera el envío); un tick nuevo
+    reemplaza al anterior si este aún no salió.
+    """
+    texts: Dict[Any, str] = {}
+    frames: Dict[Any, Optional[bytes]] = {}
+
+    for client, streams in plan.items():
+        messages: List[Any] = []
+        sent: List[str] = []
+        if client.binary:
+            if "metrics" in streams:
+                messages.append(metrics.encode())
+                sent.append("metrics")
+            for stream in PREVIEW_STREAMS:
+                if stream not in streams:
+                    continue
+                key = (stream, client.subscriptions[stream].encoding)
+                if key not in frames:
+                    jpeg = await preview.jpeg(stream, *key[1])
+                    frames[key] = pack_frame(stream, preview.frame_id, ts, jpeg) if jpeg else None
+                if frames[key] is not None:
+                    messages.append(frames[key])
+                sent.append(stream)
+        else:
+            included = tuple(
+                (stream, client.subscriptions[stream].encoding)
+                for stream in PREVIEW_STREAMS if stream in streams
+            )
+            if included not in texts:
+                embedded = {key: None for key in LEGACY_FRAME_KEYS.values()}
+                for stream, (max_width, quality) in included:
+                    embedded[LEGACY_FRAME_KEYS[stream]] = await preview.base64(stream, max_width, quality)
+                texts[included] = metrics.encode_with_b64(embedded)
+            messages.append(texts[included])
+            if "metrics" in streams:
+                sent.append("metrics")
+            sent.extend(stream for stream, _ in included)
+
+        client.enqueue(messages, KIND_TICK)
+        for stream in sent:
+            client.subscriptions[stream].mark_sent(now)
+
+async def broadcast(session: StreamSession, message: Message, stream: Optional[str] = None,
+                    kind: str = KIND_EVENT):
+    """Mensaje a los clientes de la sesión (o solo a los suscritos a `stream`); se serializa una vez."""
+    targets = [c for c in session.clients if not c.closed and (stream is None or c.wants(stream))]
+    if not targets:
         return
-    dead = []
-    def _jsonify(obj):
-        try:
-            import numpy as _np  # local import to avoid global issues
-        except Exception:  # pragma: no cover
-            _np = None
-
-        if isinstance(obj, dict):
-            return {k: _jsonify(v) for k, v in obj.items()}
-        if isinstance(obj, (list, tuple, set)):
-            return [_jsonify(v) for v in obj]
-        if _np is not None:
-            if isinstance(obj, (_np.floating,)):
-                return float(obj)
-            if isinstance(obj, (_np.integer,)):
-                return int(obj)
-            if isinstance(obj, _np.ndarray):
-                return obj.tolist()
-        return obj
-
-    message = json.dumps(_jsonify(payload), ensure_ascii=False)
-    for c in clients:
-        try:
-            await c.send_text(message)
-        except Exception as e:
-            print(f"Error enviando a cliente: {e}")
-            dead.append(c)
-    for d in dead:
-        clients.discard(d)
+    text = message.encode()
+    for c in targets:
+        c.enqueue([text], kind)
+
+async def publish_config(session: StreamSession) -> bool:
+    """Si la config del stream cambió, nueva versión y un mensaje 'config' a sus clientes."""
+    if not session.refresh_config():
+        return False
+    # Prioritario: debe llegar antes que los ticks que ya traen la versión nueva
+    await broadcast(session, session.config_snapshot().message, kind=KIND_PRIORITY)
+    return True
+
+async def broadcast_held_events(session: StreamSession):
+    """Eventos coalescidos desde el tick anterior (el último de cada tipo)."""
+    for msg in session.events.take_held(time.monotonic()):
+        await broadcast(session, msg, stream="events")
+
+# =====================
+# Alarma sonora (una para todo el proceso)
+# =====================
+def _alarm_start():
+    if USE_PYTHON_ALARM and pygame.mixer.get_init():
+        if not pygame.mixer.music.get_busy():
+            pygame.mixer.music.play(-1)
+
+
+def _alarm_stop():
+    """Apaga la alarma salvo que otro stream siga en somnolencia."""
+    if any(s.is_drowsy for s in sessions.values()):
+        return
+    if USE_PYTHON_ALARM and pygame.mixer.get_init():
+        pygame.mixer.music.stop()
 
 # =====================
 # NUEVO: manejo de eventos del pipeline
 # =====================
-async def handle_event(e: dict):
+def _event_epoch_ms(e: dict, ts: float, wall_ts: float) -> int:
     """
-    Dispara alarma (opcional) en eventos críticos y reenvía el evento a los clientes.
-    Además, guarda los eventos en Supabase (somno.events / somno.window_reports).
+    Instante del evento en ms epoch para events.ts. El "ts" del evento (s) está en el
+    reloj del frame (medio o cliente); se ancla al wall_ts del frame `ts`.
     """
-    global is_drowsy
-    etype = e.get("type")
+    event_ts = e.get("ts")
+    offset_s = event_ts - ts if isinstance(event_ts, (int, float)) else 0.0
+    return int(round((wall_ts + offset_s) * 1000))
+
+
+async def handle_event(session: StreamSession, e: dict, ts: float, wall_ts: float):
+    """
+    Dispara alarma (opcional) en eventos críticos y aplica la ruta del tipo de evento
+    (runtime/event_routes.py): guardado vía spool (somno.events / somno.window_reports),
+    envío a los clientes del stream, muestreo o coalescencia hasta el próximo tick.
+    `ts` es el timestamp del frame (s, mismo reloj que el de los eventos) y `wall_ts`
+    el epoch (s) en que ese frame se capturó o llegó al servidor.
+    """
+    msg = event_message(e)
+    etype = msg.type
 
     # Alarma ante micro-sueño, cabeceo o bostezo prolongado
     if etype in ("micro_sleep", "pitch_down", "yawn"):
-        # Respeta periodo de gracia inicial
-        if time.time() - _APP_START_TS >= ALARM_GRACE_S:
-            is_drowsy = True
-            if USE_PYTHON_ALARM and pygame.mixer.get_init():
-                # Los detectores ya exigen duración (>=3s), así que no agregamos hold adicional aquí
-                if not pygame.mixer.music.get_busy():
-                    pygame.mixer.music.play(-1)
-
-    # Persistencia de eventos
+        # Respeta periodo de gracia inicial, en el reloj del frame (ts de captura)
+        if session.started_ts is None:
+            session.started_ts = ts
+        if ts - session.started_ts >= ALARM_GRACE_S:
+            session.is_drowsy = True
+            # Los detectores ya exigen duración (>=3s), así que no agregamos hold adicional aquí
+            if session.local_alarm:
+                _alarm_start()
+
+    route = session.events.route(etype, time.monotonic())
+    if route is None:
+        return
+
+    # Persistencia de eventos (vía spool; la sesión remota se resuelve al subir)
     try:
-        if supabase and SESSION_ID:
-            ts_ms = e.get("ts") or int(time.time() * 1000)
+        if route.stored and spool is not None:
+            epoch_ms = _event_epoch_ms(e, ts, wall_ts)
             # report_window: guardar en window_reports
-            if etype == "report_window":
-                report = {
-                    "session_id": SESSION_ID,
-                    "window_s": e.get("window_s"),
-                    "counts": e.get("counts"),
-                    "durations": e.get("durations"),
-                    "ts": None  # default NOW() en DB
-                }
-                await queue_window_report(report)
+            if isinstance(msg, WindowReportMessage):
+                queue_window_report(session.session_key, msg.row(session.session_id))
             else:
-                evt_row = {
-                    "session_id": SESSION_ID,
-                    "type": etype,
-                    "ts": ts_ms,
-                    "duration_s": e.get("duration_s"),
-                    "hand": e.get("hand"),
-                    "payload": e,
-                }
-                await queue_event(evt_row)
+                queue_event(session.session_key, msg.row(session.session_id, epoch_ms))
+            if etype in SAFETY_EVENTS:
+                # Filas completas de metrics del episodio (antes y durante), en el
+                # mismo reloj del frame con que se alimentó full_rate
+                for row in session.full_rate.trigger(ts, e.get("duration_s") or 0.0):
+                    queue_metric(session.session_key, row)
+            if route.priority:
+                # Sube ya aunque esta u otra tabla esté en backoff
+                flusher.kick("window_reports" if isinstance(msg, WindowReportMessage) else "events")
     except Exception as ex:
         print(f"[Supabase event] error: {ex}")
 
-    # Difundir cualquier evento (incluye report_window, eye_blink, frame_overlay)
-    payload = {"message_type": "event", **e}
-    await broadcast(payload)
+    if not route.broadcast:
+        return
+    if route.coalesce:
+        session.events.hold(etype, msg)
+    else:
+        await broadcast(session, msg, stream="events",
+                        kind=KIND_PRIORITY if route.priority else KIND_EVENT)
 
 # =====================
-# Loop de cámara en segundo plano
+# Lógica por frame (compartida por camera_loop y /ingest)
 # =====================
-async def camera_loop():
-    global closed_frames, last_ear, last_mar, last_yaw, last_pitch, last_roll, is_drowsy
+def evaluate_analysis(session: StreamSession, analysis: Dict[str, Any], ts: float):
+    """
+    Contador de ojos cerrados, fusión, nivel de somnolencia e histéresis de alarma
+    del stream a partir del resultado de analyze_frame. `ts` es el timestamp de
+    captura del frame. Retorna (hud, reason, fused_score, nivel, stage_reasons).
+    """
+    landmark_frame = analysis["landmarks"]
+    ear, mar = analysis["ear"], analysis["mar"]
+    yaw, pitch, roll = analysis["yaw"], analysis["pitch"], analysis["roll"]
+
+    hud: List[Tuple[str, Tuple[int, int], float, Tuple[int, int, int], int]] = []
+    reason: List[str] = []
+    fused_score = None
+    drowsiness_stage = "normal"
+    stage_reasons: List[str] = []
+
+    if landmark_frame.has_face:
+        # Texto de depuración
+        y0 = 28
+        for label, val in [
+            ("EAR", ear), ("MAR", mar),
+            ("Yaw", yaw), ("Pitch", pitch), ("Roll", roll)
+        ]:
+            if val is not None:
+                hud.append((f'{label}: {val:.3f}', (10, y0), 0.6, (0, 255, 0), 2))
+                y0 += 24
+
+        # Lógica EAR: contador de ojos cerrados
+        if ear is not None and ear < session.ear_threshold:
+            session.closed_frames += 1
+            hud.append(('OJOS CERRADOS', (10, y0), 0.7, (0, 0, 255), 2))
+            reason.append("EAR<thr")
+        else:
+            session.closed_frames = 0
+            hud.append(('OJOS ABIERTOS', (10, y0), 0.7, (0, 255, 0), 2))
+        y0 += 26
+
+        # ======= FUSIÓN DE SEÑALES =======
+        fused_score, fusion_reasons = session.fuse_scores(ear, mar, pitch)
+        reason.extend(fusion_reasons)
+
+        drowsiness_stage, stage_reasons = session.evaluate_drowsiness_stage(
+            ear,
+            mar,
+            pitch,
+            fused_score,
+            session.closed_frames,
+        )
+        for desc in stage_reasons:
+            if desc not in reason:
+                reason.append(desc)
+
+        # Disparo por fusión O por contador de frames cerrados
+        should_alarm = (
+            drowsiness_stage == "drowsy"
+            or (fused_score is not None and fused_score >= session.fusion_threshold)
+            or session.closed_frames >= session.consec_frames
+        )
+
+        # Periodo de gracia desde el arranque (o desde el primer frame de un stream remoto)
+        now_ts = ts
+        if session.started_ts is None:
+            session.started_ts = now_ts
+        if should_alarm and (now_ts - session.started_ts >= ALARM_GRACE_S):
+            # Histeresis: exigir ALARM_HOLD_S de condición sostenida
+            if session.alarm_candidate_since is None:
+                session.alarm_candidate_since = now_ts
+            held = (now_ts - session.alarm_candidate_since) >= ALARM_HOLD_S
+            if held:
+                session.is_drowsy = True
+                hud.append(('ALERTA DE SOMNOLENCIA!', (10, y0), 0.9, (0, 0, 255), 3))
+                if session.local_alarm:
+                    _alarm_start()
+        else:
+            # Reset candidato y apagar si estaba sonando
+            session.alarm_candidate_since = None
+            if session.is_drowsy:
+                session.is_drowsy = False
+                if session.local_alarm:
+                    _alarm_stop()
+
+    else:
+        hud.append(('NO SE DETECTA ROSTRO', (10, 30), 0.7, (0, 0, 255), 2))
+        fused_score = fused_score if fused_score is not None else 0.0
+        reason.append("Sin rostro detectado")
+
+    # Actualizar últimas métricas
+    session.last_ear = float(ear) if ear is not None else None
+    session.last_mar = float(mar) if mar is not None else None
+    session.last_yaw = float(yaw) if yaw is not None else None
+    session.last_pitch = float(pitch) if pitch is not None else None
+    session.last_roll = float(roll) if roll is not None else None
+
+    return hud, reason, fused_score, drowsiness_stage, stage_reasons
+
+
+def build_metrics(session: StreamSession, fused_score, drowsiness_stage: str,
+                  stage_reasons: List[str], reason: List[str],
+                  extra: Optional[Dict[str, Any]] = None) -> MetricsMessage:
+    return MetricsMessage(
+        ear=session.last_ear, mar=session.last_mar,
+        yaw=session.last_yaw, pitch=session.last_pitch, roll=session.last_roll,
+        closed_frames=session.closed_frames,
+        threshold=session.ear_threshold,
+        consec_frames=session.consec_frames,
+        is_drowsy=session.is_drowsy,
+        level=drowsiness_stage,
+        stage_reasons=stage_reasons,
+        fused_score=fused_score,
+        reason=reason,
+        config_version=session.config_snapshot().version,
+        extra=extra,
+    )
+
+def record_metrics(session: StreamSession, ts: float, fused_score, drowsiness_stage: str,
+                   reason: List[str]):
+    """
+    Agrega el frame a la ventana de metric_buckets (al cerrarse una ventana la
+    encola) y al historial local del stream.
+    """
+    values = {"ear": session.last_ear, "mar": session.last_mar, "yaw": session.last_yaw,
+              "pitch": session.last_pitch, "roll": session.last_roll, "fused_score": fused_score}
+    if session.history is not None:
+        session.history.append(ts, {
+            **values,
+            "stage": THRESHOLD_TIERS.index(drowsiness_stage) if drowsiness_stage in THRESHOLD_TIERS else None,
+            "is_drowsy": 1.0 if session.is_drowsy else 0.0,
+        })
+    row = session.metric_buckets.add(
+        ts, values, drowsiness_stage, session.is_drowsy, reason, session.closed_frames,
+    )
+    if row is not None and spool is not None:
+        queue_metric_bucket(session.session_key, {"session_id": session.session_id, **row})
+
+
+def persist_metrics(session: StreamSession, ts: float, metrics: MetricsMessage):
+    """Fila completa de metrics: solo se encola dentro de una ventana de evento de seguridad."""
+    if spool is None:
+        return
+    # Misma instancia que se difundió: sin conversión adicional
+    row = metrics.row(session.session_id)
+    if session.full_rate.add(ts, row):
+        queue_metric(session.session_key, row)
 
-    print("Iniciando loop de cámara...")
-    cap: Optional[cv2.VideoCapture] = None
+
+def flush_metric_buckets(session: StreamSession):
+    """Encola la ventana en curso (al cerrar el stream o el servidor)."""
+    row = session.metric_buckets.flush()
+    if row is not None and spool is not None:
+        queue_metric_bucket(session.session_key, {"session_id": session.session_id, **row})
+
+# =====================
+# Loop de cámara en segundo plano (uno por stream)
+# =====================
+async def camera_loop(session: StreamSession):
+    print(f"Iniciando loop de cámara '{session.stream_id}'...")
+    loop = asyncio.get_running_loop()
+    frame_ready = asyncio.Event()
     frame_count = 0
-    consecutive_failures = 0
-    config_snapshot: Dict[str, Any] = {}
+    scheduler = session.scheduler
 
     try:
         while running:
-            if cap is None or camera_reset_event.is_set():
-                if cap is not None:
-                    cap.release()
-                    cap = None
-
-                camera_reset_event.clear()
-
-                async with config_lock:
-                    snapshot = {
-                        "index": CAMERA_INDEX,
-                        "width": CAMERA_WIDTH,
-                        "height": CAMERA_HEIGHT,
-                        "fps": CAMERA_FPS,
-                        "codec": CAMERA_CODEC,
-                        "orientation": FRAME_ORIENTATION,
-                    }
-
-                indices = _camera_index_candidates(snapshot["index"])
-                codecs = _unique_sequence([snapshot["codec"]] + PREFERRED_CODECS)
-                resolutions = _unique_sequence([(snapshot["width"], snapshot["height"]) ] + DEFAULT_RESOLUTIONS)
-
-                cap_candidate, info = _open_camera_device(indices, codecs, resolutions, snapshot["fps"])
+            capture = session.capture
+            if capture is None or capture.lost or session.reset_event.is_set():
+                if capture is not None:
+                    if capture.lost:
+                        print(f"⚠️ Se perdió la señal de video ({session.stream_id}), reintentando...")
+                    await asyncio.to_thread(capture.stop)
+                    session.capture = capture = None
+
+                session.reset_event.clear()
+
+                async with session.config_lock:
+                    snapshot = session.camera_config()["requested"]
+
+                if session.source != "camera":
+                    # Grabación o sintética, paceada a su fps y en bucle
+                    cap_candidate = await asyncio.to_thread(
+                        open_source, session.source, True, True, snapshot["fps"]
+                    )
+                    info = dict(cap_candidate.info) if cap_candidate is not None else {"source": session.source}
+                else:
+                    if session.probe_other_cameras:
+                        indices = _camera_index_candidates(snapshot["index"])
+                    else:
+                        indices = [max(0, int(snapshot["index"]))]
+                    codecs = _unique_sequence([snapshot["codec"]] + session.preferred_codecs)
+                    resolutions = _unique_sequence([(snapshot["width"], snapshot["height"]) ] + session.default_resolutions)
+
+                    cap_candidate, info = await asyncio.to_thread(
+                        _open_camera_device, indices, codecs, resolutions, snapshot["fps"]
+                    )
+                    if cap_candidate is not None:
+                        cap_candidate = CameraSource(cap_candidate, info)
                 if cap_candidate is None:
-                    CURRENT_VIDEO_INFO.update({**info, "orientation": snapshot["orientation"]})
+                    session.video_info.update({**info, "orientation": snapshot["orientation"]})
+                    await publish_config(session)
                     await asyncio.sleep(1.0)
                     continue
 
-                cap = cap_candidate
-                config_snapshot = {**snapshot, **info}
-                config_snapshot["orientation"] = snapshot["orientation"]
-                CURRENT_VIDEO_INFO.update({**info, "orientation": snapshot["orientation"]})
+                orientation = snapshot["orientation"]
+                capture = session.capture = CaptureThread(
+                    cap_candidate,
+                    FrameRing(CAPTURE_RING_SIZE),
+                    transform=lambda f, o=orientation: apply_orientation(f, o),
+                    on_frame=lambda: loop.call_soon_threadsafe(frame_ready.set),
+                )
+                capture.start()
+                session.video_info.update({**info, "orientation": snapshot["orientation"]})
 
-                if info.get("codec") or info.get("width"):
-                    _update_preferred_video(
+                if session.source == "camera" and (info.get("codec") or info.get("width")):
+                    session.update_preferred_video(
                         info.get("codec"),
                         (info.get("width"), info.get("height")) if info.get("width") and info.get("height") else None,
                         info.get("fps"),
                     )
+                await publish_config(session)
 
                 frame_count = 0
-                consecutive_failures = 0
-
-            ok, frame = cap.read()
-            if not ok:
-                await asyncio.sleep(0.1)
-                consecutive_failures += 1
-                if consecutive_failures > 10:
-                    print("⚠️ Se perdió la señal de video, reintentando...")
-                    camera_reset_event.set()
+                scheduler.reset()
+
+            # Siempre el frame más reciente; los que no alcanzamos a procesar se descartan
+            frame_ready.clear()
+            captured = capture.ring.take_latest()
+            if captured is None:
+                try:
+                    await asyncio.wait_for(frame_ready.wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass
                 continue
 
-            consecutive_failures = 0
+            # Tras un overrun se salta la inferencia de algunos frames para no acumular
+            # atraso; el frame saltado se descarta y se toma el siguiente sin dormir
+            if not scheduler.begin_frame():
+                continue
 
-            frame = apply_orientation(frame, config_snapshot.get("orientation", "none"))
+            frame = captured.frame
+
+            # Inferencia fuera del event loop (etapa compartida entre streams);
+            # si la etapa está saturada se descarta el frame
+            try:
+                with scheduler.stage("inference"):
+                    analysis = await session.worker.submit(
+                        analyze_frame, session.stream_id, session.pipeline, frame, None, captured.ts
+                    )
+            except StageBusy:
+                capture.ring.dropped += 1
+                await asyncio.sleep(scheduler.end_frame())
+                continue
+            except StageDown as e:
+                # Sin etapa de inferencia no hay nada que analizar; /health/ready lo reporta
+                print(f"❌ Loop de cámara '{session.stream_id}' detenido: {e}")
+                break
+            logic_t0 = time.perf_counter()
 
             frame_count += 1
-            h, w = frame.shape[:2]
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_mesh.process(rgb)
-
-            ear = mar = None
-            yaw = pitch = roll = None
-            processed = frame.copy()
-            reason: List[str] = []
-            fused_score = None
-            landmarks_preview = None
-            drowsiness_stage = "normal"
-            stage_reasons: List[str] = []
-
-            if results.multi_face_landmarks:
-                lms = results.multi_face_landmarks[0].landmark
-
-                # EAR
-                ear_left  = eye_aspect_ratio(lms, LEFT_EYE_IDX, w, h)
-                ear_right = eye_aspect_ratio(lms, RIGHT_EYE_IDX, w, h)
-                ear = (ear_left + ear_right) / 2.0
-
-                # MAR
-                mar = mouth_aspect_ratio(lms, w, h)
-
-                # Head pose
-                yaw, pitch, roll = estimate_head_pose(lms, w, h)
-
-                processed = draw_landmarks_on_frame(frame, lms)
-                landmarks_preview = render_landmark_cloud(lms, w, h)
-
-                # Texto de depuración
-                y0 = 28
-                for label, val in [
-                    ("EAR", ear), ("MAR", mar),
-                    ("Yaw", yaw), ("Pitch", pitch), ("Roll", roll)
-                ]:
-                    if val is not None:
-                        cv2.putText(processed, f'{label}: {val:.3f}', (10, y0),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                        y0 += 24
-
-                # Lógica EAR: contador de ojos cerrados
-                if ear is not None and ear < EAR_THRESHOLD:
-                    closed_frames += 1
-                    cv2.putText(processed, 'OJOS CERRADOS', (10, y0),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    reason.append("EAR<thr")
-                else:
-                    closed_frames = 0
-                    cv2.putText(processed, 'OJOS ABIERTOS', (10, y0),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                y0 += 26
-
-                # ======= FUSIÓN DE SEÑALES =======
-                # Normalizaciones simples 0..1
-                # EAR_score: 1 (muy somnoliento) cuando ear << thr
-                ear_score = 0.0
-                if ear is not None:
-                    ear_score = clamp01((EAR_THRESHOLD - ear) / max(1e-6, EAR_THRESHOLD*0.6))
-
-                # MAR_score: 1 cuando mar >> thr (bostezo grande)
-                mar_score = 0.0
-                if mar is not None:
-                    mar_score = clamp01((mar - MAR_THRESHOLD) / max(1e-6, MAR_THRESHOLD*0.8))
-                    if mar > MAR_THRESHOLD:
-                        reason.append("MAR>thr")
-
-                # Pose_score: 1 cuando |pitch| excede umbral
-                pose_score = 0.0
-                if pitch is not None:
-                    pose_score = clamp01((abs(pitch) - PITCH_DEG_THRESHOLD) / max(1e-6, PITCH_DEG_THRESHOLD))
-                    if abs(pitch) > PITCH_DEG_THRESHOLD:
-                        reason.append("Pitch>thr")
-
-                fused_score = W_EAR*ear_score + W_MAR*mar_score + W_POSE*pose_score
-
-                drowsiness_stage, stage_reasons = evaluate_drowsiness_stage(
-                    ear,
-                    mar,
-                    pitch,
-                    fused_score,
-                    closed_frames,
-                )
-                for desc in stage_reasons:
-                    if desc not in reason:
-                        reason.append(desc)
-
-                # Disparo por fusión O por contador de frames cerrados
-                should_alarm = (
-                    drowsiness_stage == "drowsy"
-                    or (fused_score is not None and fused_score >= FUSION_THRESHOLD)
-                    or closed_frames >= CONSEC_FRAMES
+            landmark_frame = analysis["landmarks"]
+            hud, reason, fused_score, drowsiness_stage, stage_reasons = evaluate_analysis(
+                session, analysis, captured.ts
+            )
+            try:
+                record_metrics(session, captured.ts, fused_score, drowsiness_stage, reason)
+            except Exception as e:
+                print(f"[metric_buckets] error: {e}")
+
+            scheduler.record("logic", (time.perf_counter() - logic_t0) * 1000.0)
+
+            # Vistas previa perezosas: nada se dibuja ni se codifica hasta que alguien las pide
+            preview = make_preview(captured.frame_id, frame, landmark_frame.array, hud)
+
+            # Plan del tick: qué streams toca a cada cliente (rate propio o cadencia por defecto)
+            now_mono = time.monotonic()
+            plan = plan_tick(session, frame_count, now_mono)
+            metrics_tick = frame_count % METRICS_EVERY_N_FRAMES == 0
+
+            # Payload de métricas/preview
+            if metrics_tick or plan:
+                metrics = build_metrics(
+                    session, fused_score, drowsiness_stage, stage_reasons, reason,
+                    extra={
+                        "stream": session.stream_id,
+                        "frameId": captured.frame_id,
+                        "captureTs": round(captured.ts, 3),
+                        "droppedFrames": capture.ring.dropped,
+                        "scheduler": scheduler.stats(),
+                    },
                 )
+                if plan:
+                    with scheduler.stage("dispatch"):
+                        await dispatch_tick(plan, metrics, preview, captured.ts, now_mono)
+                if metrics_tick:
+                    await broadcast_held_events(session)
 
-                now_ts = time.time()
-                if should_alarm and (now_ts - _APP_START_TS >= ALARM_GRACE_S):
-                    # Histeresis: exigir ALARM_HOLD_S de condición sostenida
-                    global _alarm_candidate_since
-                    if _alarm_candidate_since is None:
-                        _alarm_candidate_since = now_ts
-                    held = (now_ts - _alarm_candidate_since) >= ALARM_HOLD_S
-                    if held:
-                        is_drowsy = True
-                        cv2.putText(processed, 'ALERTA DE SOMNOLENCIA!', (10, y0),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 3)
-                        if USE_PYTHON_ALARM and pygame.mixer.get_init():
-                            if not pygame.mixer.music.get_busy():
-                                pygame.mixer.music.play(-1)
-                else:
-                    # Reset candidato y apagar si estaba sonando
-                    _alarm_candidate_since = None
-                    if is_drowsy:
-                        is_drowsy = False
-                        if USE_PYTHON_ALARM and pygame.mixer.get_init():
-                            pygame.mixer.music.stop()
-
-            else:
-                processed = frame.copy()
-                cv2.putText(processed, 'NO SE DETECTA ROSTRO',
-                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                fused_score = fused_score if fused_score is not None else 0.0
-                reason.append("Sin rostro detectado")
-
-            # Actualizar últimas métricas
-            last_ear = float(ear) if ear is not None else None
-            last_mar = float(mar) if mar is not None else None
-            last_yaw = float(yaw) if yaw is not None else None
-            last_pitch = float(pitch) if pitch is not None else None
-            last_roll = float(roll) if roll is not None else None
-
-            # Frames a base64
-            raw_b64 = frame_to_base64(frame)
-            proc_b64 = frame_to_base64(processed)
-
-            # Payload de métricas/preview (se mantiene como antes)
-            if frame_count % 5 == 0:
-                active_camera = {k: v for k, v in CURRENT_VIDEO_INFO.items()}
-                if active_camera.get("orientation") is None:
-                    active_camera["orientation"] = FRAME_ORIENTATION
-
-                camera_config = {
-                    "active": active_camera,
-                    "requested": {
-                        "index": CAMERA_INDEX,
-                        "width": CAMERA_WIDTH,
-                        "height": CAMERA_HEIGHT,
-                        "fps": CAMERA_FPS,
-                        "codec": CAMERA_CODEC,
-                        "orientation": FRAME_ORIENTATION,
-                    },
-                    "options": {
-                        "codecs": PREFERRED_CODECS,
-                        "resolutions": [[int(w), int(h)] for (w, h) in DEFAULT_RESOLUTIONS],
-                        "fps": PREFERRED_FPS,
-                    },
-                }
-
-                config_payload = {
-                    "usePythonAlarm": USE_PYTHON_ALARM,
-                    "camera": camera_config,
-                }
-
-                fused_value = round(fused_score, 3) if fused_score is not None else None
-
-                threshold_snapshot = _copy_thresholds()
-                mesh_b64 = frame_to_base64(landmarks_preview) if landmarks_preview is not None else None
-                stage_reasons = list(dict.fromkeys(stage_reasons))
-                reason = list(dict.fromkeys(reason))
-
-                payload = {
-                    "message_type": "metrics",
-                    "ear": round(last_ear, 4) if last_ear is not None else None,
-                    "mar": round(last_mar, 4) if last_mar is not None else None,
-                    "yaw": round(last_yaw, 2) if last_yaw is not None else None,
-                    "pitch": round(last_pitch, 2) if last_pitch is not None else None,
-                    "roll": round(last_roll, 2) if last_roll is not None else None,
-                    "closedFrames": closed_frames,
-                    "threshold": EAR_THRESHOLD,
-                    "consecFrames": CONSEC_FRAMES,
-                    "thresholds": threshold_snapshot,
-                    "thresholdOrder": list(THRESHOLD_TIERS),
-                    "weights": {"ear": W_EAR, "mar": W_MAR, "pose": W_POSE},
-                    "isDrowsy": is_drowsy,
-                    "drowsinessLevel": drowsiness_stage,
-                    "stageReasons": stage_reasons,
-                    "fusedScore": fused_value,
-                    "reason": reason,
-                    "rawFrame": raw_b64,
-                    "processedFrame": proc_b64,
-                    "landmarksFrame": mesh_b64,
-                    "config": config_payload,
-                }
-                await broadcast(payload)
-
-                # === Persistencia de métricas (cada 5 frames) ===
+                # === Persistencia de métricas (cada METRICS_EVERY_N_FRAMES frames) ===
                 try:
-                    if supabase and SESSION_ID:
-                        metric_row = {
-                            "session_id": SESSION_ID,
-                            "ear": last_ear,
-                            "mar": last_mar,
-                            "yaw": last_yaw,
-                            "pitch": last_pitch,
-                            "roll": last_roll,
-                            "fused_score": fused_value,
-                            "closed_frames": closed_frames,
-                            "is_drowsy": is_drowsy,
-                            "reason": reason,
-                            # Si quieres, puedes guardar los frames (cuidado tamaño):
-                            # "raw_frame_b64": raw_b64,
-                            # "processed_frame_b64": proc_b64,
-                        }
-                        await queue_metric(metric_row)
+                    if metrics_tick:
+                        persist_metrics(session, captured.ts, metrics)
                 except Exception as e:
                     print(f"[Supabase metrics] error: {e}")
 
-            # === NUEVO: pipeline de eventos de somnolencia (usa el frame BGR crudo) ===
+            # Eventos del pipeline (calculados en la etapa de inferencia)
             try:
-                events = pipeline.step(frame)
-                if events:
-                    for e in events:
-                        await handle_event(e)
+                with scheduler.stage("events"):
+                    for e in analysis["events"]:
+                        # CapturedFrame.ts ya es epoch (se toma al salir de cap.read())
+                        await handle_event(session, e, captured.ts, captured.ts)
             except Exception as ex:
                 print(f"[pipeline] error: {ex}")
 
-            await asyncio.sleep(0.033)
+            # Dormir solo lo que queda del presupuesto del frame
+            await asyncio.sleep(scheduler.end_frame())
     finally:
-        if cap:
-            cap.release()
-        if pygame.mixer.get_init():
+        if session.capture is not None:
+            session.capture.stop()
+            session.capture = None
+        if not running and pygame.mixer.get_init():
             pygame.mixer.quit()
-        print("Cámara liberada")
+        print(f"Cámara liberada ({session.stream_id})")
+
+# =====================
+# WebSocket: ingesta remota de frames
+# =====================
+# Streams remotos conectados: stream_id -> (sesión de la conexión, buzón de frames)
+ingest_sessions: Dict[str, Tuple[StreamSession, IngestSlot]] = {}
+_ingest_seq = 0
+
+
+def _worker_load(worker: InferenceWorker) -> int:
+    streams = list(sessions.values()) + [s for s, _ in ingest_sessions.values()]
+    return sum(1 for s in streams if s.worker is worker)
+
+
+async def _release_graphs(worker: InferenceWorker, stream_id: str) -> None:
+    """Los grafos de un stream se liberan en el hilo de la etapa que los posee."""
+    for _ in range(20):
+        try:
+            await worker.submit(release_graphs, stream_id)
+            return
+        except StageBusy:
+            await asyncio.sleep(0.05)
+        except StageDown:
+            return      # el hilo ya no existe: sus grafos se fueron con él
+    print(f"⚠️ No se pudo liberar los grafos de {stream_id}")
+
+
+async def ingest_loop(session: StreamSession, slot: IngestSlot, client: WsClient):
+    """
+    Analiza los frames de una conexión /ingest en orden de llegada, siempre el más
+    reciente, y responde métricas (coalescidas si el cliente no lee) y eventos.
+    """
+    frame_count = 0
+    while not client.closed:
+        (msg_type, frame_id, ts, payload), arrived = await slot.take()
+        # ts es el reloj del cliente; para persistir eventos vale la llegada al servidor
+        wall_ts = time.time() - (time.monotonic() - arrived)
+        t0 = time.perf_counter()
+        analysis = None
+        while True:
+            try:
+                analysis = await session.worker.submit(
+                    analyze_ingest, session.stream_id, session.pipeline, msg_type, payload, ts
+                )
+                if analysis is None:
+                    slot.invalid += 1   # JPEG que no se pudo decodificar
+                break
+            except StageDown as e:
+                print(f"❌ [ingest] {session.stream_id}: {e}")
+                client.close(code=1011)
+                return
+            except StageBusy:
+                # Etapa saturada: reintentar mientras el frame siga vigente y no haya uno
+                # más nuevo; si no, se descarta (el cliente ve `shed` subir y baja su tasa)
+                if slot.pending or time.monotonic() - arrived > slot.max_age_s:
+                    slot.shed += 1
+                    break
+                await asyncio.sleep(INGEST_RETRY_S)
+            except Exception as ex:
+                slot.invalid += 1
+                print(f"[ingest] error ({session.stream_id}): {ex}")
+                break
+        if analysis is None:
+            continue
+        slot.processed += 1
+        slot.last_ms = (time.perf_counter() - t0) * 1000.0
+        frame_count += 1
+
+        _, reason, fused_score, drowsiness_stage, stage_reasons = evaluate_analysis(session, analysis, ts)
+        metrics = build_metrics(
+            session, fused_score, drowsiness_stage, stage_reasons, reason,
+            extra={
+                "stream": session.stream_id,
+                "frameId": frame_id,
+                "captureTs": round(ts, 3),
+                "ingest": slot.stats(),
+            },
+        )
+        client.enqueue([metrics.encode()], KIND_TICK)
+
+        if frame_count % METRICS_EVERY_N_FRAMES == 0:
+            await broadcast_held_events(session)
+        try:
+            record_metrics(session, ts, fused_score, drowsiness_stage, reason)
+            if frame_count % METRICS_EVERY_N_FRAMES == 0:
+                persist_metrics(session, ts, metrics)
+        except Exception as e:
+            print(f"[Supabase metrics] error: {e}")
+
+        try:
+            for e in analysis["events"]:
+                await handle_event(session, e, ts, wall_ts)
+        except Exception as ex:
+            print(f"[pipeline] error: {ex}")
+
+
+@app.websocket("/ingest")
+async def ingest_ws(ws: WebSocket):
+    """
+    Frames de un cliente remoto (JPEG o landmarks con su timestamp de captura, ver
+    runtime/ws_protocol.py), analizados con detectores y umbrales propios de la
+    conexión. Las métricas y eventos vuelven por el mismo socket como JSON.
+    """
+    global _ingest_seq
+    await ws.accept()
+    if len(ingest_sessions) >= INGEST_MAX_STREAMS:
+        # Admisión: se rechaza de entrada en vez de degradar a los streams ya conectados
+        await ws.close(code=1013)
+        return
+
+    _ingest_seq += 1
+    stream_id = f"ingest-{_ingest_seq}"
+    alive = [w for w in inference_workers if w.alive]
+    if not alive:
+        await ws.close(code=1011)
+        return
+    worker = min(alive, key=_worker_load)
+    session = StreamSession(stream_id, source="ingest", worker=worker,
+                            local_alarm=False, started_ts=None)
+    client = WsClient(ws, PROTOCOL_JSON, max_queue=WS_MAX_QUEUE, evict_after_s=WS_EVICT_AFTER_S)
+    client.start()
+    session.clients.add(client)
+    slot = IngestSlot(INGEST_MAX_AGE_MS / 1000.0)
+    ingest_sessions[stream_id] = (session, slot)
+    print(f"Stream remoto conectado: {stream_id} ({worker.name}). Total: {len(ingest_sessions)}")
+
+    client.enqueue([json.dumps({
+        "message_type": "ingest_ready",
+        "stream": stream_id,
+        "maxAgeMs": INGEST_MAX_AGE_MS,
+        "minLandmarks": REQUIRED_LANDMARKS,
+    }), session.config_snapshot().message.encode()])
+    task = asyncio.create_task(ingest_loop(session, slot, client))
+    try:
+        while not client.closed:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            data = msg.get("bytes")
+            if data is not None:
+                try:
+                    slot.put(unpack_ingest(data, REQUIRED_LANDMARKS))
+                except LandmarkCountError as e:
+                    # No es un frame suelto mal formado: el cliente usa otra malla
+                    # (p.ej. sin iris) y todos sus frames fallarían en el análisis
+                    slot.invalid += 1
+                    print(f"[ingest] {stream_id}: {e}")
+                    client.close(code=1003, reason=str(e))
+                    break
+                except ProtocolError:
+                    slot.invalid += 1
+                continue
+            text = msg.get("text")
+            if text == "ping":
+                client.enqueue(["pong"])
+            elif text and text.startswith("{"):
+                # Control: umbrales/pesos de esta conexión, mismo formato que POST /config
+                try:
+                    control = json.loads(text)
+                except ValueError:
+                    continue
+                if isinstance(control, dict) and isinstance(control.get("config"), dict):
+                    session.apply_config(control["config"])
+                    session.refresh_config()
+                    client.enqueue([session.config_snapshot().message.encode()], KIND_PRIORITY)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        task.cancel()
+        ingest_sessions.pop(stream_id, None)
+        flush_metric_buckets(session)
+        client.close()
+        await _release_graphs(worker, stream_id)
+        print(f"Stream remoto desconectado: {stream_id}. Total: {len(ingest_sessions)}")
 
 @app.on_event("startup")
 async def on_start():
     print("🚀 Iniciando servidor de detección de somnolencia...")
 
-    # Supabase
-    init_supabase()
-    global DEVICE_ID, SESSION_ID
+    # Spool local: lo que quedó sin subir en la ejecución anterior se repone al haber red
+    global DEVICE_ID, spool, rest_writer
+    spool = _open_spool()
+    if spool is not None:
+        pending = sum(spool.backlog().values())
+        print(f"💾 Spool {SPOOL_PATH}" + (f" ({pending} filas por subir)" if pending else ""))
+
+    # Supabase: un device por proceso, una sesión por stream (si no hay red se
+    # reintenta desde el flusher y las filas esperan en el spool)
+    rest_writer = _open_writer()
     try:
-        if supabase:
-            DEVICE_ID = supa_upsert_device_by_name(DEVICE_NAME, DEVICE_MODEL)
-            if DEVICE_ID is not None:
-                SESSION_ID = supa_create_session(DEVICE_ID)
-                print(f"📦 Device ID: {DEVICE_ID} | Session ID: {SESSION_ID}")
-                # Guarda config inicial del device
-                supa_upsert_device_config(DEVICE_ID, _config_dict())
-            else:
-                print("⚠️ No se pudo registrar el dispositivo en Supabase.")
-    except Exception as e:
+        if await _ensure_supabase():
+            for session in sessions.values():
+                if spool is not None:
+                    await _remote_session(session.session_key)
+                print(f"📦 Device ID: {DEVICE_ID} | Stream: {session.stream_id} | Session ID: {session.session_id}")
+            # Guarda config inicial del device
+            await supa_upsert_device_config(DEVICE_ID, sessions[DEFAULT_STREAM].config_snapshot().config)
+        elif rest_writer is not None:
+            print("⚠️ No se pudo registrar el dispositivo en Supabase.")
+    except WriteError as e:
         print(f"[startup] Supabase error: {e}")
 
+    for session in sessions.values():
+        session.history = await asyncio.to_thread(_open_history, session)
+
+    # Etapas de inferencia (cada una crea los grafos de sus streams en su propio hilo)
+    for worker in inference_workers:
+        await asyncio.to_thread(worker.start)
+    preview_stage.start()
+
     # Loops
-    asyncio.create_task(camera_loop())
-    asyncio.create_task(flush_loop())
+    for session in sessions.values():
+        asyncio.create_task(camera_loop(session))
+    if spool is not None:
+        asyncio.create_task(spool_sync_loop())
+        asyncio.create_task(flush_loop())
+    health_monitor.start()
 
 @app.on_event("shutdown")
 async def on_shutdown():
-    global running
+    global running, spool
     running = False
     print("🛑 Cerrando servidor...")
-    # Flush final
+    await health_monitor.stop()
+    for session in sessions.values():
+        if session.worker is not None and session.worker.alive:
+            await _release_graphs(session.worker, session.stream_id)
+    for worker in inference_workers:
+        await asyncio.to_thread(worker.stop)
+    await asyncio.to_thread(preview_stage.stop)
+    for session in sessions.values():
+        history, session.history = session.history, None
+        if history is not None:
+            await asyncio.to_thread(history.close)
+    # Lo pendiente solo se lleva al disco (sin red en el camino del apagado);
+    # se sube en la próxima ejecución
     try:
-        async with buffers_lock:
-            metrics_batch = METRICS_BUFFER[:]
-            events_batch = EVENTS_BUFFER[:]
-            window_batch = WINDOW_BUFFER[:]
-            METRICS_BUFFER.clear()
-            EVENTS_BUFFER.clear()
-            WINDOW_BUFFER.clear()
-        if metrics_batch:
-            supa_insert_batch("metrics", metrics_batch)
-        if events_batch:
-            supa_insert_batch("events", events_batch)
-        if window_batch:
-            supa_insert_batch("window_reports", window_batch)
+        if spool is not None:
+            for session in list(sessions.values()) + [s for s, _ in ingest_sessions.values()]:
+                flush_metric_buckets(session)
+            closing, spool = spool, None
+            await asyncio.get_running_loop().run_in_executor(spool_executor, closing.close)
     except Exception as e:
-        print(f"[shutdown flush] error: {e}")
+        print(f"[shutdown spool] error: {e}")
+    if rest_writer is not None:
+        await rest_writer.aclose()
 
 @app.get("/")
 def root():
     return {
         "message": "Drowsiness backend running",
         "ws": "/ws",
+        "ingest": "/ingest",
         "config": "/config",
+        "history": "/history",
+        "streams": list(sessions),
         "status": "OK",
         "camera": "Active" if running else "Inactive"
     }
 
-@app.get("/health")
-def health():
-    supa_ok = False
-    supa_err = None
+# =====================
+# Salud: sondas en segundo plano, /health responde desde memoria
+# =====================
+async def _probe_database():
+    """Consulta real a Supabase (devices) + estado del spool y del flusher; no crítica: hay spool."""
+    detail = {
+        "supabase": rest_writer is not None,
+        "device_id": DEVICE_ID,
+        "spool": spool.stats() if spool is not None else None,
+        "flush": flusher.stats() if spool is not None else None,
+        "supabase_check": {"ok": False, "error": None},
+    }
+    if rest_writer is None:
+        return True, detail
     try:
-        if supabase:
-            # Verificación real contra la tabla devices en el esquema activo
-            resp = supabase.table("devices").select("id").limit(1).execute()
-            # Si no lanza excepción y data es lista (aunque vacía), consideramos ok
-            if hasattr(resp, "data"):
-                supa_ok = True
-    except Exception as e:
-        supa_err = str(e)
-
-    return {
-        "status": "healthy",
+        await rest_writer.select("devices", {"select": "id", "limit": "1"})
+        detail["supabase_check"]["ok"] = True
+    except WriteError as e:
+        detail["supabase_check"]["error"] = str(e)
+    detail["supabase_writer"] = rest_writer.stats()
+    return detail["supabase_check"]["ok"], detail
+
+
+_captured_at_probe: Dict[str, int] = {}
+
+
+async def _probe_camera():
+    """Cada stream local con captura activa y frames nuevos desde la sonda anterior."""
+    ok = True
+    streams = {}
+    for sid, session in sessions.items():
+        stats = session.stats()
+        capture = session.capture
+        captured = capture.ring.captured if capture is not None else None
+        advancing = captured is not None and captured != _captured_at_probe.get(sid)
+        if captured is not None:
+            _captured_at_probe[sid] = captured
+        stats["ok"] = capture is not None and not capture.lost and advancing
+        ok = ok and stats["ok"]
+        streams[sid] = stats
+    return ok, {
         "camera_active": running,
+        "streams": streams,
+        "current_config": sessions[DEFAULT_STREAM].config_snapshot().config,
+        "session_id": sessions[DEFAULT_STREAM].session_id,
+    }
+
+
+_processed_at_probe: Dict[str, int] = {}
+
+
+async def _probe_inference():
+    """Hilos de inferencia vivos y sin trabarse (con trabajo pendiente deben avanzar)."""
+    ok = True
+    stages = {}
+    for w in inference_workers:
+        stats = w.stats()
+        stuck = stats["pending"] > 0 and w.processed == _processed_at_probe.get(w.name)
+        _processed_at_probe[w.name] = w.processed
+        stats["ok"] = w.alive and not stuck
+        ok = ok and stats["ok"]
+        stages[w.name] = stats
+    return ok, {"stages": {"inference": stages, "preview": preview_stage.stats()}}
+
+
+async def _probe_clients():
+    """Fan-out a clientes /ws e /ingest (informativo)."""
+    clients = [c for s in sessions.values() for c in s.clients]
+    return True, {
         "clients_connected": len(clients),
-        "current_config": _config_dict(),
-        "supabase": bool(supabase),
-        "supabase_check": {"ok": supa_ok, "error": supa_err},
-        "device_id": DEVICE_ID,
-        "session_id": SESSION_ID,
+        "clients": [c.stats() for c in clients],
+        "ingest": {
+            "max_streams": INGEST_MAX_STREAMS,
+            "streams": {sid: {**s.stats(), "frames": slot.stats()} for sid, (s, slot) in ingest_sessions.items()},
+        },
     }
 
+
+health_monitor = HealthMonitor()
+health_monitor.add("database", _probe_database, HEALTH_DB_SECS, timeout_s=15.0, critical=False)
+health_monitor.add("camera", _probe_camera, HEALTH_CAMERA_SECS)
+health_monitor.add("inference", _probe_inference, HEALTH_INFERENCE_SECS)
+health_monitor.add("clients", _probe_clients, HEALTH_CLIENTS_SECS, critical=False)
+
+
+@app.get("/health")
+async def health():
+    """Estado desde el caché de las sondas (sin red ni recálculo); `probes` trae edad y vencimiento."""
+    probes = health_monitor.snapshot()
+    out: Dict[str, Any] = {"status": health_monitor.status()}
+    for name in ("camera", "inference", "clients", "database"):
+        out.update(probes[name]["detail"])
+    out["probes"] = {name: {k: v for k, v in p.items() if k != "detail"} for name, p in probes.items()}
+    return out
+
+
+@app.get("/health/live")
+async def health_live():
+    ok, info = health_monitor.live()
+    return JSONResponse({"live": ok, **info}, status_code=200 if ok else 503)
+
+
+@app.get("/health/ready")
+async def health_ready():
+    ok, info = health_monitor.ready()
+    return JSONResponse({"ready": ok, **info}, status_code=200 if ok else 503)
+
 # Run:
 # uvicorn app:app --host 0.0.0.0 --port 8000 --reload
@@ -0,0 +1,151 @@
+# bench/bench_face_features.py
+"""
+Microbenchmark de extracción de rasgos por frame (EAR ambos ojos, MAR, pose):
+funciones anteriores de app.py (landmark a landmark, np.array por punto) vs
+detection.data_processing.face_features (arreglo (N, 3) + índices precalculados).
+La conversión a (N, 3) se mide aparte (serializado validado vs atributos): se
+hace una vez por frame sobre los 478 landmarks y la reutilizan FaceRoiTracker,
+pipeline y vistas previa.
+
+Ejecutar desde drowsy-backend/:
+    python -m bench.bench_face_features --frames 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection.data_processing.face_features import (  # noqa: E402
+    LEFT_EYE_IDX, RIGHT_EYE_IDX,
+    MOUTH_L_CORNER, MOUTH_R_CORNER, MOUTH_TOP_IN, MOUTH_BOT_IN,
+    MOUTH_TOP_OUT1, MOUTH_BOT_OUT1, MOUTH_TOP_OUT2, MOUTH_BOT_OUT2,
+    PNP_NOSE_TIP, PNP_CHIN, PNP_LEYE_OUT, PNP_REYE_OUT, PNP_LMOUTH, PNP_RMOUTH,
+    _array_from_attrs, extract_features, landmarks_to_array,
+)
+
+W, H = 1280, 720
+N_LANDMARKS = 478
+
+
+def synthetic_landmarks(rng):
+    """NormalizedLandmarkList como el de FaceMesh: nube alrededor del centro."""
+    msg = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in 0.5 + 0.12 * rng.standard_normal((N_LANDMARKS, 3)):
+        msg.landmark.add(x=float(x), y=float(y), z=float(z))
+    return msg
+
+
+# ---- implementación anterior (copiada de app.py) ----
+def dist(a, b):
+    return np.linalg.norm(a - b)
+
+def eye_aspect_ratio(landmarks, idxs, frame_w, frame_h):
+    pts = []
+    for i in idxs:
+        lm = landmarks[i]
+        pts.append(np.array([int(lm.x * frame_w), int(lm.y * frame_h)], dtype=np.float32))
+    A = dist(pts[1], pts[5])
+    B = dist(pts[2], pts[4])
+    C = dist(pts[0], pts[3]) + 1e-6
+    return (A + B) / (2.0 * C)
+
+def mouth_aspect_ratio(landmarks, w, h):
+    def p(idx):
+        lm = landmarks[idx]
+        return np.array([lm.x * w, lm.y * h], dtype=np.float32)
+    v1 = dist(p(MOUTH_TOP_IN),  p(MOUTH_BOT_IN))
+    v2 = dist(p(MOUTH_TOP_OUT1),p(MOUTH_BOT_OUT1))
+    v3 = dist(p(MOUTH_TOP_OUT2),p(MOUTH_BOT_OUT2))
+    vertical = (v1 + v2 + v3) / 3.0
+    horizontal = dist(p(MOUTH_L_CORNER), p(MOUTH_R_CORNER)) + 1e-6
+    return vertical / horizontal
+
+def estimate_head_pose(landmarks, w, h):
+    def p2d(idx):
+        lm = landmarks[idx]
+        return (lm.x * w, lm.y * h)
+    image_points = np.array([p2d(PNP_NOSE_TIP), p2d(PNP_CHIN), p2d(PNP_LEYE_OUT),
+                             p2d(PNP_REYE_OUT), p2d(PNP_LMOUTH), p2d(PNP_RMOUTH)], dtype=np.float32)
+    model_points = np.array([(0.0, 0.0, 0.0), (0.0, -90.0, -25.0), (-60.0, 40.0, -50.0),
+                             (60.0, 40.0, -50.0), (-40.0, -30.0, -50.0), (40.0, -30.0, -50.0)],
+                            dtype=np.float32)
+    camera_matrix = np.array([[w, 0, w / 2], [0, w, h / 2], [0, 0, 1]], dtype=np.float32)
+    dist_coeffs = np.zeros((4, 1), dtype=np.float32)
+    ok, rvec, tvec = cv2.solvePnP(model_points, image_points, camera_matrix, dist_coeffs, flags=cv2.SOLVEPNP_EPNP)
+    if not ok:
+        return None, None, None
+    R, _ = cv2.Rodrigues(rvec)
+    sy = np.sqrt(R[0,0]*R[0,0] + R[1,0]*R[1,0])
+    if sy >= 1e-6:
+        return (np.degrees(np.arctan2(-R[2,0], sy)), np.degrees(np.arctan2(R[2,1], R[2,2])),
+                np.degrees(np.arctan2(R[1,0], R[0,0])))
+    return np.degrees(np.arctan2(-R[2,0], sy)), np.degrees(np.arctan2(-R[1,2], R[1,1])), 0.0
+
+
+def frame_before(msg):
+    lms = msg.landmark
+    ear = (eye_aspect_ratio(lms, LEFT_EYE_IDX, W, H) + eye_aspect_ratio(lms, RIGHT_EYE_IDX, W, H)) / 2.0
+    mar = mouth_aspect_ratio(lms, W, H)
+    yaw, pitch, roll = estimate_head_pose(lms, W, H)
+    return ear, mar, yaw, pitch, roll
+
+
+def frame_after(lms):
+    f = extract_features(landmarks_to_array(lms), W, H)
+    return f["ear"], f["mar"], f["yaw"], f["pitch"], f["roll"]
+
+
+def bench(fn, frames, repeat: int = 5) -> float:
+    """Mejor de `repeat` pasadas, en µs/frame (la máquina compartida mete ruido)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for lms in frames:
+            fn(lms)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(frames) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [synthetic_landmarks(rng) for _ in range(min(args.frames, 200))]
+    frames = (frames * (args.frames // len(frames) + 1))[:args.frames]
+
+    # mismas salidas (salvo redondeo float32)
+    for lms in frames[:50]:
+        a, b = frame_before(lms), frame_after(lms)
+        assert np.allclose(a, b, rtol=1e-3, atol=1e-3), (a, b)
+        assert np.array_equal(landmarks_to_array(lms), _array_from_attrs(lms.landmark)), "conversión"
+    # Un mensaje con otro formato (visibility presente) cae a la lectura por atributos
+    odd = landmark_pb2.NormalizedLandmarkList()
+    odd.CopyFrom(frames[0])
+    odd.landmark[5].visibility = 0.5
+    assert np.array_equal(landmarks_to_array(odd), _array_from_attrs(odd.landmark)), "fallback"
+
+    arrays = [landmarks_to_array(m) for m in frames]
+    array_only = bench(landmarks_to_array, frames)
+    attrs_only = bench(lambda m: _array_from_attrs(m.landmark), frames)
+    before = bench(frame_before, frames)
+    after = bench(frame_after, frames)
+    features_only = bench(lambda a: extract_features(a, W, H), arrays)
+    print(f"frames: {args.frames}")
+    print(f"antes (landmark a landmark):        {before:7.1f} µs/frame")
+    print(f"ahora (arreglo + índices):          {after:7.1f} µs/frame")
+    print(f"  conversión a (N, 3):              {array_only:7.1f} µs/frame")
+    print(f"    (por atributos, sin serializar: {attrs_only:7.1f} µs/frame)")
+    print(f"  rasgos sobre el arreglo:          {features_only:7.1f} µs/frame")
+    print(f"mejora: x{before / max(after, 1e-9):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# bench/bench_pipeline.py
+"""
+Benchmark headless del camino completo por frame, sin cámara ni GPU:
+lectura -> FaceMesh (ROI) -> EAR/MAR/pose -> DrowsinessPipeline -> fusión +
+evaluate_drowsiness_stage -> render 'processed' -> JPEG -> JSON de métricas.
+
+Corre tan rápido como puede (sin pacing) sobre una grabación, un directorio de
+imágenes o la fuente sintética, y reporta frames/s y p50/p95/p99 por etapa. Los
+detectores reciben el tiempo de medio de cada frame, así que los eventos son los
+mismos que en tiempo real y no dependen de la velocidad de la máquina.
+
+Ejecutar desde drowsy-backend/:
+    python -m bench.bench_pipeline --source video:clip.mp4
+    python -m bench.bench_pipeline --source synthetic:1280x720 --frames 300 --json out.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Sin audio ni Supabase: solo el camino de análisis
+os.environ.setdefault("USE_PYTHON_ALARM", "0")
+
+import app  # noqa: E402
+from runtime.messages import MetricsMessage  # noqa: E402
+from runtime.preview import DEFAULT_MAX_WIDTH, DEFAULT_QUALITY  # noqa: E402
+from runtime.render import render_processed  # noqa: E402
+from runtime.sources import open_source  # noqa: E402
+
+STAGES = ("read", "facemesh", "features", "pipeline", "fusion", "render", "encode", "serialize", "total")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    arr = np.asarray(samples)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3), "mean": round(float(arr.mean()), 3)}
+
+
+def run(source, max_frames: int, width: int, quality: int, warmup: int) -> Dict:
+    # Sesión suelta: umbrales/detectores propios, grafos FaceMesh/Hands creados en este hilo
+    session = app.StreamSession("bench")
+    graphs: Dict = {}
+    times: Dict[str, List[float]] = {s: [] for s in STAGES}
+    closed = 0
+    faces = 0
+    frames = 0
+    t_start = None
+
+    while max_frames <= 0 or frames < max_frames + warmup:
+        t0 = time.perf_counter()
+        ok, frame = source.read()
+        if not ok:
+            break
+        t_read = time.perf_counter()
+
+        # tiempo de medio, no de reloj: corre más rápido que tiempo real y es reproducible
+        timings: Dict[str, float] = {}
+        analysis = app.analyze_frame(graphs, session.stream_id, session.pipeline, frame, timings,
+                                     source.frame_ts())
+        t_an = time.perf_counter()
+
+        ear, mar, pitch = analysis["ear"], analysis["mar"], analysis["pitch"]
+        fused, reason = (0.0, [])
+        level = "normal"
+        if analysis["landmarks"].has_face:
+            faces += 1
+            closed = closed + 1 if ear is not None and ear < session.ear_threshold else 0
+            fused, reason = session.fuse_scores(ear, mar, pitch)
+            level, stage_reasons = session.evaluate_drowsiness_stage(ear, mar, pitch, fused, closed)
+            reason += [r for r in stage_reasons if r not in reason]
+        t_fuse = time.perf_counter()
+
+        image = render_processed(frame, analysis["landmarks"].array, [], width)
+        t_render = time.perf_counter()
+        jpeg = app.frame_to_jpeg(image, width, quality)
+        t_enc = time.perf_counter()
+
+        MetricsMessage(ear=ear, mar=mar, yaw=analysis["yaw"], pitch=pitch, roll=analysis["roll"],
+                       closed_frames=closed, level=level, fused_score=fused, reason=reason,
+                       extra={"jpegBytes": len(jpeg or b"")}).encode()
+        t_end = time.perf_counter()
+
+        frames += 1
+        if frames <= warmup:
+            continue
+        if t_start is None:
+            t_start = t0
+        times["read"].append((t_read - t0) * 1000.0)
+        for k in ("facemesh", "features", "pipeline"):
+            times[k].append(timings.get(k, 0.0))
+        times["fusion"].append((t_fuse - t_an) * 1000.0)
+        times["render"].append((t_render - t_fuse) * 1000.0)
+        times["encode"].append((t_enc - t_render) * 1000.0)
+        times["serialize"].append((t_end - t_enc) * 1000.0)
+        times["total"].append((t_end - t0) * 1000.0)
+
+    face_roi = graphs[session.stream_id].face.stats() if graphs else None
+    for g in graphs.values():
+        g.close()
+    measured = max(0, frames - warmup)
+    elapsed = (time.perf_counter() - t_start) if t_start is not None else 0.0
+    return {
+        "source": source.info,
+        "frames": measured,
+        "faceFrames": faces,
+        "fps": round(measured / elapsed, 2) if elapsed > 0 else None,
+        "stagesMs": {s: percentiles(times[s]) for s in STAGES},
+        "faceRoi": face_roi,
+        "hands": session.pipeline.hands.stats(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark headless del camino por frame")
+    ap.add_argument("--source", default="synthetic:1280x720",
+                    help='"video:<ruta>", "images:<dir>" o "synthetic[:WxH]"')
+    ap.add_argument("--frames", type=int, default=300, help="frames medidos (0 = toda la fuente)")
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--width", type=int, default=DEFAULT_MAX_WIDTH, help="ancho de la vista previa")
+    ap.add_argument("--quality", type=int, default=DEFAULT_QUALITY)
+    ap.add_argument("--json", help="guardar el resultado en este archivo (seguimiento de regresiones)")
+    args = ap.parse_args()
+
+    source = open_source(args.source, frames=args.frames + args.warmup if args.frames > 0 else None)
+    if source is None:
+        sys.exit(f"No se pudo abrir la fuente: {args.source}")
+    try:
+        result = run(source, args.frames, args.width, args.quality, args.warmup)
+    finally:
+        source.release()
+
+    print(f"fuente: {args.source}  frames: {result['frames']}  con rostro: {result['faceFrames']}")
+    print(f"frames/s: {result['fps']}")
+    print(f"{'etapa':10s} {'p50':>8s} {'p95':>8s} {'p99':>8s}  (ms)")
+    for stage, p in result["stagesMs"].items():
+        if p["p50"] is not None:
+            print(f"{stage:10s} {p['p50']:8.2f} {p['p95']:8.2f} {p['p99']:8.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
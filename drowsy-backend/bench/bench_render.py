@@ -0,0 +1,104 @@
+# bench/bench_render.py
+"""
+Microbenchmark de las vistas previa 'processed' y 'landmarks':
+render anterior (copia a resolución de captura, cv2.circle por punto con LINE_AA,
+luego resize al codificar) vs runtime.render (dibujo vectorizado directamente a
+la resolución pedida por el suscriptor).
+
+Ejecutar desde drowsy-backend/:
+    python -m bench.bench_render --frames 300 --width 640
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.render import OVERLAY_IDX, preview_size, render_landmark_cloud, render_processed  # noqa: E402
+
+CAP_W, CAP_H = 1280, 720
+N_LANDMARKS = 478
+HUD = [
+    ("EAR: 0.281", (10, 30), 0.6, (0, 255, 0), 2),
+    ("MAR: 0.412", (10, 60), 0.6, (0, 255, 0), 2),
+    ("OJOS ABIERTOS", (10, 90), 0.7, (0, 255, 0), 2),
+]
+
+
+class _Landmark:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+# ---- render anterior (copiado de app.py) ----
+def legacy_processed(frame, landmarks, max_width):
+    f = frame.copy()
+    h, w = f.shape[:2]
+    for idx in OVERLAY_IDX.tolist():
+        lm = landmarks[idx]
+        cv2.circle(f, (int(lm.x * w), int(lm.y * h)), 2, (0, 255, 0), -1)
+    for text, pos, scale, color, thickness in HUD:
+        cv2.putText(f, text, pos, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+    return _legacy_resize(f, max_width)
+
+
+def legacy_cloud(landmarks, width, height, max_width):
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    canvas[:] = (16, 24, 40)
+    for lm in landmarks:
+        x, y = int(lm.x * width), int(lm.y * height)
+        if 0 <= x < width and 0 <= y < height:
+            cv2.circle(canvas, (x, y), 2, (210, 255, 255), -1, lineType=cv2.LINE_AA)
+    return _legacy_resize(canvas, max_width)
+
+
+def _legacy_resize(image, max_width):
+    h, w = image.shape[:2]
+    if w > max_width:
+        scale = max_width / w
+        image = cv2.resize(image, (int(w * scale), int(h * scale)))
+    return image
+
+
+def bench(fn, n: int, repeat: int = 3) -> float:
+    """Mejor de `repeat` pasadas, en ms/frame."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        best = min(best, time.perf_counter() - t0)
+    return best / n * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--width", type=int, default=640, help="ancho pedido por el suscriptor")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (CAP_H, CAP_W, 3), dtype=np.uint8)
+    arrays = [(0.5 + 0.12 * rng.standard_normal((N_LANDMARKS, 3))).astype(np.float32) for _ in range(16)]
+    objs = [[_Landmark(*map(float, p)) for p in a] for a in arrays]
+    out_w, out_h = preview_size(CAP_W, CAP_H, args.width)
+
+    rows = [
+        ("processed", bench(lambda i: legacy_processed(frame, objs[i % 16], args.width), args.frames),
+         bench(lambda i: render_processed(frame, arrays[i % 16], HUD, args.width), args.frames)),
+        ("landmarks", bench(lambda i: legacy_cloud(objs[i % 16], CAP_W, CAP_H, args.width), args.frames),
+         bench(lambda i: render_landmark_cloud(arrays[i % 16], out_w, out_h), args.frames)),
+    ]
+    print(f"captura {CAP_W}x{CAP_H} -> vista previa {out_w}x{out_h}, {args.frames} frames")
+    for name, before, after in rows:
+        print(f"{name:10s} antes {before:6.2f} ms  ahora {after:6.2f} ms  x{before / max(after, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main()
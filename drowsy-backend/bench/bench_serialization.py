@@ -0,0 +1,125 @@
+# bench/bench_serialization.py
+"""
+Costo de serialización por tick: camino anterior (dict + _jsonify recursivo +
+json.dumps, y _to_jsonable otra vez para persistir) vs mensajes tipados de
+runtime.messages (campos nativos, un solo encode reutilizado; la config ya no
+viaja en cada tick, solo su versión).
+
+Ejecutar desde drowsy-backend/:
+    python -m bench.bench_serialization --ticks 5000
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.messages import MetricsMessage, event_message  # noqa: E402
+
+THRESHOLDS = {
+    tier: {"ear": 0.18 + i * 0.03, "mar": 0.6 - i * 0.05, "pitch": 20.0 - i * 5,
+           "fusion": 0.7 - i * 0.1, "consecFrames": 90 - i * 10}
+    for i, tier in enumerate(("drowsy", "signs", "normal"))
+}
+CONFIG = {
+    "usePythonAlarm": True,
+    "camera": {
+        "active": {"index": 0, "width": 1280, "height": 720, "fps": 30, "codec": "MJPG", "orientation": "none"},
+        "requested": {"index": 0, "width": 1280, "height": 720, "fps": 30, "codec": "MJPG", "orientation": "none"},
+        "options": {"codecs": ["MJPG", "YUY2", "H264", "XVID"],
+                    "resolutions": [[1280, 720], [1920, 1080], [1600, 900], [1024, 768], [800, 600], [640, 480]],
+                    "fps": [60, 30, 24]},
+    },
+}
+REASONS = ["EAR<thr", "Somnolencia: EAR ≤ 0.18", "Signos de somnolencia: Cerrados ≥ 80"]
+EVENTS = [
+    {"type": "eye_blink", "ts": 1700000000.5},
+    {"type": "frame_overlay", "ts": 1700000000.5,
+     "annotations": {"pitch_ratio": 0.934, "nose_between_cheeks": True}},
+]
+FRAME_B64 = base64.b64encode(os.urandom(60_000)).decode()
+
+
+def _jsonify(obj):
+    # Copia del recorrido que hacían broadcast()/_to_jsonable antes de los mensajes tipados
+    try:
+        import numpy as _np
+    except Exception:
+        _np = None
+    if isinstance(obj, dict):
+        return {k: _jsonify(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [_jsonify(v) for v in obj]
+    if _np is not None:
+        if isinstance(obj, (_np.floating,)):
+            return float(obj)
+        if isinstance(obj, (_np.integer,)):
+            return int(obj)
+        if isinstance(obj, _np.ndarray):
+            return obj.tolist()
+    return obj
+
+
+def tick_before(i: int) -> int:
+    payload = {
+        "message_type": "metrics", "ear": round(0.21, 4), "mar": round(0.33, 4),
+        "yaw": 1.5, "pitch": -4.25, "roll": 0.5, "closedFrames": i % 90,
+        "threshold": 0.18, "consecFrames": 90, "thresholds": {k: dict(v) for k, v in THRESHOLDS.items()},
+        "thresholdOrder": ["normal", "signs", "drowsy"], "weights": {"ear": 0.5, "mar": 0.3, "pose": 0.2},
+        "isDrowsy": False, "drowsinessLevel": "signs", "stageReasons": REASONS[1:], "fusedScore": 0.42,
+        "reason": REASONS, "rawFrame": FRAME_B64, "processedFrame": FRAME_B64, "landmarksFrame": FRAME_B64,
+        "config": CONFIG,
+    }
+    size = len(json.dumps(_jsonify(payload), ensure_ascii=False))
+    row = {"session_id": 1, "ear": 0.21, "mar": 0.33, "yaw": 1.5, "pitch": -4.25, "roll": 0.5,
+           "fused_score": 0.42, "closed_frames": i % 90, "is_drowsy": False, "reason": REASONS}
+    _jsonify([row])
+    for e in EVENTS:
+        size += len(json.dumps(_jsonify({"message_type": "event", **e}), ensure_ascii=False))
+        _jsonify([{"session_id": 1, "type": e["type"], "ts": e["ts"], "payload": e}])
+    return size
+
+
+def tick_after(i: int) -> int:
+    metrics = MetricsMessage(
+        ear=0.21, mar=0.33, yaw=1.5, pitch=-4.25, roll=0.5, closed_frames=i % 90,
+        threshold=0.18, consec_frames=90, is_drowsy=False, level="signs",
+        stage_reasons=REASONS[1:], fused_score=0.42, reason=REASONS, config_version=1,
+    )
+    size = len(metrics.encode_with_b64({"rawFrame": FRAME_B64, "processedFrame": FRAME_B64,
+                                    "landmarksFrame": FRAME_B64}))
+    metrics.row(1)
+    for e in EVENTS:
+        msg = event_message(e)
+        size += len(msg.encode())
+        msg.row(1, e["ts"])
+    return size
+
+
+def run(fn, ticks: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(ticks):
+        fn(i)
+    return (time.perf_counter() - t0) / ticks * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=3000)
+    args = ap.parse_args()
+
+    run(tick_before, 100)
+    run(tick_after, 100)
+    before = run(tick_before, args.ticks)
+    after = run(tick_after, args.ticks)
+    print(f"ticks: {args.ticks}")
+    print(f"antes (dict + _jsonify + json.dumps): {before:8.1f} µs/tick")
+    print(f"ahora (mensajes tipados):             {after:8.1f} µs/tick")
+    print(f"mejora: x{before / max(after, 1e-9):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# bench/load_ingest.py
+"""
+Generador de carga para /ingest: abre N conexiones simultáneas que envían frames
+(JPEG o landmarks) a un fps fijo durante unos segundos y mide, por escalón de N:
+frames/s analizados por stream, latencia envío -> métricas (p50/p95) y cuántos
+frames descartó el servidor (replaced/stale/shed). Un escalón se sostiene si todos
+los streams reciben al menos el 90 % del fps pedido y el p95 queda bajo el presupuesto.
+
+Con el servidor corriendo (uvicorn app:app), desde drowsy-backend/:
+    python -m bench.load_ingest --streams 1,2,4,8 --fps 15
+    python -m bench.load_ingest --mode landmarks --streams 8,16,32 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.sources import SyntheticSource, open_source, parse_size  # noqa: E402
+from runtime.ws_protocol import pack_ingest_jpeg, pack_ingest_landmarks  # noqa: E402
+
+N_LANDMARKS = 478
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None}
+    p50, p95 = np.percentile(np.asarray(samples), [50, 95])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2)}
+
+
+def jpeg_payloads(source_spec: str, size: str, count: int, quality: int) -> List[bytes]:
+    """Frames ya codificados una vez: el costo de enviar no debe medir al generador."""
+    w, h = parse_size(size, (640, 480))
+    source = open_source(source_spec, frames=count) if source_spec else SyntheticSource(w, h, frames=count)
+    if source is None:
+        sys.exit(f"No se pudo abrir la fuente: {source_spec}")
+    out = []
+    try:
+        while len(out) < count:
+            ok, frame = source.read()
+            if not ok:
+                break
+            if frame.shape[1] != w:
+                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            out.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    finally:
+        source.release()
+    return out
+
+
+def landmark_sets(count: int, seed: int = 0) -> List[np.ndarray]:
+    """Nubes (478, 3) normalizadas alrededor del centro con un poco de movimiento."""
+    rng = np.random.default_rng(seed)
+    base = np.column_stack([
+        0.5 + 0.12 * rng.standard_normal(N_LANDMARKS),
+        0.45 + 0.16 * rng.standard_normal(N_LANDMARKS),
+        0.02 * rng.standard_normal(N_LANDMARKS),
+    ]).astype(np.float32)
+    return [base + np.float32(0.003) * rng.standard_normal(base.shape).astype(np.float32)
+            for _ in range(count)]
+
+
+async def run_stream(url: str, payload_fn, fps: float, duration: float) -> Dict:
+    sent_at: Dict[int, float] = {}
+    latencies: List[float] = []
+    received = 0
+    last_ingest: Dict = {}
+    try:
+        ws = await websockets.connect(url, max_size=None)
+    except Exception as e:
+        return {"error": f"conexión: {e}"}
+
+    async def reader():
+        nonlocal received, last_ingest
+        async for text in ws:
+            if not isinstance(text, str) or not text.startswith("{"):
+                continue
+            msg = json.loads(text)
+            if msg.get("message_type") != "metrics":
+                continue
+            received += 1
+            frame_id = msg.get("frameId")
+            t = sent_at.pop(frame_id, None)
+            if t is not None:
+                latencies.append((time.perf_counter() - t) * 1000.0)
+            last_ingest = msg.get("ingest") or last_ingest
+
+    reader_task = asyncio.create_task(reader())
+    period = 1.0 / fps
+    frame_id = 0
+    t_end = time.perf_counter() + duration
+    next_t = time.perf_counter()
+    closed = None
+    try:
+        while time.perf_counter() < t_end:
+            frame_id += 1
+            sent_at[frame_id] = time.perf_counter()
+            await ws.send(payload_fn(frame_id, time.time()))
+            next_t += period
+            await asyncio.sleep(max(0.0, next_t - time.perf_counter()))
+        await asyncio.sleep(0.5)   # respuestas en vuelo
+    except websockets.ConnectionClosed as e:
+        closed = e.rcvd.code if e.rcvd else None
+    finally:
+        reader_task.cancel()
+        await ws.close()
+    if closed == 1013:
+        return {"error": "rechazado (1013: servidor al máximo de streams)"}
+    return {
+        "sent": frame_id,
+        "received": received,
+        "fps": round(received / duration, 2),
+        "latencyMs": percentiles(latencies),
+        "server": last_ingest,
+        "_latencies": latencies,
+    }
+
+
+async def run_step(args, n: int, payloads) -> Dict:
+    def payload_fn_for(offset: int):
+        def payload_fn(frame_id: int, ts: float) -> bytes:
+            item = payloads[(offset + frame_id) % len(payloads)]
+            if args.mode == "jpeg":
+                return pack_ingest_jpeg(frame_id, ts, item)
+            w, h = parse_size(args.size, (640, 480))
+            return pack_ingest_landmarks(frame_id, ts, w, h, item)
+        return payload_fn
+
+    results = await asyncio.gather(*(
+        run_stream(args.url, payload_fn_for(i * 7), args.fps, args.duration) for i in range(n)
+    ))
+    ok = [r for r in results if "error" not in r]
+    latencies = [x for r in ok for x in r.pop("_latencies")]
+    step = {
+        "streams": n,
+        "connected": len(ok),
+        "errors": [r["error"] for r in results if "error" in r],
+        "minFps": min((r["fps"] for r in ok), default=0.0),
+        "meanFps": round(sum(r["fps"] for r in ok) / len(ok), 2) if ok else 0.0,
+        "latencyMs": percentiles(latencies),
+        "shed": sum(r["server"].get("shed", 0) for r in ok),
+        "replaced": sum(r["server"].get("replaced", 0) for r in ok),
+        "stale": sum(r["server"].get("stale", 0) for r in ok),
+    }
+    p95 = step["latencyMs"]["p95"]
+    step["sustained"] = (
+        len(ok) == n
+        and step["minFps"] >= 0.9 * args.fps
+        and p95 is not None and p95 <= args.budget_ms
+    )
+    return step
+
+
+async def main_async(args) -> Dict:
+    if args.mode == "jpeg":
+        payloads = jpeg_payloads(args.source, args.size, 30, args.quality)
+    else:
+        payloads = landmark_sets(30)
+    steps = []
+    for n in args.streams:
+        step = await run_step(args, n, payloads)
+        steps.append(step)
+        print(f"{n:4d} streams  fps min/med {step['minFps']:6.2f}/{step['meanFps']:6.2f}  "
+              f"p50/p95 {step['latencyMs']['p50']}/{step['latencyMs']['p95']} ms  "
+              f"shed {step['shed']} replaced {step['replaced']} stale {step['stale']}  "
+              f"{'OK' if step['sustained'] else 'NO'}"
+              + (f"  errores: {len(step['errors'])}" if step["errors"] else ""))
+        await asyncio.sleep(1.0)   # dejar que el servidor libere las sesiones anteriores
+    sustained = [s["streams"] for s in steps if s["sustained"]]
+    return {
+        "url": args.url, "mode": args.mode, "fps": args.fps, "size": args.size,
+        "budgetMs": args.budget_ms, "steps": steps,
+        "maxSustainedStreams": max(sustained) if sustained else 0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga de streams remotos sobre /ingest")
+    ap.add_argument("--url", default="ws://127.0.0.1:8000/ingest")
+    ap.add_argument("--mode", choices=("jpeg", "landmarks"), default="jpeg")
+    ap.add_argument("--streams", default="1,2,4,8",
+                    help="escalones de conexiones simultáneas, separados por coma")
+    ap.add_argument("--fps", type=float, default=15.0, help="frames/s que envía cada stream")
+    ap.add_argument("--duration", type=float, default=10.0, help="segundos por escalón")
+    ap.add_argument("--size", default="640x480", help="tamaño de los frames enviados")
+    ap.add_argument("--quality", type=int, default=80, help="calidad JPEG de los frames enviados")
+    ap.add_argument("--source", default="", help='fuente de frames ("video:<ruta>", ...); por defecto sintética')
+    ap.add_argument("--budget-ms", type=float, default=250.0, help="p95 máximo envío -> métricas")
+    ap.add_argument("--json", help="guardar el resultado en este archivo")
+    args = ap.parse_args()
+    args.streams = [int(n) for n in args.streams.split(",") if n.strip()]
+
+    result = asyncio.run(main_async(args))
+    print(f"streams sostenidos: {result['maxSustainedStreams']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
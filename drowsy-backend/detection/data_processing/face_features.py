@@ -0,0 +1,188 @@
+# detection/data_processing/face_features.py
+"""
+Extracción vectorizada de rasgos faciales a partir del arreglo (N, 3) float32 de
+landmarks de FaceMesh (coordenadas normalizadas x, y, z).
+
+Los landmarks se convierten una sola vez por frame (landmarks_to_array) y todas
+las medidas (EAR de ambos ojos, MAR, puntos de PnP) salen de extract_features, con
+tablas de índices precalculadas y operaciones NumPy, sin tocar los objetos de
+MediaPipe. Es la única implementación de esas medidas en el backend.
+"""
+import math
+from functools import lru_cache
+from itertools import chain
+
+import cv2
+import numpy as np
+
+# Landmarks MP FaceMesh
+LEFT_EYE_IDX  = [33, 160, 158, 133, 153, 144]
+RIGHT_EYE_IDX = [362, 385, 387, 263, 373, 380]
+
+# Boca (conjunto estándar para MAR)
+MOUTH_L_CORNER = 61
+MOUTH_R_CORNER = 291
+MOUTH_TOP_IN   = 13
+MOUTH_BOT_IN   = 14
+MOUTH_TOP_OUT1 = 81
+MOUTH_BOT_OUT1 = 311
+MOUTH_TOP_OUT2 = 78
+MOUTH_BOT_OUT2 = 308
+
+# PnP: índices útiles
+PNP_NOSE_TIP = 4
+PNP_CHIN     = 152
+PNP_LEYE_OUT = 263
+PNP_REYE_OUT = 33
+PNP_LMOUTH   = 291
+PNP_RMOUTH   = 61
+
+# ---- tablas de índices precalculadas ----
+# EAR: (ojo, par) -> (A: p1-p5, B: p2-p4, C: p0-p3)
+_EYES = np.array([LEFT_EYE_IDX, RIGHT_EYE_IDX], dtype=np.intp)
+_EAR_FROM = _EYES[:, [1, 2, 0]]
+_EAR_TO   = _EYES[:, [5, 4, 3]]
+
+# MAR: tres pares verticales + ancho de boca
+_MAR_FROM = np.array([MOUTH_TOP_IN, MOUTH_TOP_OUT1, MOUTH_TOP_OUT2, MOUTH_L_CORNER], dtype=np.intp)
+_MAR_TO   = np.array([MOUTH_BOT_IN, MOUTH_BOT_OUT1, MOUTH_BOT_OUT2, MOUTH_R_CORNER], dtype=np.intp)
+
+# Todos los pares de distancias del frame en una sola tabla: 6 de EAR (izq., der.)
+# seguidos de 4 de MAR, para resolverlos con una sola resta y una sola norma.
+_PAIR_FROM = np.concatenate([_EAR_FROM.ravel(), _MAR_FROM])
+_PAIR_TO   = np.concatenate([_EAR_TO.ravel(), _MAR_TO])
+_N_EAR_PAIRS = _EAR_FROM.size
+
+_PNP_IDX = np.array([PNP_NOSE_TIP, PNP_CHIN, PNP_LEYE_OUT, PNP_REYE_OUT, PNP_LMOUTH, PNP_RMOUTH], dtype=np.intp)
+
+# Modelo 3D simplificado (en mm, aproximado al cráneo genérico)
+_MODEL_POINTS = np.array([
+    (0.0,   0.0,   0.0),     # Nose tip
+    (0.0, -90.0, -25.0),     # Chin
+    (-60.0, 40.0, -50.0),    # Left eye (desde el sujeto)
+    (60.0,  40.0, -50.0),    # Right eye
+    (-40.0,-30.0, -50.0),    # Left mouth
+    (40.0, -30.0, -50.0)     # Right mouth
+], dtype=np.float32)
+_DIST_COEFFS = np.zeros((4, 1), dtype=np.float32)
+
+
+# Serialización de NormalizedLandmarkList cuando cada landmark trae solo x, y, z:
+# campo 1 (0x0a), largo 15, y tres floats little-endian (fixed32) con tags
+# 0x0d/0x15/0x1d. Cada mensaje se valida entero (tags y largos de todos los
+# registros) y además se cotejan algunos landmarks contra la lectura por
+# atributos; si algo no cuadra, ese mensaje se lee por atributos. No hay estado
+# global: los hilos de inferencia pueden llamarla a la vez.
+_LANDMARK_WIRE = np.dtype([
+    ("tag", "u1"), ("len", "u1"),
+    ("tx", "u1"), ("x", "<f4"),
+    ("ty", "u1"), ("y", "<f4"),
+    ("tz", "u1"), ("z", "<f4"),
+])
+
+
+def _array_from_attrs(landmarks) -> np.ndarray:
+    coords = chain.from_iterable((lm.x, lm.y, lm.z) for lm in landmarks)
+    return np.fromiter(coords, dtype=np.float32, count=3 * len(landmarks)).reshape(-1, 3)
+
+
+def _array_from_wire(message):
+    """Lectura directa del protobuf serializado; None si el mensaje no tiene el formato esperado."""
+    data = message.SerializeToString()
+    if not data or len(data) % _LANDMARK_WIRE.itemsize:
+        return None
+    rec = np.frombuffer(data, dtype=_LANDMARK_WIRE)
+    landmarks = message.landmark
+    if len(rec) != len(landmarks):
+        return None
+    if not ((rec["tag"] == 0x0A).all() and (rec["len"] == 15).all()
+            and (rec["tx"] == 0x0D).all() and (rec["ty"] == 0x15).all()
+            and (rec["tz"] == 0x1D).all()):
+        return None
+    out = np.empty((len(rec), 3), dtype=np.float32)
+    out[:, 0] = rec["x"]
+    out[:, 1] = rec["y"]
+    out[:, 2] = rec["z"]
+    # Cotejo barato por mensaje: primero, medio y último contra los atributos
+    for i in {0, len(rec) // 2, len(rec) - 1}:
+        lm = landmarks[i]
+        if not np.array_equal(out[i], np.array((lm.x, lm.y, lm.z), dtype=np.float32)):
+            return None
+    return out
+
+
+def landmarks_to_array(landmarks) -> np.ndarray:
+    """
+    Landmarks de MediaPipe -> arreglo contiguo (N, 3) float32 normalizado.
+    Acepta el NormalizedLandmarkList completo (camino rápido: una serialización y
+    un frombuffer validados en vez de ~1400 accesos a atributos protobuf) o
+    cualquier secuencia de objetos con x, y, z.
+    """
+    if hasattr(landmarks, "SerializeToString"):
+        arr = _array_from_wire(landmarks)
+        if arr is not None:
+            return arr
+        landmarks = landmarks.landmark
+    return _array_from_attrs(landmarks)
+
+
+@lru_cache(maxsize=8)
+def _camera_matrix(w: int, h: int) -> np.ndarray:
+    focal_length = w
+    return np.array([
+        [focal_length, 0, w / 2],
+        [0, focal_length, h / 2],
+        [0, 0, 1]], dtype=np.float32)
+
+
+def _head_pose(image_points: np.ndarray, w: int, h: int):
+    """
+    yaw/pitch/roll (grados) con solvePnP sobre los 6 puntos (px) en el orden de _MODEL_POINTS.
+    Convención: yaw (+ izquierda), pitch (+ arriba), roll (+ CW).
+    """
+    ok, rvec, _tvec = cv2.solvePnP(_MODEL_POINTS, np.ascontiguousarray(image_points, dtype=np.float32),
+                                   _camera_matrix(w, h), _DIST_COEFFS, flags=cv2.SOLVEPNP_EPNP)
+    if not ok:
+        return None, None, None
+
+    R = cv2.Rodrigues(rvec)[0].tolist()
+    # Extracción de Euler angles (escalares Python: 3x3 no compensa pasar por numpy)
+    sy = math.sqrt(R[0][0]*R[0][0] + R[1][0]*R[1][0])
+    if sy >= 1e-6:
+        pitch = math.degrees(math.atan2(R[2][1], R[2][2]))
+        yaw   = math.degrees(math.atan2(-R[2][0], sy))
+        roll  = math.degrees(math.atan2(R[1][0], R[0][0]))
+    else:
+        pitch = math.degrees(math.atan2(-R[1][2], R[1][1]))
+        yaw   = math.degrees(math.atan2(-R[2][0], sy))
+        roll  = 0.0
+    return yaw, pitch, roll
+
+
+def extract_features(arr: np.ndarray, w: int, h: int) -> dict:
+    """
+    Todos los rasgos del frame a partir del arreglo de landmarks. Solo se pasan a
+    px los puntos que intervienen (10 pares + 6 de PnP), no los ~478.
+    """
+    scale = np.array([w, h], dtype=np.float32)
+    a = arr[_PAIR_FROM, :2] * scale
+    b = arr[_PAIR_TO, :2] * scale
+    # como antes, los puntos del ojo se truncan a px enteros
+    np.trunc(a[:_N_EAR_PAIRS], out=a[:_N_EAR_PAIRS])
+    np.trunc(b[:_N_EAR_PAIRS], out=b[:_N_EAR_PAIRS])
+    diff = a - b
+    d = np.sqrt((diff * diff).sum(axis=1)).tolist()
+
+    ear_l = (d[0] + d[1]) / (2.0 * (d[2] + 1e-6))
+    ear_r = (d[3] + d[4]) / (2.0 * (d[5] + 1e-6))
+    mar = ((d[6] + d[7] + d[8]) / 3.0) / (d[9] + 1e-6)
+    yaw, pitch, roll = _head_pose(arr[_PNP_IDX, :2] * scale, w, h)
+    return {
+        "ear_left": ear_l,
+        "ear_right": ear_r,
+        "ear": (ear_l + ear_r) / 2.0,
+        "mar": mar,
+        "yaw": yaw,
+        "pitch": pitch,
+        "roll": roll,
+    }
@@ -2,15 +2,18 @@ import time
 from ...utils.geom import euclid
 
 class EyeRubDetector:
-    def __init__(self, dist_px=40.0, hold_s=1.0, window_s=300.0):
+    def __init__(self, dist_px=40.0, hold_s=1.0, window_s=300.0, clock=time.time):
         self.dist_px = dist_px; self.hold_s = hold_s; self.window_s = window_s
-        self.win_t0 = time.time()
+        self.clock = clock
+        self.win_t0 = None  # la ventana arranca con el primer frame
         self.active = {"left": None, "right": None}  # ts
         self.counts = {"left":0, "right":0}
         self.durations = {"left":[], "right":[]}
 
-    def update(self, eyes, hands):
-        now = time.time(); evts=[]
+    def update(self, eyes, hands, ts=None):
+        # ts: timestamp del frame (captura); sin él se usa el reloj inyectado
+        now = self.clock() if ts is None else ts; evts=[]
+        if self.win_t0 is None: self.win_t0 = now
         eye_pts = {"left": eyes.get("L_ref"), "right": eyes.get("R_ref")}
         for side, eye_pt in eye_pts.items():
             touching = False
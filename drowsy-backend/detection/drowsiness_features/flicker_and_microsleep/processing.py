@@ -3,17 +3,21 @@ from ...utils.timers import Stopwatch
 from ...data_processing.eyes.eyes_processing import both_closed
 
 class FlickerAndMicroSleep:
-    def __init__(self, microsleep_s=2.0, report_window_s=60.0):
+    def __init__(self, microsleep_s=2.0, report_window_s=60.0, clock=time.time):
         self.closed_prev = False
         self.closed_since = None
         self.microsleep_s = microsleep_s
         self.window_s = report_window_s
-        self.win_t0 = time.time()
+        self.clock = clock
+        self.win_t0 = None  # la ventana arranca con el primer frame
         self.flickers = 0
         self.microsleeps = []
 
-    def update(self, eyes):
-        now = time.time()
+    def update(self, eyes, ts=None):
+        # ts: timestamp del frame (captura); sin él se usa el reloj inyectado
+        now = self.clock() if ts is None else ts
+        if self.win_t0 is None:
+            self.win_t0 = now
         closed = both_closed(eyes)
         evts = []
         if closed and not self.closed_prev:
@@ -8,23 +8,29 @@ class PitchDetector:
     - hold_s: segundos mínimos con cabeza abajo para disparar evento
     - window_s: tamaño de ventana para emitir reportes agregados
     - ratio_threshold: afinación de sensibilidad: nose_mouth < ratio_threshold * nose_forehead
+    - clock: reloj a usar cuando update() no recibe el timestamp del frame
     """
-    def __init__(self, hold_s: float = 3.0, window_s: float = 180.0, ratio_threshold: float = 1.0):
+    def __init__(self, hold_s: float = 3.0, window_s: float = 180.0, ratio_threshold: float = 1.0,
+                 clock=time.time):
         self.hold_s = hold_s
         self.window_s = window_s
         self.ratio_threshold = ratio_threshold
 
         self._down_since = None
-        self._win_t0 = time.time()
+        self.clock = clock
+        self._win_t0 = None  # la ventana arranca con el primer frame
         self._count = 0
         self._durations = []
 
-    def update(self, head: dict, mouth: dict):
+    def update(self, head: dict, mouth: dict, ts=None):
         """
         head: dict con nose_tip, forehead, cheek_left, cheek_right
         mouth: dict con lips_up, lips_down (para centro de boca)
+        ts: timestamp del frame (captura); sin él se usa el reloj inyectado
         """
-        now = time.time()
+        now = self.clock() if ts is None else ts
+        if self._win_t0 is None:
+            self._win_t0 = now
         evts = []
         down = is_head_down(head, mouth, ratio_threshold=self.ratio_threshold)
 
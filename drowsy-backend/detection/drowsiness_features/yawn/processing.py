@@ -2,15 +2,19 @@ import time
 from ...data_processing.mouth.mouth_processing import mouth_open
 
 class YawnDetector:
-    def __init__(self, hold_s=4.0, window_s=180.0):
+    def __init__(self, hold_s=4.0, window_s=180.0, clock=time.time):
         self.open_since = None
         self.hold_s = hold_s
         self.window_s = window_s
-        self.win_t0 = time.time()
+        self.clock = clock
+        self.win_t0 = None  # la ventana arranca con el primer frame
         self.yawns = []
 
-    def update(self, mouth):
-        now = time.time()
+    def update(self, mouth, ts=None):
+        # ts: timestamp del frame (captura); sin él se usa el reloj inyectado
+        now = self.clock() if ts is None else ts
+        if self.win_t0 is None:
+            self.win_t0 = now
         evts = []
         is_open = mouth_open(mouth)
         if is_open and self.open_since is None:
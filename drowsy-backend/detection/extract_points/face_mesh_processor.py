@@ -1,26 +1,52 @@
 import mediapipe as mp
 
-_FACE = mp.solutions.face_mesh.FaceMesh(
-    static_image_mode=False, max_num_faces=1,
-    refine_landmarks=True, min_detection_confidence=0.5, min_tracking_confidence=0.5
-)
+from ..data_processing import face_features
+from ..data_processing.face_features import landmarks_to_array
+
+# El modelo se crea bajo demanda: cuando el pipeline va embebido en app.py recibe
+# landmarks ya calculados (ver landmark_frame.py) y nunca necesita su propio FaceMesh.
+_FACE = None
+
+def _get_face():
+    global _FACE
+    if _FACE is None:
+        _FACE = mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=False, max_num_faces=1,
+            refine_landmarks=True, min_detection_confidence=0.5, min_tracking_confidence=0.5
+        )
+    return _FACE
 
 # índices usados: ojos (159,145,385,374), iris refs (468,473), labios (13,14), mentón (17,199),
 # nariz/ frent/ mejillas según FaceMesh canonical.
 EYE_IDX = dict(L_up=159, L_down=145, R_up=385, R_down=374, L_ref=468, R_ref=473)
 MOUTH_IDX = dict(lips_up=13, lips_down=14, chin_up=17, chin_down=199)
 
-def process_frame_bgr(frame_bgr):
-    h, w = frame_bgr.shape[:2]
-    rgb = frame_bgr[:, :, ::-1]
-    res = _FACE.process(rgb)
-    if not res.multi_face_landmarks: return {}
-    lm = res.multi_face_landmarks[0].landmark
+# Cuántos landmarks necesita el análisis: el mayor índice usado + 1 (474, por el
+# iris de refine_landmarks; una malla de 468 sin iris no alcanza)
+REQUIRED_LANDMARKS = 1 + max(
+    *EYE_IDX.values(), *MOUTH_IDX.values(),
+    *face_features.LEFT_EYE_IDX, *face_features.RIGHT_EYE_IDX,
+    face_features.PNP_NOSE_TIP, face_features.PNP_CHIN,
+    face_features.PNP_LEYE_OUT, face_features.PNP_REYE_OUT,
+    face_features.MOUTH_L_CORNER, face_features.MOUTH_R_CORNER,
+    face_features.MOUTH_TOP_IN, face_features.MOUTH_BOT_IN,
+    face_features.MOUTH_TOP_OUT1, face_features.MOUTH_BOT_OUT1,
+    face_features.MOUTH_TOP_OUT2, face_features.MOUTH_BOT_OUT2,
+)
 
-    def pt(i): return (lm[i].x * w, lm[i].y * h)
+def points_from_array(arr, w, h):
+    """Arreglo (N, 3) de landmarks normalizados -> puntos en px que usan los detectores."""
+    def pt(i): return (float(arr[i, 0]) * w, float(arr[i, 1]) * h)
 
     return {
         "eyes": {k: pt(v) for k, v in EYE_IDX.items()},
         "mouth": {k: pt(v) for k, v in MOUTH_IDX.items()},
         # añade aquí nariz, frente, mejillas si las usas en pitch
     }
+
+def process_frame_bgr(frame_bgr):
+    h, w = frame_bgr.shape[:2]
+    rgb = frame_bgr[:, :, ::-1]
+    res = _get_face().process(rgb)
+    if not res.multi_face_landmarks: return {}
+    return points_from_array(landmarks_to_array(res.multi_face_landmarks[0]), w, h)
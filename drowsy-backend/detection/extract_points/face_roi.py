@@ -0,0 +1,101 @@
+# detection/extract_points/face_roi.py
+"""
+FaceMesh con ROI de seguimiento.
+
+Tras una detección, el siguiente frame solo convierte a RGB y pasa a FaceMesh un
+recorte ampliado alrededor de los últimos landmarks; los landmarks del recorte se
+llevan de vuelta a coordenadas normalizadas del frame completo, así que EAR, pose
+y detectores no cambian. Si en el recorte no aparece rostro, el frame siguiente
+vuelve a buscar en el frame completo.
+
+El recorte solo se mueve cuando el rostro se acerca a su borde o cambia mucho de
+tamaño: FaceMesh sigue el rostro en coordenadas de su imagen de entrada, y mover
+el recorte en cada frame le rompería ese seguimiento.
+"""
+import cv2
+
+from ..data_processing.face_features import landmarks_to_array
+from .landmark_frame import LandmarkFrame
+
+
+class FaceRoiTracker:
+    def __init__(self, face_mesh, margin=0.6, min_size=192, edge=0.12, enabled=True):
+        self.face_mesh = face_mesh
+        self.margin = margin          # ampliación de la caja de landmarks por lado (x su tamaño)
+        self.min_size = min_size      # lado mínimo del recorte en px
+        self.edge = edge              # fracción del recorte que cuenta como "borde"
+        self.enabled = enabled
+        self.roi = None               # (x0, y0, x1, y1) en px del frame, o None = frame completo
+        # contadores para /health
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.lost = 0
+
+    def process(self, frame_bgr) -> LandmarkFrame:
+        """FaceMesh sobre el ROI vigente (o el frame completo); landmarks en coords del frame."""
+        h, w = frame_bgr.shape[:2]
+        roi = self.roi if self.enabled else None
+        if roi is not None and (roi[2] > w or roi[3] > h):
+            roi = None                 # cambió la resolución de captura
+        if roi is None:
+            self.full_frames += 1
+            rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+            lf = LandmarkFrame.from_results(self.face_mesh.process(rgb), w, h)
+            self._update_roi(lf.array, w, h)
+            return lf
+
+        self.roi_frames += 1
+        x0, y0, x1, y1 = roi
+        rgb = cv2.cvtColor(frame_bgr[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+        res = self.face_mesh.process(rgb)
+        if not res.multi_face_landmarks:
+            # seguimiento perdido: el próximo frame busca en el frame completo
+            self.lost += 1
+            self.roi = None
+            return LandmarkFrame(None, w, h)
+
+        arr = landmarks_to_array(res.multi_face_landmarks[0])
+        cw, ch = x1 - x0, y1 - y0
+        arr[:, 0] = (x0 + arr[:, 0] * cw) / w
+        arr[:, 1] = (y0 + arr[:, 1] * ch) / h
+        arr[:, 2] *= cw / w             # z usa la escala de x de la imagen de entrada
+        self._update_roi(arr, w, h)
+        return LandmarkFrame.from_array(arr, w, h)
+
+    def _update_roi(self, arr, w, h):
+        if not self.enabled or arr is None:
+            self.roi = None
+            return
+        fx0, fy0 = float(arr[:, 0].min()) * w, float(arr[:, 1].min()) * h
+        fx1, fy1 = float(arr[:, 0].max()) * w, float(arr[:, 1].max()) * h
+        if self.roi is not None and self._still_fits(fx0, fy0, fx1, fy1):
+            return
+        side = max(fx1 - fx0, fy1 - fy0)
+        half = max(self.min_size, side * (1.0 + 2.0 * self.margin)) / 2.0
+        cx, cy = (fx0 + fx1) / 2.0, (fy0 + fy1) / 2.0
+        x0 = int(max(0, cx - half)); x1 = int(min(w, cx + half))
+        y0 = int(max(0, cy - half)); y1 = int(min(h, cy + half))
+        # un recorte casi del tamaño del frame no ahorra nada
+        if (x1 - x0) * (y1 - y0) >= 0.8 * w * h:
+            self.roi = None
+        else:
+            self.roi = (x0, y0, x1, y1)
+
+    def _still_fits(self, fx0, fy0, fx1, fy1):
+        """El rostro sigue lejos del borde del recorte y con un tamaño parecido."""
+        x0, y0, x1, y1 = self.roi
+        mx, my = self.edge * (x1 - x0), self.edge * (y1 - y0)
+        inside = fx0 >= x0 + mx and fx1 <= x1 - mx and fy0 >= y0 + my and fy1 <= y1 - my
+        side = max(fx1 - fx0, fy1 - fy0)
+        expected = max(x1 - x0, y1 - y0) / (1.0 + 2.0 * self.margin)
+        return inside and 0.7 * expected <= side <= 1.3 * expected
+
+    def stats(self):
+        return {"enabled": self.enabled, "roi": list(self.roi) if self.roi else None,
+                "roi_frames": self.roi_frames, "full_frames": self.full_frames, "lost": self.lost}
+
+    def close(self):
+        """Libera el grafo de FaceMesh (streams remotos que se desconectan)."""
+        close = getattr(self.face_mesh, "close", None)
+        if close is not None:
+            close()
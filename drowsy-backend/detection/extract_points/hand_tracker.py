@@ -0,0 +1,150 @@
+# detection/extract_points/hand_tracker.py
+"""
+Planificador de MediaPipe Hands para EyeRubDetector.
+
+Las manos solo importan cuando se acercan a los ojos, así que Hands corre sobre un
+recorte alrededor del rostro y, en el caso común (manos en el volante), a una tasa
+reducida: una vez cada `idle_every_n` frames. Pasa a tasa completa cuando
+- la detección anterior vio una mano dentro de la región del rostro, o
+- un chequeo barato de movimiento (diferencia de grises a baja resolución) detecta
+  algo entrando en la región,
+y se mantiene así `hot_hold_frames` frames después del último disparo.
+Sin rostro no se corre Hands: EyeRubDetector no tiene ojos contra qué comparar.
+
+El grafo Hands lo pone el llamador en cada update() (uno por stream, creado en
+su hilo de inferencia). Como FaceRoiTracker, el recorte solo se mueve cuando el
+rostro se acerca a su borde o cambia mucho de tamaño: Hands sigue las manos en
+coordenadas de su imagen de entrada y un recorte que se mueve en cada frame le
+rompería ese seguimiento.
+"""
+import cv2
+import numpy as np
+
+from .hands_processor import process_roi_bgr
+
+# Tamaño fijo de la miniatura del chequeo de movimiento
+_MOTION_SIZE = (48, 48)
+
+
+def face_box(face, frame_w, frame_h, margin=0.8):
+    """
+    Caja (x0, y0, x1, y1) en px alrededor de los puntos del rostro (ojos/boca/cabeza),
+    ampliada `margin` veces su tamaño por lado para incluir manos que se acercan.
+    """
+    pts = [p for part in ("eyes", "mouth", "head") for p in (face.get(part) or {}).values() if p]
+    if not pts:
+        return None
+    xs = [p[0] for p in pts]; ys = [p[1] for p in pts]
+    bw = max(xs) - min(xs); bh = max(ys) - min(ys)
+    side = max(bw, bh, 1.0)
+    x0 = int(max(0, min(xs) - margin * side)); x1 = int(min(frame_w, max(xs) + margin * side))
+    y0 = int(max(0, min(ys) - margin * side)); y1 = int(min(frame_h, max(ys) + margin * side))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return x0, y0, x1, y1
+
+
+class HandTracker:
+    def __init__(self, idle_every_n=6, hot_hold_frames=15, motion_threshold=18.0,
+                 motion_fraction=0.08, roi_margin=0.8, edge=0.15):
+        self.idle_every_n = max(1, int(idle_every_n))
+        self.hot_hold_frames = hot_hold_frames
+        self.motion_threshold = motion_threshold
+        self.motion_fraction = motion_fraction
+        self.roi_margin = roi_margin
+        self.edge = edge              # fracción del recorte que cuenta como "borde"
+        self._box = None
+        self._hot_left = 0
+        self._since_run = None
+        self._prev_thumb = None
+        self._last = []
+        # contadores para /health
+        self.frames = 0
+        self.runs = 0
+        self.hot_runs = 0
+        self.box_moves = 0
+
+    @property
+    def hot(self):
+        return self._hot_left > 0
+
+    def update(self, frame_bgr, face, hands):
+        """
+        Manos (puntas en px del frame) para este frame con el grafo `hands`;
+        reutiliza la última detección si no toca correr.
+        """
+        self.frames += 1
+        h, w = frame_bgr.shape[:2]
+        box = self._update_box(face, w, h) if face else None
+        if box is None:
+            self._reset()
+            return []
+
+        if self._motion_in(frame_bgr, box):
+            self._hot_left = self.hot_hold_frames
+
+        due = self._since_run is None or self._since_run + 1 >= self.idle_every_n
+        if not self.hot and not due:
+            self._since_run += 1
+            return self._last
+
+        found = process_roi_bgr(hands, frame_bgr, box)
+        self.runs += 1
+        if self.hot:
+            self.hot_runs += 1
+        self._since_run = 0
+        self._last = found
+        if found:
+            self._hot_left = self.hot_hold_frames   # mano en la región: seguirla a tasa completa
+        elif self._hot_left > 0:
+            self._hot_left -= 1
+        return found
+
+    def _update_box(self, face, w, h):
+        """Recorte vigente; se recalcula solo si el rostro se acerca al borde o cambia de tamaño."""
+        tight = face_box(face, w, h, 0.0)
+        if tight is None:
+            return None
+        if self._box is not None and self._still_fits(tight, w, h):
+            return self._box
+        box = face_box(face, w, h, self.roi_margin)
+        if box != self._box:
+            self.box_moves += 1
+            # La miniatura anterior es de otra región: no cuenta como movimiento
+            self._prev_thumb = None
+        self._box = box
+        return box
+
+    def _still_fits(self, tight, w, h):
+        x0, y0, x1, y1 = self._box
+        if x1 > w or y1 > h:
+            return False                 # cambió la resolución de captura
+        fx0, fy0, fx1, fy1 = tight
+        mx, my = self.edge * (x1 - x0), self.edge * (y1 - y0)
+        inside = fx0 >= x0 + mx and fx1 <= x1 - mx and fy0 >= y0 + my and fy1 <= y1 - my
+        side = max(fx1 - fx0, fy1 - fy0)
+        expected = max(x1 - x0, y1 - y0) / (1.0 + 2.0 * self.roi_margin)
+        return inside and 0.7 * expected <= side <= 1.3 * expected
+
+    def _motion_in(self, frame_bgr, box):
+        """Fracción de píxeles de la miniatura de la región que cambió respecto al frame anterior."""
+        x0, y0, x1, y1 = box
+        gray = cv2.cvtColor(cv2.resize(frame_bgr[y0:y1, x0:x1], _MOTION_SIZE,
+                                       interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        prev, self._prev_thumb = self._prev_thumb, gray
+        if prev is None:
+            return False
+        changed = np.count_nonzero(cv2.absdiff(gray, prev) > self.motion_threshold)
+        return changed >= self.motion_fraction * gray.size
+
+    def _reset(self):
+        self._hot_left = 0
+        self._since_run = None
+        self._prev_thumb = None
+        self._box = None
+        self._last = []
+
+    def stats(self):
+        return {"frames": self.frames, "runs": self.runs, "hot_runs": self.hot_runs,
+                "hot": self.hot, "idle_every_n": self.idle_every_n,
+                "box": list(self._box) if self._box else None, "box_moves": self.box_moves}
@@ -1,19 +1,37 @@
 import mediapipe as mp
 
-_HANDS = mp.solutions.hands.Hands(
-    static_image_mode=False, max_num_hands=2,
-    min_detection_confidence=0.5, min_tracking_confidence=0.5
-)
-
 FINGERTIPS = [4,8,12,16,20]
 
-def process_frame_bgr(frame_bgr):
+def create_hands():
+    """
+    Grafo Hands en modo seguimiento: guarda estado de la imagen anterior, así que
+    cada stream necesita el suyo y solo lo usa el hilo de inferencia que lo creó
+    (los grafos de MediaPipe no son thread-safe).
+    """
+    return mp.solutions.hands.Hands(
+        static_image_mode=False, max_num_hands=2,
+        min_detection_confidence=0.5, min_tracking_confidence=0.5
+    )
+
+def process_frame_bgr(hands, frame_bgr):
     h, w = frame_bgr.shape[:2]
-    rgb = frame_bgr[:, :, ::-1]
-    res = _HANDS.process(rgb)
+    return process_roi_bgr(hands, frame_bgr, (0, 0, w, h))
+
+def process_roi_bgr(hands, frame_bgr, box):
+    """
+    Corre el grafo `hands` solo sobre el recorte box=(x0, y0, x1, y1) en px y
+    devuelve las puntas de los dedos en coordenadas del frame completo.
+    """
+    x0, y0, x1, y1 = box
+    crop = frame_bgr[y0:y1, x0:x1]
+    ch, cw = crop.shape[:2]
+    if ch == 0 or cw == 0:
+        return []
+    rgb = crop[:, :, ::-1]
+    res = hands.process(rgb)
     out = []
     if res.multi_hand_landmarks:
         for hand in res.multi_hand_landmarks:
-            pts = {i: (hand.landmark[i].x * w, hand.landmark[i].y * h) for i in FINGERTIPS}
+            pts = {i: (x0 + hand.landmark[i].x * cw, y0 + hand.landmark[i].y * ch) for i in FINGERTIPS}
             out.append(pts)
     return out  # lista de manos, cada una con tips
@@ -0,0 +1,58 @@
+# detection/extract_points/landmark_frame.py
+from ..data_processing.face_features import landmarks_to_array
+from .face_mesh_processor import points_from_array
+
+
+class LandmarkFrame:
+    """
+    Resultado de FaceMesh para un frame, calculado una sola vez y compartido entre
+    app.py (EAR/MAR/pose) y DrowsinessPipeline (detectores por eventos).
+    - landmarks: lista de landmarks normalizados del primer rostro (o None)
+    - message: el NormalizedLandmarkList de origen, si se tiene (conversión rápida)
+    - width/height: tamaño en px del frame sobre el que se infirió
+    - array: los mismos landmarks como (N, 3) float32, convertido una vez y cacheado
+      (from_array lo recibe ya hecho, p.ej. landmarks de un recorte llevados al frame)
+    """
+    __slots__ = ("landmarks", "message", "width", "height", "_array", "_points")
+
+    def __init__(self, landmarks, width: int, height: int, message=None):
+        self.landmarks = landmarks
+        self.message = message
+        self.width = width
+        self.height = height
+        self._array = None
+        self._points = None
+
+    @classmethod
+    def from_results(cls, results, width: int, height: int):
+        """Construye el frame a partir de la salida de FaceMesh.process()."""
+        if results is None or not results.multi_face_landmarks:
+            return cls(None, width, height)
+        face = results.multi_face_landmarks[0]
+        return cls(face.landmark, width, height, message=face)
+
+    @classmethod
+    def from_array(cls, array, width: int, height: int):
+        """Construye el frame desde un arreglo (N, 3) normalizado al frame completo."""
+        frame = cls(None, width, height)
+        frame._array = array
+        return frame
+
+    @property
+    def has_face(self) -> bool:
+        return self.landmarks is not None or self._array is not None
+
+    @property
+    def array(self):
+        if self._array is None and self.landmarks is not None:
+            source = self.message if self.message is not None else self.landmarks
+            self._array = landmarks_to_array(source)
+        return self._array
+
+    def face_points(self) -> dict:
+        """Puntos en px para los detectores (mismo formato que process_frame_bgr)."""
+        if not self.has_face:
+            return {}
+        if self._points is None:
+            self._points = points_from_array(self.array, self.width, self.height)
+        return self._points
@@ -1,34 +1,72 @@
 # detection/pipeline.py
+import time
+
 from .extract_points.face_mesh_processor import process_frame_bgr as face_pts
-from .extract_points.hands_processor import process_frame_bgr as hands_pts
+from .extract_points.hand_tracker import HandTracker
+from .extract_points.hands_processor import create_hands
 from .drowsiness_features.flicker_and_microsleep.processing import FlickerAndMicroSleep
 from .drowsiness_features.yawn.processing import YawnDetector
 from .drowsiness_features.eye_rub.processing import EyeRubDetector
 from .drowsiness_features.pitch.processing import PitchDetector  # <— AÑADIR
 
 class DrowsinessPipeline:
-    def __init__(self):
+    def __init__(self, hands_every_n=6, clock=time.time):
+        # clock: reloj de los detectores cuando step() no recibe el timestamp del frame
         # Requiere cierre continuo >=3s para microsueño y bostezo >=3s
-        self.fms = FlickerAndMicroSleep(microsleep_s=3.0, report_window_s=60.0)
-        self.yawn = YawnDetector(hold_s=3.0, window_s=180.0)
-        self.rub  = EyeRubDetector(dist_px=40.0, hold_s=1.0, window_s=300.0)
-        self.pitch = PitchDetector(hold_s=3.0, window_s=180.0, ratio_threshold=1.0)  # <— AÑADIR
+        self.fms = FlickerAndMicroSleep(microsleep_s=3.0, report_window_s=60.0, clock=clock)
+        self.yawn = YawnDetector(hold_s=3.0, window_s=180.0, clock=clock)
+        self.rub  = EyeRubDetector(dist_px=40.0, hold_s=1.0, window_s=300.0, clock=clock)
+        self.pitch = PitchDetector(hold_s=3.0, window_s=180.0, ratio_threshold=1.0, clock=clock)  # <— AÑADIR
+        # Hands solo alrededor del rostro y a tasa reducida salvo que una mano se acerque
+        self.hands = HandTracker(idle_every_n=hands_every_n)
+        # Grafo Hands propio solo para el modo autónomo (step); embebido lo pone el llamador
+        self._own_hands = None
 
-    def step(self, frame_bgr):
-        evts = []
+    def step(self, frame_bgr, ts=None):
+        """
+        Modo autónomo: corre su propio FaceMesh sobre el frame.
+        ts: timestamp del frame (captura o posición en la grabación); con él las
+        duraciones y ventanas no dependen de cuándo se procesa el frame, y una
+        re-ejecución offline da siempre los mismos eventos.
+        """
         face = face_pts(frame_bgr) or {}
-        hands = hands_pts(frame_bgr) or []
+        if self._own_hands is None:
+            self._own_hands = create_hands()
+        return self._update(face, frame_bgr, ts, self._own_hands)
+
+    def step_landmarks(self, landmark_frame, frame_bgr, ts=None, hands_graph=None):
+        """
+        Modo embebido: reutiliza los landmarks ya inferidos por el llamador
+        (LandmarkFrame) en lugar de correr FaceMesh de nuevo. `hands_graph` es el
+        grafo Hands del stream (del hilo que llama); sin él no hay detección de manos.
+        """
+        face = landmark_frame.face_points() if landmark_frame is not None else {}
+        return self._update(face, frame_bgr, ts, hands_graph)
+
+    def close(self):
+        """Libera el grafo Hands del modo autónomo, si se creó."""
+        if self._own_hands is not None:
+            self._own_hands.close()
+            self._own_hands = None
+
+    def _update(self, face, frame_bgr, ts=None, hands_graph=None):
+        evts = []
+        # Sin imagen (landmarks enviados por un cliente remoto) no hay detección de manos
+        if frame_bgr is not None and hands_graph is not None:
+            hands = self.hands.update(frame_bgr, face, hands_graph) or []
+        else:
+            hands = []
 
         eyes = face.get("eyes")
         mouth = face.get("mouth")
         head = face.get("head")
 
         if eyes:
-            evts += self.fms.update(eyes)
-            evts += self.rub.update(eyes, hands)
+            evts += self.fms.update(eyes, ts)
+            evts += self.rub.update(eyes, hands, ts)
         if mouth:
-            evts += self.yawn.update(mouth)
+            evts += self.yawn.update(mouth, ts)
         if head and mouth:                       # <— REQUIERE head + mouth
-            evts += self.pitch.update(head, mouth)
+            evts += self.pitch.update(head, mouth, ts)
 
         return evts
@@ -1,11 +1,13 @@
 import time
 
 class Stopwatch:
-    def __init__(self): self._t0 = None
-    def start(self): self._t0 = time.time()
-    def stop(self): 
+    # clock: fuente de tiempo inyectable; ts explícito (p.ej. captura del frame) tiene prioridad
+    def __init__(self, clock=time.time): self._t0 = None; self.clock = clock
+    def _now(self, ts): return self.clock() if ts is None else ts
+    def start(self, ts=None): self._t0 = self._now(ts)
+    def stop(self, ts=None):
         if self._t0 is None: return 0.0
-        dt = time.time() - self._t0; self._t0 = None; return dt
-    def elapsed(self):
-        return 0.0 if self._t0 is None else time.time() - self._t0
+        dt = self._now(ts) - self._t0; self._t0 = None; return dt
+    def elapsed(self, ts=None):
+        return 0.0 if self._t0 is None else self._now(ts) - self._t0
     def running(self): return self._t0 is not None
@@ -0,0 +1,124 @@
+# runtime/capture.py
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class CapturedFrame:
+    """Frame BGR leído de la cámara con su id secuencial y timestamp de captura."""
+    __slots__ = ("frame", "frame_id", "ts", "mono")
+
+    def __init__(self, frame, frame_id: int, ts: float, mono: float):
+        self.frame = frame
+        self.frame_id = frame_id
+        self.ts = ts        # epoch (s) al salir de cap.read()
+        self.mono = mono    # perf_counter() en el mismo instante, para medir latencias
+
+
+class FrameRing:
+    """
+    Buffer circular pequeño con política "gana el último frame".
+    El productor (hilo de captura) nunca se bloquea; el consumidor siempre toma
+    el más reciente y los frames que no alcanzó a procesar cuentan como descartados.
+    """
+
+    def __init__(self, size: int = 3):
+        self._buf = deque(maxlen=max(1, size))
+        self._lock = threading.Lock()
+        self._last_taken_id = 0
+        self.captured = 0
+        self.dropped = 0
+
+    def put(self, item: CapturedFrame) -> None:
+        with self._lock:
+            self._buf.append(item)
+            self.captured += 1
+
+    def take_latest(self) -> Optional[CapturedFrame]:
+        """Devuelve el frame más nuevo aún no consumido (o None si no hay)."""
+        with self._lock:
+            if not self._buf:
+                return None
+            item = self._buf[-1]
+            if item.frame_id <= self._last_taken_id:
+                return None
+            if self._last_taken_id:
+                self.dropped += item.frame_id - self._last_taken_id - 1
+            self._last_taken_id = item.frame_id
+            self._buf.clear()
+            return item
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buf)
+
+
+class CaptureThread(threading.Thread):
+    """
+    Hilo dedicado a cap.read(): saca la llamada bloqueante de OpenCV del event loop.
+    - transform: función aplicada a cada frame (p.ej. orientación) antes de publicarlo
+    - on_frame: callback opcional tras publicar (p.ej. despertar al loop asyncio)
+    Si hay más de max_failures lecturas fallidas seguidas marca `lost` y termina.
+    """
+
+    def __init__(
+        self,
+        cap,
+        ring: FrameRing,
+        transform: Optional[Callable[[Any], Any]] = None,
+        on_frame: Optional[Callable[[], None]] = None,
+        max_failures: int = 10,
+    ):
+        super().__init__(name="capture", daemon=True)
+        self.cap = cap
+        self.ring = ring
+        self.transform = transform
+        self.on_frame = on_frame
+        self.max_failures = max_failures
+        self.lost = False
+        self._stop_event = threading.Event()
+        self._next_id = 0
+        self._t0 = time.perf_counter()
+
+    def run(self) -> None:
+        failures = 0
+        while not self._stop_event.is_set():
+            ok, frame = self.cap.read()
+            if not ok or frame is None:
+                failures += 1
+                if failures > self.max_failures:
+                    self.lost = True
+                    break
+                self._stop_event.wait(0.1)
+                continue
+            failures = 0
+            ts = time.time()
+            mono = time.perf_counter()
+            if self.transform is not None:
+                frame = self.transform(frame)
+            self._next_id += 1
+            self.ring.put(CapturedFrame(frame, self._next_id, ts, mono))
+            if self.on_frame is not None:
+                try:
+                    self.on_frame()
+                except RuntimeError:
+                    # el loop ya se cerró
+                    break
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """Detiene el hilo y libera el dispositivo."""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        self.cap.release()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(1e-6, time.perf_counter() - self._t0)
+        return {
+            "captured": self.ring.captured,
+            "dropped": self.ring.dropped,
+            "buffered": len(self.ring),
+            "fps": round(self.ring.captured / elapsed, 2),
+            "lost": self.lost,
+        }
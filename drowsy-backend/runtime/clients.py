@@ -0,0 +1,258 @@
+# runtime/clients.py
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from .preview import DEFAULT_MAX_WIDTH, DEFAULT_QUALITY
+from .ws_protocol import PROTOCOL_BINARY, PROTOCOL_JSON
+
+# Streams a los que un cliente /ws puede suscribirse
+STREAMS = ("metrics", "events", "raw", "processed", "landmarks")
+PREVIEW_STREAMS = ("raw", "processed", "landmarks")
+
+# Tipos de entrada en la cola de salida de cada cliente
+KIND_TICK = "tick"      # métricas + vistas previa del tick: se coalescen, solo vale el último
+KIND_EVENT = "event"    # eventos/config/control: nunca se descartan
+KIND_PRIORITY = "priority"  # eventos de seguridad: nunca se descartan y adelantan la cola
+
+Message = Union[str, bytes]
+
+
+class Subscription:
+    """
+    Suscripción de un cliente a un stream.
+    - max_fps: tope de envíos por segundo; None = cadencia por defecto del servidor
+      (un envío cada `every_n` frames analizados, como el payload histórico)
+    - max_width/quality: resolución y calidad JPEG objetivo (solo vistas previa)
+    """
+    __slots__ = ("stream", "max_fps", "max_width", "quality", "_last_sent")
+
+    def __init__(self, stream: str, max_fps: Optional[float] = None,
+                 max_width: int = DEFAULT_MAX_WIDTH, quality: int = DEFAULT_QUALITY):
+        self.stream = stream
+        self.max_fps = max_fps
+        self.max_width = max_width
+        self.quality = quality
+        self._last_sent: Optional[float] = None
+
+    @property
+    def encoding(self):
+        return (self.max_width, self.quality)
+
+    def due(self, frame_count: int, every_n: int, now: float) -> bool:
+        if self.max_fps is None:
+            return frame_count % every_n == 0
+        if self.max_fps <= 0:
+            return False
+        return self._last_sent is None or (now - self._last_sent) >= 1.0 / self.max_fps
+
+    def mark_sent(self, now: float) -> None:
+        self._last_sent = now
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"maxFps": self.max_fps}
+        if self.stream in PREVIEW_STREAMS:
+            out.update({"width": self.max_width, "quality": self.quality})
+        return out
+
+
+def _parse_subscription(stream: str, spec: Any) -> Subscription:
+    spec = spec if isinstance(spec, dict) else {}
+    max_fps = spec.get("maxFps")
+    try:
+        max_fps = float(max_fps) if max_fps is not None else None
+    except (TypeError, ValueError):
+        max_fps = None
+    try:
+        width = int(spec.get("width", DEFAULT_MAX_WIDTH))
+    except (TypeError, ValueError):
+        width = DEFAULT_MAX_WIDTH
+    try:
+        quality = int(spec.get("quality", DEFAULT_QUALITY))
+    except (TypeError, ValueError):
+        quality = DEFAULT_QUALITY
+    return Subscription(
+        stream,
+        max_fps=max_fps,
+        max_width=max(64, min(DEFAULT_MAX_WIDTH, width)),
+        quality=max(10, min(100, quality)),
+    )
+
+
+def default_subscriptions() -> Dict[str, Subscription]:
+    """Lo que recibe un cliente que nunca envía 'subscribe': todo, como antes."""
+    return {s: Subscription(s) for s in STREAMS}
+
+
+class WsClient:
+    """
+    Conexión /ws con el protocolo negociado al conectar, sus suscripciones y su
+    propia cola de salida acotada, vaciada por una tarea emisora independiente:
+    un cliente lento ya no frena a los demás ni al loop de cámara.
+    - Los ticks (métricas + vistas previa) se coalescen: en cola solo queda el último.
+    - Los eventos nunca se descartan; los prioritarios se envían antes que lo ya encolado.
+    - Si la cola se mantiene por encima de max_queue más de evict_after_s, se desconecta.
+      También si un solo envío tarda más de evict_after_s: un send colgado no deja
+      avanzar la cola, así que sin esto el cliente nunca pasaría de max_queue.
+    """
+    __slots__ = (
+        "ws", "protocol", "subscriptions", "max_queue", "evict_after_s",
+        "closed", "_queue", "_wakeup", "_task", "_over_since",
+        "sent", "coalesced", "last_send_ms", "avg_send_ms",
+    )
+
+    def __init__(self, ws, protocol: str = PROTOCOL_JSON, max_queue: int = 32,
+                 evict_after_s: float = 5.0):
+        self.ws = ws
+        self.protocol = protocol
+        self.subscriptions: Dict[str, Subscription] = default_subscriptions()
+        self.max_queue = max(1, max_queue)
+        self.evict_after_s = evict_after_s
+        self.closed = False
+        self._queue: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._over_since: Optional[float] = None
+        self.sent = 0
+        self.coalesced = 0
+        self.last_send_ms: Optional[float] = None
+        self.avg_send_ms: Optional[float] = None
+
+    @property
+    def binary(self) -> bool:
+        return self.protocol == PROTOCOL_BINARY
+
+    def wants(self, stream: str) -> bool:
+        return stream in self.subscriptions
+
+    def apply_control(self, msg: Dict[str, Any]) -> bool:
+        """
+        Mensajes de control:
+          {"type": "subscribe", "streams": {"metrics": {"maxFps": 2},
+                                            "processed": {"maxFps": 10, "width": 640, "quality": 70}}}
+            reemplaza el conjunto de suscripciones (una lista de nombres usa valores por defecto)
+          {"type": "unsubscribe", "streams": ["raw", ...]}
+        Retorna True si el mensaje era de control.
+        """
+        mtype = msg.get("type")
+        streams = msg.get("streams")
+        if mtype == "subscribe":
+            if isinstance(streams, list):
+                streams = {s: {} for s in streams}
+            if not isinstance(streams, dict):
+                return True
+            self.subscriptions = {
+                s: _parse_subscription(s, spec) for s, spec in streams.items() if s in STREAMS
+            }
+            return True
+        if mtype == "unsubscribe":
+            for s in streams or []:
+                self.subscriptions.pop(s, None)
+            return True
+        return False
+
+    def due_streams(self, frame_count: int, every_n: int, now: Optional[float] = None) -> List[str]:
+        now = time.monotonic() if now is None else now
+        return [
+            s for s, sub in self.subscriptions.items()
+            if s != "events" and sub.due(frame_count, every_n, now)
+        ]
+
+    def describe(self) -> Dict[str, Any]:
+        return {s: sub.as_dict() for s, sub in self.subscriptions.items()}
+
+    # ---- cola de salida ----
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sender())
+
+    def enqueue(self, messages: Sequence[Message], kind: str = KIND_EVENT) -> None:
+        """Encola sin bloquear; el envío real lo hace la tarea emisora."""
+        if self.closed or not messages:
+            return
+        if kind == KIND_TICK:
+            stale = [e for e in self._queue if e[0] == KIND_TICK]
+            for e in stale:
+                self._queue.remove(e)
+            self.coalesced += len(stale)
+        entry = (kind, list(messages), time.perf_counter())
+        if kind == KIND_PRIORITY:
+            # Detrás de los prioritarios ya encolados, delante de todo lo demás
+            pos = 0
+            while pos < len(self._queue) and self._queue[pos][0] == KIND_PRIORITY:
+                pos += 1
+            self._queue.insert(pos, entry)
+        else:
+            self._queue.append(entry)
+        self._check_overflow()
+        self._wakeup.set()
+
+    def _check_overflow(self) -> None:
+        if len(self._queue) <= self.max_queue:
+            self._over_since = None
+            return
+        now = time.monotonic()
+        if self._over_since is None:
+            self._over_since = now
+        elif now - self._over_since >= self.evict_after_s:
+            print(f"[ws] cliente lento desconectado (cola={len(self._queue)})")
+            self.close(code=1013)
+
+    async def _sender(self) -> None:
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                _kind, messages, enqueued_at = self._queue.popleft()
+                for m in messages:
+                    send = self.ws.send_bytes(m) if isinstance(m, bytes) else self.ws.send_text(m)
+                    await asyncio.wait_for(send, self.evict_after_s)
+                self._record_send((time.perf_counter() - enqueued_at) * 1000.0)
+                self._check_overflow()
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            print(f"[ws] cliente colgado desconectado (envío > {self.evict_after_s:.1f}s)")
+            self.close(code=1013)
+        except Exception as e:
+            print(f"Error enviando a cliente: {e}")
+            self.close()
+
+    def _record_send(self, ms: float) -> None:
+        self.sent += 1
+        self.last_send_ms = ms
+        self.avg_send_ms = ms if self.avg_send_ms is None else 0.9 * self.avg_send_ms + 0.1 * ms
+
+    def close(self, code: int = 1000, reason: Optional[str] = None) -> None:
+        """Marca el cliente como cerrado, vacía su cola y cierra el socket."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._wakeup.set()
+        current = asyncio.current_task()
+        if self._task is not None and self._task is not current:
+            self._task.cancel()
+        asyncio.ensure_future(self._close_ws(code, reason))
+
+    async def _close_ws(self, code: int, reason: Optional[str] = None) -> None:
+        try:
+            await self.ws.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "protocol": self.protocol,
+            "queue": len(self._queue),
+            "maxQueue": self.max_queue,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "lastSendMs": round(self.last_send_ms, 2) if self.last_send_ms is not None else None,
+            "avgSendMs": round(self.avg_send_ms, 2) if self.avg_send_ms is not None else None,
+            "subscriptions": self.describe(),
+        }
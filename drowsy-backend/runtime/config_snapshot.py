@@ -0,0 +1,54 @@
+# runtime/config_snapshot.py
+"""
+Configuración de un stream como snapshot inmutable y versionado.
+
+La config cambia muy de vez en cuando (POST /config, reapertura de la cámara) y
+se lee todo el tiempo (cada tick, /config, /health), así que se arma una sola
+vez por versión: el dict, el cuerpo JSON de GET /config, su ETag y el mensaje
+'config' ya codificado para los clientes. Nadie modifica un snapshot; un cambio
+produce otro con la versión siguiente y las métricas solo llevan ese número.
+
+`fields` son las claves que antes viajaban en cada mensaje de métricas
+(umbrales, pesos, cámara); van en el mensaje 'config' bajo "metrics" para que
+el cliente las combine con cada tick sin esperar a otro GET.
+"""
+import hashlib
+from typing import Any, Dict, Optional
+
+from .messages import ConfigMessage, dumps
+
+
+class ConfigSnapshot:
+    __slots__ = ("version", "source", "config", "fields", "body", "etag", "message")
+
+    def __init__(self, version: int, config: Dict[str, Any], fields: Optional[Dict[str, Any]] = None):
+        self.version = version
+        # Lo que se comparó para decidir si hubo cambio (sin la versión)
+        self.source = config
+        self.config = {**config, "version": version}
+        self.fields = fields or {}
+        self.body = dumps(self.config).encode("utf-8")
+        self.etag = f'"{version}-{hashlib.sha1(self.body).hexdigest()[:16]}"'
+        self.message = ConfigMessage(self.config, version=version, fields=self.fields)
+        self.message.encode()
+
+    def same(self, config: Dict[str, Any]) -> bool:
+        return self.source == config
+
+    def next(self, config: Dict[str, Any], fields: Optional[Dict[str, Any]] = None) -> "ConfigSnapshot":
+        return ConfigSnapshot(self.version + 1, config, fields)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match (lista separada por comas, '*' o etags débiles W/...) contra `etag`."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,128 @@
+# runtime/event_routes.py
+"""
+Ruteo declarativo de eventos del pipeline: para cada tipo, adónde va.
+
+- persist:   se guarda (events / window_reports vía spool)
+- broadcast: se envía a los clientes suscritos a "events"
+- sample_s:  como mucho un evento de ese tipo cada sample_s segundos (0 = todos);
+             con coalesce, cada cuánto sale el último valor
+- coalesce:  no se envía al llegar; se guarda el último y sale en el tick
+             (un tipo coalescido no se persiste: sería una fila por frame)
+- priority:  camino prioritario: adelanta la cola de cada cliente y dispara la
+             subida del spool sin esperar lote ni latencia
+
+La tabla por defecto se puede ajustar con EVENT_ROUTES (JSON), por ejemplo
+    EVENT_ROUTES='{"eye_blink": {"persist": true}, "frame_overlay": {"sample_s": 0.5}}'
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+
+class Route:
+    __slots__ = ("persist", "broadcast", "sample_s", "coalesce", "priority")
+
+    def __init__(self, persist: bool = True, broadcast: bool = True, sample_s: float = 0.0,
+                 coalesce: bool = False, priority: bool = False):
+        self.persist = persist
+        self.broadcast = broadcast
+        self.sample_s = max(0.0, float(sample_s))
+        self.coalesce = coalesce
+        self.priority = priority
+
+    @property
+    def stored(self) -> bool:
+        return self.persist and not self.coalesce
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {s: getattr(self, s) for s in self.__slots__}
+
+
+# Eventos de seguridad: nunca se muestrean ni se coalescen
+SAFETY_EVENTS = ("micro_sleep", "pitch_down", "yawn")
+
+DEFAULT_ROUTES: Dict[str, Route] = {
+    **{t: Route(priority=True) for t in SAFETY_EVENTS},
+    "eye_rub": Route(),
+    "report_window": Route(),
+    # Uno por parpadeo; el cliente los cuenta en vivo y la DB ya los tiene
+    # agregados en report_window (flickers), así que no se guarda fila por fila
+    "eye_blink": Route(persist=False),
+    # Diagnóstico por frame para el HUD: solo interesa el último valor, una vez por segundo
+    "frame_overlay": Route(persist=False, coalesce=True, sample_s=1.0),
+}
+# Tipos no declarados: se guardan y envían, pero a lo sumo uno por segundo
+FALLBACK_ROUTE = Route(sample_s=1.0)
+
+
+def parse_routes(spec: Optional[str], base: Optional[Dict[str, Route]] = None) -> Dict[str, Route]:
+    """Tabla por defecto con los ajustes de `spec` (JSON {tipo: {campo: valor}}) encima."""
+    routes = dict(DEFAULT_ROUTES if base is None else base)
+    if not spec:
+        return routes
+    try:
+        overrides = json.loads(spec)
+    except ValueError as e:
+        print(f"[events] EVENT_ROUTES inválido ({e}); se usa la tabla por defecto")
+        return routes
+    for etype, fields in (overrides.items() if isinstance(overrides, dict) else ()):
+        if not isinstance(fields, dict):
+            continue
+        current = routes.get(etype, FALLBACK_ROUTE).as_dict()
+        current.update({k: v for k, v in fields.items() if k in Route.__slots__})
+        if etype in SAFETY_EVENTS:
+            # Un ajuste puede silenciar el envío, pero no muestrear ni demorar eventos de seguridad
+            current.update(sample_s=0.0, coalesce=False, priority=True)
+        routes[etype] = Route(**current)
+    return routes
+
+
+class EventRouter:
+    """Estado del ruteo de un stream: muestreo por tipo, últimos coalescidos y contadores."""
+
+    def __init__(self, routes: Dict[str, Route]):
+        self.routes = routes
+        self._last: Dict[str, float] = {}
+        self._held: Dict[str, Any] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, etype: str, key: str) -> None:
+        c = self._counts.get(etype)
+        if c is None:
+            c = self._counts[etype] = {"seen": 0, "persisted": 0, "broadcast": 0, "sampled": 0, "coalesced": 0}
+        c[key] += 1
+
+    def route(self, etype: Optional[str], now: float) -> Optional[Route]:
+        """Ruta del evento, o None si el muestreo lo descarta."""
+        etype = etype or "unknown"
+        route = self.routes.get(etype, FALLBACK_ROUTE)
+        self._count(etype, "seen")
+        if route.sample_s > 0 and not route.coalesce:
+            last = self._last.get(etype)
+            if last is not None and now - last < route.sample_s:
+                self._count(etype, "sampled")
+                return None
+            self._last[etype] = now
+        if route.stored:
+            self._count(etype, "persisted")
+        if route.broadcast:
+            self._count(etype, "broadcast" if not route.coalesce else "coalesced")
+        return route
+
+    def hold(self, etype: Optional[str], message: Any) -> None:
+        """Guarda el último mensaje coalescible del tipo; reemplaza al anterior."""
+        self._held[etype or "unknown"] = message
+
+    def take_held(self, now: float) -> List[Any]:
+        """Mensajes coalescidos que toca enviar en este tick (el último de cada tipo)."""
+        out = []
+        for etype in list(self._held):
+            sample_s = self.routes.get(etype, FALLBACK_ROUTE).sample_s
+            last = self._last.get(etype)
+            if sample_s > 0 and last is not None and now - last < sample_s:
+                continue
+            self._last[etype] = now
+            out.append(self._held.pop(etype))
+        return out
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {t: dict(c) for t, c in self._counts.items()}
@@ -0,0 +1,250 @@
+# runtime/flusher.py
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+# (seq, clave de sesión, fila) como los entrega Spool.read_batch
+Batch = List[Any]
+
+
+class TableFlushStats:
+    """Contadores y backoff propios de una tabla: una tabla que falla no frena a las demás."""
+    __slots__ = ("batches", "rows", "failures", "quarantined", "last_batch", "avg_batch",
+                 "last_ms", "_latencies", "last_error", "backoff_s", "resume_at")
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.failures = 0
+        self.quarantined = 0
+        self.backoff_s = 0.0
+        self.resume_at = 0.0
+        self.last_batch = 0
+        self.avg_batch: Optional[float] = None
+        self.last_ms: Optional[float] = None
+        self._latencies: deque = deque(maxlen=200)
+        self.last_error: Optional[str] = None
+
+    def record(self, rows: int, ms: float) -> None:
+        self.batches += 1
+        self.rows += rows
+        self.last_batch = rows
+        self.avg_batch = rows if self.avg_batch is None else 0.9 * self.avg_batch + 0.1 * rows
+        self.last_ms = ms
+        self._latencies.append(ms)
+
+    def settle(self, ok: bool, backoff_max_s: float) -> None:
+        """Fin de la ronda de la tabla: sin error se limpia el backoff; con error se duplica."""
+        if ok:
+            self.backoff_s = 0.0
+            self.resume_at = 0.0
+        else:
+            self.backoff_s = min(backoff_max_s, max(1.0, self.backoff_s * 2))
+            self.resume_at = time.monotonic() + self.backoff_s
+
+    def as_dict(self) -> Dict[str, Any]:
+        p50 = p95 = None
+        if self._latencies:
+            p50, p95 = (round(float(v), 2) for v in np.percentile(np.asarray(self._latencies), [50, 95]))
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "failures": self.failures,
+            "quarantined": self.quarantined,
+            "backoffS": self.backoff_s if time.monotonic() < self.resume_at else 0.0,
+            "lastBatch": self.last_batch,
+            "avgBatch": round(self.avg_batch, 1) if self.avg_batch is not None else None,
+            "insertMs": {
+                "last": round(self.last_ms, 2) if self.last_ms is not None else None,
+                "p50": p50,
+                "p95": p95,
+            },
+            "lastError": self.last_error,
+        }
+
+
+class Flusher:
+    """
+    Subida del spool por lotes disparados por tamaño o por latencia:
+    - notify(pendientes) despierta al flusher en cuanto hay un lote lleno;
+      si no, corre cada max_latency_s como máximo.
+    - Cada ronda vacía todas las tablas hasta que no quede nada (no un lote fijo
+      por tick), tablas en paralelo con a lo sumo max_inflight inserts en vuelo
+      y, dentro de una tabla, lotes en orden (el cursor avanza lote a lote).
+    - Un lote que falla no se descarta: queda en el spool, se cuenta y esa tabla
+      (solo esa) se pausa con backoff exponencial hasta backoff_max_s.
+    - kick(tabla) sube esa tabla en la próxima vuelta aunque esté en backoff
+      (camino prioritario de los eventos de seguridad).
+    - Un lote que el servidor rechaza de forma definitiva (rejected(error), p.ej.
+      un 4xx por columna inexistente) se parte en mitades hasta aislar las filas
+      rechazadas; esas van a cuarentena y el resto se sube. Así una fila mala no
+      bloquea la tabla para siempre. Cada parte se confirma (ack) apenas sube o va
+      a cuarentena: si una parte posterior falla, en el spool queda solo desde
+      ella en adelante y nada de lo ya subido se repite.
+
+    Las dependencias se inyectan como corrutinas:
+    read_batch(tabla, n) -> lote, prepare(tabla, lote) -> filas | None (None = aún
+    no se puede subir), insert(tabla, filas) -> bool, ack(tabla, lote) (avanza el
+    cursor de la tabla hasta el último seq del lote; las partes se confirman en
+    orden), quarantine(tabla, lote, error) (sin ella, un rechazo se trata como
+    cualquier falla).
+    """
+
+    def __init__(self, tables: Dict[str, int],
+                 read_batch: Callable[[str, int], Awaitable[Batch]],
+                 prepare: Callable[[str, Batch], Awaitable[Optional[List[dict]]]],
+                 insert: Callable[[str, List[dict]], Awaitable[bool]],
+                 ack: Callable[[str, Batch], Awaitable[None]],
+                 quarantine: Optional[Callable[[str, Batch, str], Awaitable[None]]] = None,
+                 rejected: Callable[[Exception], bool] = lambda e: getattr(e, "retryable", True) is False,
+                 max_inflight: int = 2, max_latency_s: float = 2.0,
+                 backoff_max_s: float = 60.0):
+        self.tables = dict(tables)
+        self._read_batch = read_batch
+        self._prepare = prepare
+        self._insert = insert
+        self._ack = ack
+        self._quarantine = quarantine
+        self._rejected = rejected
+        self.max_latency_s = max_latency_s
+        self.backoff_max_s = backoff_max_s
+        self.trigger_rows = max(1, min(self.tables.values()))
+        self._sem = asyncio.Semaphore(max(1, max_inflight))
+        self.max_inflight = max(1, max_inflight)
+        self._wakeup = asyncio.Event()
+        self._forced: set = set()
+        self.inflight = 0
+        self.rounds = 0
+        self.size_triggers = 0
+        self.last_round_ms: Optional[float] = None
+        self.table_stats: Dict[str, TableFlushStats] = {t: TableFlushStats() for t in self.tables}
+
+    def notify(self, pending_rows: int) -> None:
+        """Disparo por tamaño: hay al menos un lote lleno esperando."""
+        if pending_rows >= self.trigger_rows and not self._wakeup.is_set():
+            self.size_triggers += 1
+            self._wakeup.set()
+
+    def kick(self, table: Optional[str] = None) -> None:
+        """
+        Camino prioritario: sube en la próxima vuelta del loop sin esperar lote ni
+        latencia; `table` se intenta aunque esté en backoff.
+        """
+        if table is not None:
+            self._forced.add(table)
+        self._wakeup.set()
+
+    async def run(self, is_running: Callable[[], bool],
+                  before_round: Optional[Callable[[], Awaitable[Any]]] = None) -> None:
+        while is_running():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.max_latency_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            forced, self._forced = self._forced, set()
+            try:
+                if before_round is not None:
+                    await before_round()
+                await self.drain(forced)
+            except Exception as e:
+                print(f"[flush] error: {e}")
+
+    async def drain(self, force=()) -> bool:
+        """
+        Una ronda: cada tabla fuera de backoff (o forzada) hasta vaciarla.
+        False si alguna quedó pendiente por error.
+        """
+        now = time.monotonic()
+        tables = [t for t in self.tables if t in force or now >= self.table_stats[t].resume_at]
+        if not tables:
+            return True
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(self._drain_table(t, self.tables[t]) for t in tables))
+        self.rounds += 1
+        self.last_round_ms = (time.perf_counter() - t0) * 1000.0
+        for table, ok in zip(tables, results):
+            self.table_stats[table].settle(ok, self.backoff_max_s)
+        return all(results)
+
+    async def _drain_table(self, table: str, limit: int) -> bool:
+        stats = self.table_stats[table]
+        while True:
+            batch = await self._read_batch(table, limit)
+            if not batch:
+                return True
+            rows = await self._prepare(table, batch)
+            if rows is None:
+                return False
+            error = await self._send(table, rows)
+            if error is None:
+                await self._ack(table, batch)
+            elif self._quarantine is not None and self._rejected(error):
+                error = await self._isolate(table, batch, rows, error)
+            if error is not None:
+                stats.failures += 1
+                print(f"[flush] lote de {len(rows)} filas en {table} falló; lo no confirmado queda en el spool")
+                return False
+            if len(batch) < limit:
+                return True
+
+    async def _send(self, table: str, rows: List[dict]) -> Optional[Exception]:
+        """Un insert; retorna el error (None si subió)."""
+        stats = self.table_stats[table]
+        async with self._sem:
+            self.inflight += 1
+            t0 = time.perf_counter()
+            try:
+                ok = await self._insert(table, rows)
+                error = None if ok else RuntimeError("insert retornó False")
+            except Exception as e:
+                error = e
+            finally:
+                self.inflight -= 1
+            ms = (time.perf_counter() - t0) * 1000.0
+        if error is None:
+            stats.record(len(rows), ms)
+        else:
+            stats.last_error = str(error)
+        return error
+
+    async def _isolate(self, table: str, batch: Batch, rows: List[dict], error: Exception) -> Optional[Exception]:
+        """
+        `rows` fue rechazado entero con `error`: se sube por mitades hasta aislar las
+        filas que el servidor rechaza solas, que van a cuarentena. Cada parte se
+        confirma en cuanto sube o queda en cuarentena, así que si aparece un error
+        reintentable (que se retorna) solo queda en el spool la parte que falló y
+        las siguientes.
+        """
+        if len(rows) == 1:
+            await self._quarantine(table, batch, str(error))
+            await self._ack(table, batch)
+            self.table_stats[table].quarantined += 1
+            print(f"[flush] fila de {table} rechazada ({error}); a cuarentena")
+            return None
+        mid = len(rows) // 2
+        for part_batch, part_rows in ((batch[:mid], rows[:mid]), (batch[mid:], rows[mid:])):
+            part_error = await self._send(table, part_rows)
+            if part_error is None:
+                await self._ack(table, part_batch)
+                continue
+            if self._rejected(part_error):
+                part_error = await self._isolate(table, part_batch, part_rows, part_error)
+            if part_error is not None:
+                return part_error
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "maxInflight": self.max_inflight,
+            "inflight": self.inflight,
+            "maxLatencyS": self.max_latency_s,
+            "triggerRows": self.trigger_rows,
+            "rounds": self.rounds,
+            "sizeTriggers": self.size_triggers,
+            "lastRoundMs": round(self.last_round_ms, 2) if self.last_round_ms is not None else None,
+            "tables": {t: s.as_dict() for t, s in self.table_stats.items()},
+        }
@@ -0,0 +1,152 @@
+# runtime/health.py
+"""
+Monitor de salud en segundo plano: cada dependencia (DB, cámaras, inferencia,
+clientes) se sondea en su propia tarea con su propio intervalo y el resultado
+queda en memoria con su timestamp. /health responde desde ese caché sin tocar
+la red ni recalcular nada.
+
+- Una sonda es una corrutina que retorna (ok, detalle) o lanza excepción (= falla).
+- Se considera vencida (stale) si no terminó una vuelta en stale_after segundos
+  (por defecto 3 intervalos + el timeout): una sonda colgada no puede seguir
+  reportando "ok" para siempre.
+- live(): el proceso atiende (el monitor corre y el event loop no está trabado).
+- ready(): todas las sondas críticas están ok y frescas; las no críticas (p.ej. la
+  DB, que tiene spool local) solo degradan el estado.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ProbeFn = Callable[[], Awaitable[Tuple[bool, Dict[str, Any]]]]
+
+
+class Probe:
+    __slots__ = ("name", "fn", "interval_s", "timeout_s", "stale_after_s", "critical",
+                 "ok", "detail", "error", "checked_at", "last_ok_at", "duration_ms", "failures")
+
+    def __init__(self, name: str, fn: ProbeFn, interval_s: float, timeout_s: float = 5.0,
+                 critical: bool = True, stale_after_s: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.stale_after_s = stale_after_s if stale_after_s is not None else 3 * interval_s + timeout_s
+        self.critical = critical
+        self.ok: Optional[bool] = None
+        self.detail: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.last_ok_at: Optional[float] = None
+        self.duration_ms: Optional[float] = None
+        self.failures = 0
+
+    async def run_once(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            ok, detail = await asyncio.wait_for(self.fn(), timeout=self.timeout_s)
+            self.ok, self.detail, self.error = bool(ok), detail, None
+        except asyncio.TimeoutError:
+            self.ok, self.error = False, f"timeout ({self.timeout_s}s)"
+        except Exception as e:
+            self.ok, self.error = False, str(e)
+        self.duration_ms = (time.perf_counter() - t0) * 1000.0
+        self.checked_at = time.time()
+        if self.ok:
+            self.last_ok_at = self.checked_at
+            self.failures = 0
+        else:
+            self.failures += 1
+
+    def stale(self, now: float) -> bool:
+        return self.checked_at is None or now - self.checked_at > self.stale_after_s
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "stale": self.stale(now),
+            "critical": self.critical,
+            "checkedAt": round(self.checked_at, 3) if self.checked_at is not None else None,
+            "ageS": round(now - self.checked_at, 2) if self.checked_at is not None else None,
+            "lastOkAt": round(self.last_ok_at, 3) if self.last_ok_at is not None else None,
+            "intervalS": self.interval_s,
+            "durationMs": round(self.duration_ms, 2) if self.duration_ms is not None else None,
+            "failures": self.failures,
+            "error": self.error,
+            "detail": self.detail,
+        }
+
+
+class HealthMonitor:
+    def __init__(self, tick_s: float = 1.0, max_loop_lag_s: float = 2.0):
+        self.tick_s = tick_s
+        self.max_loop_lag_s = max_loop_lag_s
+        self.probes: Dict[str, Probe] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._heartbeat: Optional[float] = None
+        self.loop_lag_ms: Optional[float] = None
+        self.started_at: Optional[float] = None
+
+    def add(self, name: str, fn: ProbeFn, interval_s: float, **kwargs) -> Probe:
+        probe = self.probes[name] = Probe(name, fn, interval_s, **kwargs)
+        return probe
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self.started_at = time.time()
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        for probe in self.probes.values():
+            self._tasks.append(asyncio.create_task(self._probe_loop(probe)))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _probe_loop(self, probe: Probe) -> None:
+        while True:
+            await probe.run_once()
+            await asyncio.sleep(probe.interval_s)
+
+    async def _heartbeat_loop(self) -> None:
+        """Latido del event loop: el retraso de cada sleep mide cuánto estuvo trabado."""
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.tick_s)
+            now = time.monotonic()
+            self.loop_lag_ms = max(0.0, (now - t0 - self.tick_s) * 1000.0)
+            self._heartbeat = now
+
+    # ---- estado (solo lectura de memoria) ----
+    def live(self) -> Tuple[bool, Dict[str, Any]]:
+        now = time.monotonic()
+        age = now - self._heartbeat if self._heartbeat is not None else None
+        ok = (
+            bool(self._tasks)
+            and all(not t.done() for t in self._tasks)
+            and age is not None and age <= self.tick_s + self.max_loop_lag_s
+        )
+        return ok, {
+            "heartbeatAgeS": round(age, 3) if age is not None else None,
+            "loopLagMs": round(self.loop_lag_ms, 2) if self.loop_lag_ms is not None else None,
+        }
+
+    def ready(self) -> Tuple[bool, Dict[str, Any]]:
+        now = time.time()
+        failing = [p.name for p in self.probes.values() if p.critical and p.ok is not True]
+        stale = [p.name for p in self.probes.values() if p.stale(now)]
+        critical_stale = [n for n in stale if self.probes[n].critical]
+        return not failing and not critical_stale, {"failing": failing, "stale": stale}
+
+    def status(self) -> str:
+        live, _ = self.live()
+        ready, info = self.ready()
+        if not live or not ready:
+            return "unhealthy"
+        degraded = info["stale"] or any(p.ok is False for p in self.probes.values())
+        return "degraded" if degraded else "healthy"
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {name: p.as_dict(now) for name, p in self.probes.items()}
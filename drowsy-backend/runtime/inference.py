@@ -0,0 +1,132 @@
+# runtime/inference.py
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class StageBusy(RuntimeError):
+    """La cola de entrada de la etapa está llena (backpressure explícito)."""
+
+
+class StageDown(RuntimeError):
+    """El hilo de la etapa no está corriendo (no arrancó, falló su initializer o se detuvo)."""
+
+
+def _resolve(fut: asyncio.Future, result: Any, exc: Optional[BaseException]) -> None:
+    if fut.cancelled():
+        return
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(result)
+
+
+class InferenceWorker:
+    """
+    Etapa de inferencia en un hilo propio con cola de entrada acotada.
+    - initializer: se ejecuta dentro del hilo y crea el contexto que la etapa
+      posee en exclusiva (p.ej. los grafos de MediaPipe); cada job recibe ese
+      contexto como primer argumento.
+    - submit(): encola un job y devuelve un future awaitable desde el event loop;
+      si la cola está llena lanza StageBusy en vez de bloquear, y si el hilo no
+      está vivo lanza StageDown (nadie resolvería el future).
+    - start(): si el initializer falla, relanza su excepción en quien llama.
+    """
+
+    def __init__(self, name: str = "inference", max_pending: int = 2,
+                 initializer: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.max_pending = max(1, max_pending)
+        self.initializer = initializer
+        self.context: Any = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=self.max_pending)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._ready = threading.Event()
+        self.init_error: Optional[BaseException] = None
+        self.processed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.busy = False
+        self.last_ms: Optional[float] = None
+
+    def start(self) -> None:
+        if not self._thread.is_alive() and not self._ready.is_set():
+            self._thread.start()
+            self._ready.wait()
+        if self.init_error is not None:
+            raise StageDown(f"{self.name}: no se pudo inicializar: {self.init_error}") from self.init_error
+
+    def submit(self, fn: Callable[..., Any], *args) -> asyncio.Future:
+        if not self._thread.is_alive():
+            raise StageDown(f"{self.name}: la etapa no está corriendo")
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        try:
+            self._queue.put_nowait((loop, fut, fn, args))
+        except queue.Full:
+            self.rejected += 1
+            raise StageBusy(f"{self.name}: cola llena ({self.max_pending})")
+        return fut
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Atajo: submit() + await."""
+        return await self.submit(fn, *args)
+
+    def _run(self) -> None:
+        try:
+            if self.initializer is not None:
+                self.context = self.initializer()
+        except BaseException as e:
+            self.init_error = e
+            return
+        finally:
+            self._ready.set()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            loop, fut, fn, args = item
+            self.busy = True
+            t0 = time.perf_counter()
+            result = exc = None
+            try:
+                result = fn(self.context, *args)
+                self.processed += 1
+            except Exception as e:
+                exc = e
+                self.failed += 1
+            self.last_ms = (time.perf_counter() - t0) * 1000.0
+            self.busy = False
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, result, exc)
+            except RuntimeError:
+                # el loop ya se cerró
+                pass
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "alive": self.alive,
+            "init_error": str(self.init_error) if self.init_error is not None else None,
+            "pending": self._queue.qsize(),
+            "max_pending": self.max_pending,
+            "busy": self.busy,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "last_ms": round(self.last_ms, 2) if self.last_ms is not None else None,
+        }
@@ -0,0 +1,69 @@
+# runtime/ingest.py
+import asyncio
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class IngestSlot:
+    """
+    Buzón de frames de una conexión /ingest: un solo lugar, el frame más nuevo
+    reemplaza al que seguía pendiente. Con esto cada conexión tiene como máximo un
+    frame en análisis y uno esperando, y el atraso nunca crece aunque el cliente
+    envíe más rápido de lo que el servidor analiza.
+
+    Contadores (los recibe el cliente en cada respuesta para ajustar su tasa):
+    - received: frames recibidos
+    - replaced: pendientes pisados por uno más nuevo antes de analizarse
+    - stale: descartados por esperar más de max_age_s en el buzón
+    - shed: descartados porque la etapa de inferencia siguió saturada mientras el
+      frame estaba vigente
+    - processed: frames analizados
+    - invalid: mensajes mal formados o JPEG que no se pudo decodificar
+    """
+
+    def __init__(self, max_age_s: float = 0.5):
+        self.max_age_s = max_age_s
+        self._item: Optional[Tuple[Any, float]] = None
+        self._event = asyncio.Event()
+        self.received = 0
+        self.replaced = 0
+        self.stale = 0
+        self.shed = 0
+        self.processed = 0
+        self.invalid = 0
+        self.last_ms: Optional[float] = None
+
+    def put(self, item: Any) -> None:
+        self.received += 1
+        if self._item is not None:
+            self.replaced += 1
+        self._item = (item, time.monotonic())
+        self._event.set()
+
+    @property
+    def pending(self) -> bool:
+        return self._item is not None
+
+    async def take(self) -> Tuple[Any, float]:
+        """Siguiente frame aún vigente y su llegada (time.monotonic); espera si no hay."""
+        while True:
+            while self._item is None:
+                self._event.clear()
+                await self._event.wait()
+            item, arrived = self._item
+            self._item = None
+            if time.monotonic() - arrived <= self.max_age_s:
+                return item, arrived
+            self.stale += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "replaced": self.replaced,
+            "stale": self.stale,
+            "shed": self.shed,
+            "invalid": self.invalid,
+            "pending": self._item is not None,
+            "lastMs": round(self.last_ms, 2) if self.last_ms is not None else None,
+        }
@@ -0,0 +1,212 @@
+# runtime/messages.py
+"""
+Mensajes tipados que salen del backend (WebSocket y persistencia).
+
+Cada mensaje se construye con tipos nativos de Python ya calculados, así que no
+hace falta recorrer el payload convirtiendo numpy antes de json.dumps. El texto
+JSON se genera una sola vez por mensaje (encode() lo cachea) y se reutiliza para
+todos los clientes; las filas de persistencia salen de los mismos campos.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+
+def _json_default(obj):
+    """Solo se invoca para tipos no nativos (p.ej. escalares numpy que se colaron)."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "item"):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"{type(obj).__name__} no es serializable a JSON")
+
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+
+
+def dumps(obj: Any) -> str:
+    return _ENCODER.encode(obj)
+
+
+def _f(value, ndigits: Optional[int] = None) -> Optional[float]:
+    if value is None:
+        return None
+    value = float(value)
+    return round(value, ndigits) if ndigits is not None else value
+
+
+class Message:
+    """Base: to_dict() describe el mensaje en el wire; encode() lo serializa una vez."""
+    __slots__ = ("_text",)
+    message_type = ""
+
+    def __init__(self):
+        self._text: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def encode(self) -> str:
+        if self._text is None:
+            self._text = dumps(self.to_dict())
+        return self._text
+
+    def encode_with_b64(self, frames: Dict[str, Optional[str]]) -> str:
+        """
+        Texto del mensaje con claves base64 añadidas sin re-serializar el resto.
+        El alfabeto base64 no necesita escape JSON, así que los strings se insertan
+        tal cual sin volver a recorrer cientos de KB con el encoder.
+        """
+        base = self.encode()
+        parts = [base[:-1]]
+        sep = ", " if base != "{}" else ""
+        for key, value in frames.items():
+            parts.append(sep)
+            parts.append(dumps(key))
+            parts.append(": null" if value is None else ': "')
+            if value is not None:
+                parts.append(value)
+                parts.append('"')
+            sep = ", "
+        parts.append("}")
+        return "".join(parts)
+
+
+class MetricsMessage(Message):
+    """Métricas del tick (message_type='metrics'); de la config solo viaja la versión."""
+    __slots__ = (
+        "ear", "mar", "yaw", "pitch", "roll", "closed_frames", "threshold",
+        "consec_frames", "is_drowsy", "level", "stage_reasons", "fused_score",
+        "reason", "config_version", "extra",
+    )
+    message_type = "metrics"
+
+    def __init__(self, *, ear=None, mar=None, yaw=None, pitch=None, roll=None,
+                 closed_frames: int = 0, threshold=None, consec_frames=None,
+                 is_drowsy: bool = False, level: str = "normal",
+                 stage_reasons: Optional[List[str]] = None, fused_score=None,
+                 reason: Optional[List[str]] = None, config_version: Optional[int] = None,
+                 extra: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.ear = _f(ear)
+        self.mar = _f(mar)
+        self.yaw = _f(yaw)
+        self.pitch = _f(pitch)
+        self.roll = _f(roll)
+        self.closed_frames = int(closed_frames)
+        self.threshold = _f(threshold)
+        self.consec_frames = int(consec_frames) if consec_frames is not None else None
+        self.is_drowsy = bool(is_drowsy)
+        self.level = level
+        self.stage_reasons = list(dict.fromkeys(stage_reasons or []))
+        self.fused_score = _f(fused_score, 3)
+        self.reason = list(dict.fromkeys(reason or []))
+        self.config_version = config_version
+        self.extra = extra or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {
+            "message_type": self.message_type,
+            "ear": round(self.ear, 4) if self.ear is not None else None,
+            "mar": round(self.mar, 4) if self.mar is not None else None,
+            "yaw": round(self.yaw, 2) if self.yaw is not None else None,
+            "pitch": round(self.pitch, 2) if self.pitch is not None else None,
+            "roll": round(self.roll, 2) if self.roll is not None else None,
+            "closedFrames": self.closed_frames,
+            "threshold": self.threshold,
+            "consecFrames": self.consec_frames,
+            "isDrowsy": self.is_drowsy,
+            "drowsinessLevel": self.level,
+            "stageReasons": self.stage_reasons,
+            "fusedScore": self.fused_score,
+            "reason": self.reason,
+            "configVersion": self.config_version,
+        }
+        out.update(self.extra)
+        return out
+
+    def row(self, session_id: int) -> Dict[str, Any]:
+        """Fila para la tabla metrics."""
+        return {
+            "session_id": session_id,
+            "ear": self.ear,
+            "mar": self.mar,
+            "yaw": self.yaw,
+            "pitch": self.pitch,
+            "roll": self.roll,
+            "fused_score": self.fused_score,
+            "closed_frames": self.closed_frames,
+            "is_drowsy": self.is_drowsy,
+            "reason": self.reason,
+        }
+
+
+class EventMessage(Message):
+    """Evento del pipeline (message_type='event'); `event` es el dict del detector."""
+    __slots__ = ("event",)
+    message_type = "event"
+
+    def __init__(self, event: Dict[str, Any]):
+        super().__init__()
+        self.event = event
+
+    @property
+    def type(self) -> Optional[str]:
+        return self.event.get("type")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"message_type": self.message_type, **self.event}
+
+    def row(self, session_id: int, ts_ms) -> Dict[str, Any]:
+        """Fila para la tabla events."""
+        return {
+            "session_id": session_id,
+            "type": self.type,
+            "ts": ts_ms,
+            "duration_s": self.event.get("duration_s"),
+            "hand": self.event.get("hand"),
+            "payload": self.event,
+        }
+
+
+class WindowReportMessage(EventMessage):
+    """Reporte agregado por ventana (type='report_window')."""
+    __slots__ = ()
+
+    def row(self, session_id: int, ts_ms=None) -> Dict[str, Any]:
+        """Fila para la tabla window_reports (ts = default NOW() en DB)."""
+        return {
+            "session_id": session_id,
+            "window_s": self.event.get("window_s"),
+            "counts": self.event.get("counts"),
+            "durations": self.event.get("durations"),
+            "ts": None,
+        }
+
+
+def event_message(event: Dict[str, Any]) -> EventMessage:
+    if event.get("type") == "report_window":
+        return WindowReportMessage(event)
+    return EventMessage(event)
+
+
+class ConfigMessage(Message):
+    """
+    Configuración completa (message_type='config'), una vez por versión. `fields`
+    (bajo "metrics") son las claves de config que el cliente combina con cada
+    mensaje de métricas de esa versión (configVersion).
+    """
+    __slots__ = ("config", "version", "fields")
+    message_type = "config"
+
+    def __init__(self, config: Dict[str, Any], version: Optional[int] = None,
+                 fields: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.config = config
+        self.version = version
+        self.fields = fields or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"message_type": self.message_type, "version": self.version,
+                "config": self.config, "metrics": self.fields}
@@ -0,0 +1,204 @@
+# runtime/metric_buckets.py
+"""
+Reducción de métricas en el dispositivo antes de subirlas.
+
+- MetricBucketer agrega cada frame analizado en ventanas fijas (bucket_s): por
+  señal [min, max, media, último] (columna stats, compacta para que el nombre
+  de cada valor no pese más que el valor), segundos en cada nivel de
+  somnolencia y una máscara de bits con las razones vistas en la ventana. Es la única serie que se
+  sube de forma continua (tabla metric_buckets, DDL en sql/metric_buckets.sql).
+- FullRateWindow retiene las filas de metrics de los últimos pre_s segundos y
+  solo las deja pasar alrededor de un evento de seguridad (antes y post_s
+  después), para poder reconstruir el episodio a resolución completa.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+SIGNALS = ("ear", "mar", "yaw", "pitch", "roll", "fused_score")
+
+# Códigos estables de razón (no cambiar los bits ya asignados: quedan en la DB)
+REASON_BITS = {
+    "EAR<thr": 1 << 0,
+    "MAR>thr": 1 << 1,
+    "Pitch>thr": 1 << 2,
+    "Sin rostro detectado": 1 << 3,
+}
+# Razones por nivel ("<Nivel>: <criterio> ..."): un bit por criterio
+STAGE_CRITERIA_BITS = (
+    ("EAR", 1 << 4),
+    ("MAR", 1 << 5),
+    ("|Pitch|", 1 << 6),
+    ("Fusión", 1 << 7),
+    ("Cerrados", 1 << 8),
+)
+REASON_OTHER = 1 << 15
+
+
+def reason_mask(reasons: Iterable[str]) -> int:
+    mask = 0
+    for r in reasons:
+        bit = REASON_BITS.get(r)
+        if bit is None:
+            criterion = r.partition(": ")[2]
+            bit = next((b for name, b in STAGE_CRITERIA_BITS if criterion.startswith(name)), REASON_OTHER)
+        mask |= bit
+    return mask
+
+
+class _Agg:
+    __slots__ = ("min", "max", "sum", "n", "last")
+
+    def __init__(self):
+        self.min = self.max = self.last = None
+        self.sum = 0.0
+        self.n = 0
+
+    def add(self, v: Optional[float]) -> None:
+        if v is None:
+            return
+        v = float(v)
+        if self.n == 0:
+            self.min = self.max = v
+        else:
+            self.min = v if v < self.min else self.min
+            self.max = v if v > self.max else self.max
+        self.sum += v
+        self.n += 1
+        self.last = v
+
+    def values(self, ndigits: int) -> Optional[List[float]]:
+        """[min, max, media, último]; None si la señal no tuvo valores en la ventana."""
+        if not self.n:
+            return None
+        return [round(self.min, ndigits), round(self.max, ndigits),
+                round(self.sum / self.n, ndigits), round(self.last, ndigits)]
+
+
+_DIGITS = {"ear": 4, "mar": 4, "yaw": 2, "pitch": 2, "roll": 2, "fused_score": 3}
+
+
+class MetricBucketer:
+    """
+    Agregador en streaming por ventanas alineadas a bucket_s (según el ts de
+    captura). add() retorna la fila de la ventana anterior cuando el frame cae
+    en una nueva; flush() cierra la ventana en curso.
+    El tiempo en cada nivel se atribuye al nivel del frame anterior; huecos de
+    más de max_gap_s (stream pausado) no se cuentan.
+    """
+
+    def __init__(self, bucket_s: float = 1.0, max_gap_s: float = 1.0):
+        self.bucket_s = max(0.1, float(bucket_s))
+        self.max_gap_s = max_gap_s
+        self._start: Optional[float] = None
+        self._prev: Optional[Tuple[float, str, bool]] = None
+        self.buckets = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._aggs = {s: _Agg() for s in SIGNALS}
+        self._frames = 0
+        self._stage_s: Dict[str, float] = {}
+        self._drowsy_s = 0.0
+        self._mask = 0
+        self._closed_max = 0
+        self._drowsy_any = False
+
+    def add(self, ts: float, values: Dict[str, Optional[float]], stage: str,
+            is_drowsy: bool, reasons: Iterable[str], closed_frames: int = 0) -> Optional[Dict[str, Any]]:
+        start = (ts // self.bucket_s) * self.bucket_s
+        done = None
+        if self._start is not None and start != self._start:
+            done = self._row()
+        if self._start is None or start != self._start:
+            self._start = start
+            self._reset()
+
+        if self._prev is not None:
+            prev_ts, prev_stage, prev_drowsy = self._prev
+            dt = ts - prev_ts
+            if 0 < dt <= self.max_gap_s:
+                self._stage_s[prev_stage] = self._stage_s.get(prev_stage, 0.0) + dt
+                if prev_drowsy:
+                    self._drowsy_s += dt
+        self._prev = (ts, stage, is_drowsy)
+
+        for s in SIGNALS:
+            self._aggs[s].add(values.get(s))
+        self._frames += 1
+        self._mask |= reason_mask(reasons)
+        self._closed_max = max(self._closed_max, int(closed_frames))
+        self._drowsy_any = self._drowsy_any or bool(is_drowsy)
+        return done
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        if self._start is None or self._frames == 0:
+            return None
+        row = self._row()
+        self._start = None
+        self._prev = None
+        self._reset()
+        return row
+
+    def _row(self) -> Dict[str, Any]:
+        self.buckets += 1
+        return {
+            "bucket_ts": round(self._start, 3),
+            "bucket_s": self.bucket_s,
+            "frames": self._frames,
+            "stats": {s: self._aggs[s].values(_DIGITS[s]) for s in SIGNALS if self._aggs[s].n},
+            "stage_s": {k: round(v, 2) for k, v in self._stage_s.items()},
+            "drowsy_s": round(self._drowsy_s, 2),
+            "is_drowsy": self._drowsy_any,
+            "closed_frames_max": self._closed_max,
+            "reason_mask": self._mask,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"bucketS": self.bucket_s, "buckets": self.buckets, "frames": self._frames}
+
+
+class FullRateWindow:
+    """
+    Filas a resolución completa solo alrededor de eventos de seguridad:
+    add() retiene la fila (o la deja pasar si hay una ventana abierta);
+    trigger() abre la ventana hasta post_s después del evento y devuelve lo
+    retenido desde pre_s antes de que el evento empezara.
+    """
+
+    def __init__(self, pre_s: float = 10.0, post_s: float = 10.0, max_event_s: float = 10.0):
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.max_event_s = max_event_s
+        self._ring: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._until: Optional[float] = None
+        self.kept = 0
+        self.skipped = 0
+        self.triggers = 0
+
+    def add(self, ts: float, row: Dict[str, Any]) -> bool:
+        """True si la fila debe guardarse ya."""
+        if self._until is not None and ts <= self._until:
+            self.kept += 1
+            return True
+        self._ring.append((ts, row))
+        # El ring cubre pre_s más lo que dura un episodio largo (el evento se emite al terminar)
+        horizon = ts - self.pre_s - self.max_event_s
+        while self._ring and self._ring[0][0] < horizon:
+            self._ring.popleft()
+            self.skipped += 1
+        return False
+
+    def trigger(self, ts: float, duration_s: float = 0.0) -> List[Dict[str, Any]]:
+        self.triggers += 1
+        until = ts + self.post_s
+        self._until = until if self._until is None else max(self._until, until)
+        since = ts - float(duration_s or 0.0) - self.pre_s
+        rows = [row for t, row in self._ring if t >= since]
+        self.skipped += len(self._ring) - len(rows)
+        self.kept += len(rows)
+        self._ring.clear()
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {"kept": self.kept, "skipped": self.skipped, "triggers": self.triggers,
+                "openUntil": round(self._until, 3) if self._until is not None else None}
@@ -0,0 +1,75 @@
+# runtime/preview.py
+import asyncio
+import base64
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Resolución/calidad por defecto de las vistas previa (las de frame_to_base64 histórico)
+DEFAULT_MAX_WIDTH = 1280
+DEFAULT_QUALITY = 90
+
+
+class PreviewFrame:
+    """
+    Vistas previas de un frame producidas bajo demanda.
+    Nada se renderiza ni se codifica hasta que un consumidor pide un stream; cada
+    (stream, ancho) se renderiza y cada (stream, ancho, calidad) se codifica una
+    sola vez por frame: los consumidores siguientes esperan el mismo resultado.
+    - render(stream, max_width): devuelve (awaitable) la imagen BGR del stream, ya
+      dibujada al ancho pedido (o más grande si el stream no escala, p.ej. 'raw'), o None
+    - encode(image, max_width, quality): devuelve (awaitable) los bytes JPEG o None
+    """
+
+    def __init__(
+        self,
+        frame_id: int,
+        render: Callable[[str, int], Awaitable[Optional[Any]]],
+        encode: Callable[[Any, int, int], Awaitable[Optional[bytes]]],
+    ):
+        self.frame_id = frame_id
+        self._render = render
+        self._encode = encode
+        self._images: Dict[Hashable, asyncio.Future] = {}
+        self._jpegs: Dict[Hashable, asyncio.Future] = {}
+        self._b64: Dict[Hashable, asyncio.Future] = {}
+        self.renders = 0
+        self.encodes = 0
+
+    @staticmethod
+    def _memo(cache: Dict[Hashable, asyncio.Future], key: Hashable,
+              factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        fut = cache.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(factory())
+            cache[key] = fut
+        return fut
+
+    async def _produce_image(self, stream: str, max_width: int):
+        self.renders += 1
+        return await self._render(stream, max_width)
+
+    async def _produce_jpeg(self, stream: str, max_width: int, quality: int):
+        image = await self.image(stream, max_width)
+        if image is None:
+            return None
+        self.encodes += 1
+        return await self._encode(image, max_width, quality)
+
+    async def image(self, stream: str, max_width: int = DEFAULT_MAX_WIDTH):
+        key = (stream, max_width)
+        return await self._memo(self._images, key, lambda: self._produce_image(stream, max_width))
+
+    async def jpeg(self, stream: str, max_width: int = DEFAULT_MAX_WIDTH,
+                   quality: int = DEFAULT_QUALITY) -> Optional[bytes]:
+        key = (stream, max_width, quality)
+        return await self._memo(self._jpegs, key,
+                                lambda: self._produce_jpeg(stream, max_width, quality))
+
+    async def base64(self, stream: str, max_width: int = DEFAULT_MAX_WIDTH,
+                     quality: int = DEFAULT_QUALITY) -> Optional[str]:
+        key = (stream, max_width, quality)
+        return await self._memo(self._b64, key,
+                                lambda: self._produce_b64(stream, max_width, quality))
+
+    async def _produce_b64(self, stream: str, max_width: int, quality: int):
+        data = await self.jpeg(stream, max_width, quality)
+        return base64.b64encode(data).decode("utf-8") if data else None
@@ -0,0 +1,136 @@
+# runtime/render.py
+"""
+Render de las vistas previa 'processed' (overlays + HUD) y 'landmarks' (nube).
+
+Todo se dibuja directamente a la resolución que pidió el suscriptor, no a la de
+captura, y sin bucles Python por punto:
+- los puntos salen del arreglo (N, 3) de landmarks (ver face_features) y se
+  estampan con una escritura vectorizada en el arreglo de píxeles, usando una
+  tabla de desplazamientos del disco precalculada por radio;
+- el fondo de la nube se genera una vez por tamaño y luego solo se copia;
+- las tablas de índices del overlay se construyen una vez al importar.
+"""
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from detection.data_processing.face_features import (
+    LEFT_EYE_IDX, RIGHT_EYE_IDX,
+    MOUTH_L_CORNER, MOUTH_R_CORNER, MOUTH_TOP_IN, MOUTH_BOT_IN,
+    MOUTH_TOP_OUT1, MOUTH_BOT_OUT1, MOUTH_TOP_OUT2, MOUTH_BOT_OUT2,
+)
+
+CLOUD_BACKGROUND = (16, 24, 40)
+CLOUD_COLOR = (210, 255, 255)
+OVERLAY_COLOR = (0, 255, 0)
+
+# Ojos + boca: los puntos que dibuja el overlay de 'processed'
+OVERLAY_IDX = np.array(
+    LEFT_EYE_IDX + RIGHT_EYE_IDX + [
+        MOUTH_L_CORNER, MOUTH_R_CORNER, MOUTH_TOP_IN, MOUTH_BOT_IN,
+        MOUTH_TOP_OUT1, MOUTH_BOT_OUT1, MOUTH_TOP_OUT2, MOUTH_BOT_OUT2,
+    ],
+    dtype=np.intp,
+)
+
+
+def preview_size(width: int, height: int, max_width: int) -> Tuple[int, int]:
+    """Tamaño de salida para un ancho máximo (misma regla que frame_to_jpeg)."""
+    if width <= max_width:
+        return width, height
+    scale = max_width / width
+    return int(width * scale), int(height * scale)
+
+
+@lru_cache(maxsize=8)
+def _disk_offsets(radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Desplazamientos (dy, dx) de un disco relleno de `radius` px."""
+    r = max(0, int(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    mask = dx * dx + dy * dy <= r * r + r   # aproxima el disco de cv2.circle
+    return dy[mask].astype(np.intp), dx[mask].astype(np.intp)
+
+
+@lru_cache(maxsize=8)
+def _background(width: int, height: int, color: Tuple[int, int, int]) -> np.ndarray:
+    canvas = np.empty((height, width, 3), dtype=np.uint8)
+    canvas[:] = color
+    canvas.flags.writeable = False
+    return canvas
+
+
+def point_radius(width: int, base: int = 2, ref_width: int = 1280) -> int:
+    """Radio de punto escalado al ancho de salida (2 px a 1280, mínimo 1)."""
+    return max(1, int(round(base * width / ref_width)))
+
+
+def stamp_points(image: np.ndarray, xy: np.ndarray, color, radius: int) -> np.ndarray:
+    """
+    Dibuja discos rellenos en `image` (in place) en las posiciones xy (M, 2) en px
+    con una sola escritura indexada; los píxeles fuera de la imagen se descartan.
+    """
+    if xy is None or len(xy) == 0:
+        return image
+    h, w = image.shape[:2]
+    dy, dx = _disk_offsets(radius)
+    cx = xy[:, 0].astype(np.intp)
+    cy = xy[:, 1].astype(np.intp)
+    # descartar centros fuera de cuadro (como el `if 0 <= x < w` histórico)
+    inside = (cx >= 0) & (cx < w) & (cy >= 0) & (cy < h)
+    cx, cy = cx[inside], cy[inside]
+    xs = (cx[:, None] + dx[None, :]).ravel()
+    ys = (cy[:, None] + dy[None, :]).ravel()
+    keep = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+    image[ys[keep], xs[keep]] = color
+    return image
+
+
+def _scaled(points: np.ndarray, width: int, height: int) -> np.ndarray:
+    return points[:, :2] * np.array([width, height], dtype=np.float32)
+
+
+def render_landmark_cloud(points: Optional[np.ndarray], width: int, height: int) -> np.ndarray:
+    """Nube de todos los landmarks sobre el fondo cacheado, a (width, height)."""
+    canvas = _background(width, height, CLOUD_BACKGROUND).copy()
+    if points is not None:
+        stamp_points(canvas, _scaled(points, width, height), CLOUD_COLOR, point_radius(width))
+    return canvas
+
+
+def resize_for_preview(frame: np.ndarray, max_width: int) -> np.ndarray:
+    """Frame reducido al ancho pedido; siempre una copia propia (se dibuja encima)."""
+    h, w = frame.shape[:2]
+    out_w, out_h = preview_size(w, h, max_width)
+    if (out_w, out_h) == (w, h):
+        return frame.copy()
+    return cv2.resize(frame, (out_w, out_h), interpolation=cv2.INTER_AREA)
+
+
+def draw_overlay(image: np.ndarray, points: Optional[np.ndarray]) -> np.ndarray:
+    """Puntos de ojos y boca sobre `image` (in place), a la resolución de `image`."""
+    if points is None or len(points) <= int(OVERLAY_IDX.max()):
+        return image
+    h, w = image.shape[:2]
+    stamp_points(image, _scaled(points[OVERLAY_IDX], w, h), OVERLAY_COLOR, point_radius(w))
+    return image
+
+
+def draw_hud(image: np.ndarray, hud: Sequence, scale: float = 1.0) -> np.ndarray:
+    """
+    Líneas de texto acumuladas por camera_loop: (texto, pos, escala, color, grosor),
+    con posiciones en px de captura; `scale` las lleva a la resolución de `image`.
+    """
+    for text, (x, y), font_scale, color, thickness in hud:
+        cv2.putText(image, text, (int(x * scale), int(y * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale * scale, color, max(1, int(round(thickness * scale))))
+    return image
+
+
+def render_processed(frame: np.ndarray, points: Optional[np.ndarray], hud: Sequence,
+                     max_width: int) -> np.ndarray:
+    """Frame reducido + overlay + HUD, todo dibujado a la resolución de salida."""
+    image = resize_for_preview(frame, max_width)
+    draw_overlay(image, points)
+    return draw_hud(image, hud, image.shape[1] / frame.shape[1])
@@ -0,0 +1,192 @@
+# runtime/rest_writer.py
+"""
+Escritura asíncrona contra PostgREST (la API REST de Supabase) sin hilos:
+
+- un httpx.AsyncClient con pool de conexiones keep-alive, reutilizado por todas
+  las escrituras (nada de handshake TLS por lote);
+- cuerpos JSON comprimidos con gzip a partir de gzip_min_bytes (si el servidor
+  responde 415 a un cuerpo comprimido, se desactiva y se reenvía sin comprimir);
+- a lo sumo max_concurrency requests en vuelo;
+- reintentos con backoff exponencial y jitter completo ante errores de red,
+  timeouts, 408/429/5xx (respeta Retry-After); un 4xx definitivo no se reintenta.
+
+Cada escritura se espera y, si no se pudo, lanza WriteError: quien llama decide
+(el flusher deja el lote en el spool). RowWriter es la interfaz que usa app.py;
+PostgrestWriter la implementa contra cualquier URL base, así que puede
+apuntarse a un PostgREST local o a un servidor HTTP de prueba, y
+supabase_writer() solo agrega lo propio de Supabase (/rest/v1 y la API key).
+"""
+import asyncio
+import gzip
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .messages import dumps
+
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class WriteError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class RowWriter:
+    """Interfaz de escritura de filas (la usa app.py; las pruebas pueden sustituirla)."""
+
+    async def insert(self, table: str, rows: List[Dict[str, Any]], *, returning: bool = False,
+                     on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Inserta (o hace upsert por `on_conflict`); con returning retorna las filas creadas."""
+        raise NotImplementedError
+
+    async def select(self, table: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class PostgrestWriter(RowWriter):
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None, *,
+                 max_concurrency: int = 4, max_retries: int = 3, backoff_s: float = 0.5,
+                 backoff_max_s: float = 8.0, timeout_s: float = 15.0, gzip_min_bytes: int = 1024,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.gzip_min_bytes = gzip_min_bytes
+        self.gzip = gzip_min_bytes >= 0
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Content-Type": "application/json", **(headers or {})},
+            timeout=timeout_s,
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency,
+                                keepalive_expiry=60.0),
+            transport=transport,
+        )
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self.inflight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+        self.last_ms: Optional[float] = None
+        self.avg_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    # ---- API ----
+    async def insert(self, table: str, rows: List[Dict[str, Any]], *, returning: bool = False,
+                     on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        prefer = ["return=representation" if returning else "return=minimal"]
+        params = {}
+        if on_conflict:
+            prefer.append("resolution=merge-duplicates")
+            params["on_conflict"] = on_conflict
+        resp = await self._request("POST", f"/{table}", params=params,
+                                   body=dumps(rows).encode("utf-8"),
+                                   headers={"Prefer": ",".join(prefer)})
+        return resp.json() if returning and resp.content else []
+
+    async def select(self, table: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        resp = await self._request("GET", f"/{table}", params=params)
+        return resp.json() if resp.content else []
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    # ---- transporte ----
+    async def _request(self, method: str, path: str, *, params=None, body: Optional[bytes] = None,
+                       headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        attempt = 0
+        while True:
+            send_headers = dict(headers or {})
+            payload = body
+            compressed = False
+            if body is not None and self.gzip and len(body) >= self.gzip_min_bytes:
+                payload = gzip.compress(body, compresslevel=5)
+                send_headers["Content-Encoding"] = "gzip"
+                compressed = True
+            try:
+                resp = await self._send(method, path, params, payload, send_headers, len(body or b""))
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                error = WriteError(f"{method} {path}: {type(e).__name__}: {e}")
+                retry_after = None
+            else:
+                if resp.status_code < 300:
+                    return resp
+                if resp.status_code == 415 and compressed:
+                    # El servidor no acepta cuerpos comprimidos: se sigue sin gzip
+                    print("[rest] el servidor rechazó gzip; se envía sin comprimir")
+                    self.gzip = False
+                    continue
+                error = WriteError(f"{method} {path}: HTTP {resp.status_code} {resp.text[:200]}",
+                                   status=resp.status_code,
+                                   retryable=resp.status_code in RETRY_STATUS)
+                retry_after = _retry_after(resp)
+            if not error.retryable or attempt >= self.max_retries:
+                self.failures += 1
+                self.last_error = str(error)
+                raise error
+            attempt += 1
+            self.retries += 1
+            delay = random.uniform(0, min(self.backoff_max_s, self.backoff_s * 2 ** attempt))
+            await asyncio.sleep(max(delay, retry_after or 0.0))
+
+    async def _send(self, method, path, params, payload, headers, raw_len) -> httpx.Response:
+        async with self._sem:
+            self.inflight += 1
+            t0 = time.perf_counter()
+            try:
+                return await self._client.request(method, path, params=params, content=payload, headers=headers)
+            finally:
+                self.inflight -= 1
+                ms = (time.perf_counter() - t0) * 1000.0
+                self.requests += 1
+                self.bytes_raw += raw_len
+                self.bytes_sent += len(payload or b"")
+                self.last_ms = ms
+                self.avg_ms = ms if self.avg_ms is None else 0.9 * self.avg_ms + 0.1 * ms
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "baseUrl": self.base_url,
+            "maxConcurrency": self.max_concurrency,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "gzip": self.gzip,
+            "bytesRaw": self.bytes_raw,
+            "bytesSent": self.bytes_sent,
+            "lastMs": round(self.last_ms, 2) if self.last_ms is not None else None,
+            "avgMs": round(self.avg_ms, 2) if self.avg_ms is not None else None,
+            "lastError": self.last_error,
+        }
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    try:
+        return min(60.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def supabase_writer(url: str, key: str, **kwargs) -> PostgrestWriter:
+    """PostgREST de un proyecto Supabase: /rest/v1 con la API key como apikey y Bearer."""
+    return PostgrestWriter(f"{url.rstrip('/')}/rest/v1",
+                           {"apikey": key, "Authorization": f"Bearer {key}"}, **kwargs)
@@ -0,0 +1,126 @@
+# runtime/scheduler.py
+import math
+import time
+from typing import Any, Dict, Optional
+
+
+class _StageTimer:
+    __slots__ = ("_scheduler", "_name", "_t0")
+
+    def __init__(self, scheduler: "FrameScheduler", name: str):
+        self._scheduler = scheduler
+        self._name = name
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._scheduler.record(self._name, (time.perf_counter() - self._t0) * 1000.0)
+        return False
+
+
+class FrameScheduler:
+    """
+    Cadencia del loop de análisis por deadline en lugar de un sleep fijo al final.
+    - Cada frame tiene un presupuesto de 1/target_fps; end_frame() devuelve solo lo
+      que queda de él (0 si se pasó).
+    - Si un frame se pasa de su deadline (overrun), se salta la inferencia de los
+      siguientes frames (hasta max_skip) en proporción al atraso y el deadline se
+      rebasa a "ahora": el loop no intenta recuperar el tiempo perdido en ráfaga.
+      Un frame saltado no consume periodo: el loop toma el siguiente de inmediato.
+    - stage(nombre) mide cuánto toma cada etapa (último valor y media móvil).
+    """
+
+    def __init__(self, target_fps: float = 30.0, max_skip: int = 3, clock=time.monotonic):
+        self.period = 1.0 / max(0.1, float(target_fps))
+        self.max_skip = max(0, int(max_skip))
+        self._clock = clock
+        self._deadline: Optional[float] = None
+        self._frame_t0: Optional[float] = None
+        self._last_analyzed: Optional[float] = None
+        self._skip_left = 0
+        self.frames = 0
+        self.analyzed = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.avg_interval: Optional[float] = None
+        self.stage_ms: Dict[str, float] = {}
+        self.stage_avg_ms: Dict[str, float] = {}
+
+    @property
+    def target_fps(self) -> float:
+        return 1.0 / self.period
+
+    @property
+    def fps(self) -> Optional[float]:
+        """Frames analizados por segundo (media móvil del intervalo entre análisis)."""
+        if not self.avg_interval:
+            return None
+        return 1.0 / self.avg_interval
+
+    def reset(self) -> None:
+        """Tras reabrir la cámara: sin deadline previo ni saltos pendientes."""
+        self._deadline = None
+        self._last_analyzed = None
+        self._skip_left = 0
+
+    def begin_frame(self) -> bool:
+        """
+        Inicia un frame. Retorna False si toca saltarse la inferencia de este frame
+        para recuperar un overrun anterior; en ese caso no hay que llamar a
+        end_frame() ni dormir, sino pasar directo al siguiente frame.
+        """
+        now = self._clock()
+        self.frames += 1
+        if self._skip_left > 0:
+            self._skip_left -= 1
+            self.skipped += 1
+            # El presupuesto arranca con el próximo frame analizado
+            self._deadline = None
+            return False
+        self._frame_t0 = now
+        if self._deadline is None:
+            self._deadline = now
+        self._deadline += self.period
+        self.analyzed += 1
+        if self._last_analyzed is not None:
+            dt = now - self._last_analyzed
+            self.avg_interval = dt if self.avg_interval is None else 0.9 * self.avg_interval + 0.1 * dt
+        self._last_analyzed = now
+        return True
+
+    def end_frame(self) -> float:
+        """Cierra el frame; retorna cuántos segundos dormir hasta el próximo deadline."""
+        now = self._clock()
+        if self._deadline is None:
+            return 0.0
+        if self._frame_t0 is not None:
+            self.record("frame", (now - self._frame_t0) * 1000.0)
+        remaining = self._deadline - now
+        if remaining >= 0:
+            return remaining
+        self.overruns += 1
+        self._skip_left = min(self.max_skip, math.ceil(-remaining / self.period))
+        self._deadline = now
+        return 0.0
+
+    def stage(self, name: str) -> _StageTimer:
+        return _StageTimer(self, name)
+
+    def record(self, name: str, ms: float) -> None:
+        self.stage_ms[name] = ms
+        prev = self.stage_avg_ms.get(name)
+        self.stage_avg_ms[name] = ms if prev is None else 0.9 * prev + 0.1 * ms
+
+    def stats(self) -> Dict[str, Any]:
+        fps = self.fps
+        return {
+            "targetFps": round(self.target_fps, 2),
+            "fps": round(fps, 2) if fps is not None else None,
+            "frames": self.frames,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "stageMs": {k: round(v, 2) for k, v in self.stage_avg_ms.items()},
+        }
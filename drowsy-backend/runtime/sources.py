@@ -0,0 +1,231 @@
+# runtime/sources.py
+"""
+Fuentes de captura con la misma interfaz mínima que cv2.VideoCapture
+(read() -> (ok, frame), release(), isOpened()) más un dict `info` con el formato
+de CURRENT_VIDEO_INFO. CaptureThread y el benchmark las consumen igual.
+
+- CameraSource: cámara física (la abre app._open_camera_device)
+- VideoFileSource: clip grabado (mp4/avi/...)
+- ImageDirSource: directorio de imágenes, en orden alfabético
+- SyntheticSource: frames generados, sin dependencias externas
+
+Spec de texto (env CAPTURE_SOURCE, --source del benchmark):
+    "camera" | "video:<ruta>" | "images:<dir>" | "synthetic[:WxH]"
+"""
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource:
+    """Base: subclases implementan _read(). `realtime` pacea las lecturas a `fps`."""
+
+    kind = "source"
+
+    def __init__(self, fps: float = 30.0, realtime: bool = False, loop: bool = False):
+        self.fps = float(fps) if fps else 30.0
+        self.realtime = realtime
+        self.loop = loop
+        self.frames_read = 0
+        self._next_ts: Optional[float] = None
+        self.info: Dict[str, Any] = {"index": None, "codec": None, "width": None,
+                                     "height": None, "fps": self.fps, "source": self.kind}
+
+    def isOpened(self) -> bool:
+        return True
+
+    def _read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        raise NotImplementedError
+
+    def _rewind(self) -> bool:
+        return False
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.realtime:
+            self._pace()
+        ok, frame = self._read()
+        if not ok and self.loop and self._rewind():
+            ok, frame = self._read()
+        if ok:
+            self.frames_read += 1
+        return ok, frame
+
+    def _pace(self) -> None:
+        now = time.monotonic()
+        if self._next_ts is None or now - self._next_ts > 1.0:
+            self._next_ts = now
+        delay = self._next_ts - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_ts += 1.0 / self.fps
+
+    def frame_ts(self) -> float:
+        """Tiempo de medio (s) del último frame leído; por defecto índice / fps."""
+        return max(0, self.frames_read - 1) / self.fps
+
+    def _set_size(self, frame: Optional[np.ndarray]) -> None:
+        if frame is not None and self.info["width"] is None:
+            h, w = frame.shape[:2]
+            self.info.update({"width": w, "height": h})
+
+    def release(self) -> None:
+        pass
+
+
+class CameraSource(FrameSource):
+    """cv2.VideoCapture ya configurado; la cámara pacea sola."""
+
+    kind = "camera"
+
+    def __init__(self, cap, info: Optional[Dict[str, Any]] = None):
+        super().__init__(fps=(info or {}).get("fps") or 30.0)
+        self.cap = cap
+        self.info.update(info or {})
+        self.info["source"] = self.kind
+
+    def isOpened(self) -> bool:
+        return bool(self.cap is not None and self.cap.isOpened())
+
+    def _read(self):
+        return self.cap.read()
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    kind = "video"
+
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        super().__init__(fps=fps or 30.0, realtime=realtime, loop=loop)
+        self.info.update({"codec": "file", "path": path})
+        if self.cap.isOpened():
+            w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if w and h:
+                self.info.update({"width": w, "height": h})
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def _read(self):
+        ok, frame = self.cap.read()
+        self._set_size(frame)
+        return ok and frame is not None, frame
+
+    def _rewind(self) -> bool:
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def frame_ts(self) -> float:
+        # posición del frame en el archivo; si el contenedor no la da, índice / fps
+        msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        return msec / 1000.0 if msec and msec > 0 else super().frame_ts()
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    kind = "images"
+
+    def __init__(self, path: str, fps: float = 30.0, realtime: bool = False, loop: bool = False):
+        super().__init__(fps=fps, realtime=realtime, loop=loop)
+        self.path = path
+        self.files = sorted(
+            os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTS)
+        ) if os.path.isdir(path) else []
+        self._pos = 0
+        self.info.update({"codec": "images", "path": path})
+
+    def isOpened(self) -> bool:
+        return bool(self.files)
+
+    def _read(self):
+        while self._pos < len(self.files):
+            frame = cv2.imread(self.files[self._pos])
+            self._pos += 1
+            if frame is not None:
+                self._set_size(frame)
+                return True, frame
+        return False, None
+
+    def _rewind(self) -> bool:
+        self._pos = 0
+        return bool(self.files)
+
+
+class SyntheticSource(FrameSource):
+    """
+    Escena sintética determinista: fondo con degradado, un "rostro" elíptico que se
+    desplaza y un bloque que entra y sale del cuadro. Sirve para medir el camino
+    completo en una máquina sin cámara (FaceMesh normalmente no detecta rostro en
+    ella; para cifras con rostro, usar un clip grabado).
+    """
+
+    kind = "synthetic"
+
+    def __init__(self, width: int = 1280, height: int = 720, fps: float = 30.0,
+                 frames: Optional[int] = None, realtime: bool = False, seed: int = 0):
+        super().__init__(fps=fps, realtime=realtime)
+        self.width, self.height = width, height
+        self.frames = frames
+        self._i = 0
+        rng = np.random.default_rng(seed)
+        grad = np.linspace(40, 160, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+        self._background = np.clip(grad + noise, 0, 255).astype(np.uint8).repeat(3, axis=2)
+        self.info.update({"codec": "synthetic", "width": width, "height": height})
+
+    def _read(self):
+        if self.frames is not None and self._i >= self.frames:
+            return False, None
+        t = self._i / self.fps
+        self._i += 1
+        frame = self._background.copy()
+        cx = int(self.width * (0.5 + 0.05 * np.sin(t)))
+        cy = int(self.height * 0.45)
+        axes = (int(self.width * 0.09), int(self.height * 0.22))
+        cv2.ellipse(frame, (cx, cy), axes, 0, 0, 360, (150, 170, 200), -1)
+        bx = int((t * 200) % (self.width + 200)) - 200
+        cv2.rectangle(frame, (bx, int(self.height * 0.7)), (bx + 160, self.height), (60, 90, 120), -1)
+        return True, frame
+
+
+def parse_size(text: str, default: Tuple[int, int] = (1280, 720)) -> Tuple[int, int]:
+    try:
+        w, h = text.lower().split("x")
+        return int(w), int(h)
+    except (AttributeError, ValueError):
+        return default
+
+
+def open_source(spec: str, realtime: bool = False, loop: bool = False,
+                fps: float = 30.0, frames: Optional[int] = None) -> Optional[FrameSource]:
+    """
+    Abre una fuente no-cámara a partir de su spec; None si no se puede abrir.
+    ("camera" lo resuelve app.py, que conoce índices/codecs/resoluciones.)
+    """
+    kind, _, arg = (spec or "").partition(":")
+    kind = kind.strip().lower()
+    if kind == "video":
+        src = VideoFileSource(arg, realtime=realtime, loop=loop)
+    elif kind == "images":
+        src = ImageDirSource(arg, fps=fps, realtime=realtime, loop=loop)
+    elif kind == "synthetic":
+        w, h = parse_size(arg)
+        src = SyntheticSource(w, h, fps=fps, frames=frames, realtime=realtime)
+    else:
+        return None
+    if not src.isOpened():
+        src.release()
+        return None
+    return src
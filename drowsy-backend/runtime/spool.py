@@ -0,0 +1,215 @@
+# runtime/spool.py
+"""
+Spool local de persistencia: las filas de metrics/metric_buckets/events/window_reports se
+escriben primero en un SQLite en modo WAL y de ahí se suben a Supabase en lotes.
+
+- append() solo agrega a una lista en memoria (rápido, desde el event loop);
+  sync() la escribe en disco en una sola transacción: un fsync por lote, no por fila.
+- La subida lee en orden desde el cursor de cada tabla y ack() lo avanza y borra
+  lo ya subido en la misma transacción, así que un corte de luz a mitad de camino
+  repite a lo sumo el último lote, nunca pierde filas.
+- Las filas guardan una clave de sesión local (stream + arranque); la sesión
+  remota se resuelve al subir, de modo que un viaje que empieza sin red también
+  queda registrado. El mapeo clave -> id remoto se guarda en el mismo archivo.
+- max_rows acota el disco en viajes muy largos sin red (o mientras una tabla
+  remota falla): si se excede, se descartan las filas más antiguas de las
+  tablas no críticas, primero metrics y luego metric_buckets (eventos y
+  reportes se conservan).
+- quarantine() aparta filas que el servidor rechazó de forma definitiva (tabla
+  quarantine, con el error) para que no bloqueen la subida; se conservan las
+  últimas max_quarantine por si se quieren revisar o reencolar a mano.
+
+Todos los métodos salvo append() hacen I/O y deben correr en un único hilo
+(app.py usa un executor de un hilo).
+"""
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .messages import dumps
+
+TABLES = ("metrics", "metric_buckets", "events", "window_reports")
+# Tablas no críticas, en el orden en que se descartan si el spool llega a su tope
+TRIM_TABLES = ("metrics", "metric_buckets")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    session_key TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_tbl_seq ON records (tbl, seq);
+CREATE TABLE IF NOT EXISTS cursors (
+    tbl TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_key TEXT PRIMARY KEY,
+    remote_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quarantine (
+    seq INTEGER PRIMARY KEY,
+    tbl TEXT NOT NULL,
+    session_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT,
+    ts REAL NOT NULL
+);
+"""
+
+
+class Spool:
+    def __init__(self, path: str, max_rows: int = 2_000_000, max_quarantine: int = 10_000):
+        self.path = path
+        self.max_rows = max(1000, int(max_rows))
+        self.max_quarantine = max(1, int(max_quarantine))
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # FULL: cada commit (lote) llega al disco antes de retornar
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, str, str]] = []
+        self._cursors: Dict[str, int] = dict(self._db.execute("SELECT tbl, seq FROM cursors"))
+        self._sessions: Dict[str, int] = dict(self._db.execute("SELECT session_key, remote_id FROM sessions"))
+        self._backlog: Dict[str, int] = {t: 0 for t in TABLES}
+        for tbl, n in self._db.execute("SELECT tbl, COUNT(*) FROM records GROUP BY tbl"):
+            self._backlog[tbl] = n
+        self._quarantined: Dict[str, int] = dict(
+            self._db.execute("SELECT tbl, COUNT(*) FROM quarantine GROUP BY tbl"))
+        self.synced = 0
+        self.uploaded = 0
+        self.trimmed = 0
+
+    # ---- escritura ----
+    def append(self, table: str, session_key: str, row: Dict[str, Any]) -> None:
+        """Encola la fila en memoria; llega al disco en el próximo sync()."""
+        item = (table, session_key, dumps(row))
+        with self._lock:
+            self._pending.append(item)
+
+    @property
+    def pending(self) -> int:
+        """Filas encoladas que aún no llegaron al disco."""
+        with self._lock:
+            return len(self._pending)
+
+    def sync(self) -> int:
+        """Escribe lo pendiente en una transacción (un fsync). Retorna filas escritas."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO records (tbl, session_key, payload) VALUES (?, ?, ?)", batch)
+        for table, _, _ in batch:
+            self._backlog[table] = self._backlog.get(table, 0) + 1
+        self.synced += len(batch)
+        self._trim()
+        return len(batch)
+
+    def _trim(self) -> None:
+        excess = sum(self._backlog.values()) - self.max_rows
+        if excess <= 0:
+            return
+        dropped: Dict[str, int] = {}
+        with self._db:
+            self._db.execute("BEGIN")
+            for table in TRIM_TABLES:
+                if excess <= 0:
+                    break
+                cur = self._db.execute(
+                    "DELETE FROM records WHERE seq IN "
+                    "(SELECT seq FROM records WHERE tbl = ? ORDER BY seq LIMIT ?)",
+                    (table, excess),
+                )
+                if cur.rowcount:
+                    dropped[table] = cur.rowcount
+                    excess -= cur.rowcount
+        for table, n in dropped.items():
+            self._backlog[table] = max(0, self._backlog[table] - n)
+            self.trimmed += n
+        if dropped:
+            print(f"[spool] tope de {self.max_rows} filas: descartadas las más antiguas {dropped}")
+
+    # ---- subida ----
+    def read_batch(self, table: str, limit: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Siguientes filas de `table` después del cursor: (seq, clave de sesión, fila)."""
+        rows = self._db.execute(
+            "SELECT seq, session_key, payload FROM records WHERE tbl = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (table, self._cursors.get(table, 0), limit),
+        ).fetchall()
+        return [(seq, key, json.loads(payload)) for seq, key, payload in rows]
+
+    def ack(self, table: str, seq: int) -> None:
+        """Lote subido hasta `seq`: avanza el cursor y libera las filas."""
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO cursors (tbl, seq) VALUES (?, ?) "
+                "ON CONFLICT(tbl) DO UPDATE SET seq = excluded.seq",
+                (table, seq),
+            )
+            cur = self._db.execute("DELETE FROM records WHERE tbl = ? AND seq <= ?", (table, seq))
+        self._cursors[table] = seq
+        self._backlog[table] = max(0, self._backlog.get(table, 0) - cur.rowcount)
+        self.uploaded += cur.rowcount
+
+    def quarantine(self, table: str, seqs: List[int], error: str) -> int:
+        """Mueve las filas `seqs` de `table` a cuarentena (no se vuelven a subir)."""
+        if not seqs:
+            return 0
+        marks = ",".join("?" * len(seqs))
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                f"INSERT OR REPLACE INTO quarantine (seq, tbl, session_key, payload, error, ts) "
+                f"SELECT seq, tbl, session_key, payload, ?, strftime('%s', 'now') FROM records "
+                f"WHERE tbl = ? AND seq IN ({marks})",
+                (error[:500], table, *seqs),
+            )
+            cur = self._db.execute(f"DELETE FROM records WHERE tbl = ? AND seq IN ({marks})", (table, *seqs))
+            self._db.execute(
+                "DELETE FROM quarantine WHERE seq IN "
+                "(SELECT seq FROM quarantine ORDER BY seq DESC LIMIT -1 OFFSET ?)",
+                (self.max_quarantine,),
+            )
+        self._backlog[table] = max(0, self._backlog.get(table, 0) - cur.rowcount)
+        self._quarantined = dict(self._db.execute("SELECT tbl, COUNT(*) FROM quarantine GROUP BY tbl"))
+        return cur.rowcount
+
+    # ---- sesiones ----
+    def remote_session(self, session_key: str) -> Optional[int]:
+        return self._sessions.get(session_key)
+
+    def bind_session(self, session_key: str, remote_id: int) -> None:
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_key, remote_id) VALUES (?, ?)",
+                (session_key, remote_id),
+            )
+        self._sessions[session_key] = remote_id
+
+    # ---- estado ----
+    def backlog(self) -> Dict[str, int]:
+        return dict(self._backlog)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending": self.pending,
+            "backlog": self.backlog(),
+            "cursors": dict(self._cursors),
+            "synced": self.synced,
+            "uploaded": self.uploaded,
+            "trimmed": self.trimmed,
+            "quarantined": dict(self._quarantined),
+            "max_rows": self.max_rows,
+        }
+
+    def close(self) -> None:
+        self.sync()
+        self._db.close()
@@ -0,0 +1,139 @@
+# runtime/timeseries.py
+"""
+Serie temporal local por stream: ring de tamaño fijo en columnas numpy sobre un
+archivo mapeado en memoria, así las últimas horas de métricas por frame
+sobreviven a un reinicio sin pasar por la red ni por la DB.
+
+Formato del archivo: cabecera int64[8] (magic, versión, capacidad, columnas,
+próxima posición, filas escritas), luego ts float64[capacidad] y después
+float32[columnas, capacidad] (cada columna contigua). Si la capacidad o las
+columnas no coinciden con el archivo existente, se recrea vacío.
+
+query() devuelve la serie decimada por min/max: el rango se parte en N bins y
+por cada uno se reporta el mínimo y el máximo de cada columna, de modo que un
+pico de un frame no desaparece al pedir horas en unos cientos de puntos.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+_MAGIC = 0x534F4D4E4F5453  # "SOMNOTS"
+_VERSION = 1
+_HEADER = 8
+_H_CAP, _H_COLS, _H_HEAD, _H_COUNT = 2, 3, 4, 5
+
+
+class TimeSeriesStore:
+    def __init__(self, path: str, columns: Sequence[str], capacity: int):
+        self.path = path
+        self.columns = tuple(columns)
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        ncols = len(self.columns)
+        size = 8 * _HEADER + 8 * self.capacity + 4 * ncols * self.capacity
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        if not fresh:
+            header = np.memmap(path, dtype=np.int64, mode="r", shape=(_HEADER,))
+            fresh = (int(header[0]) != _MAGIC or int(header[1]) != _VERSION
+                     or int(header[_H_CAP]) != self.capacity or int(header[_H_COLS]) != ncols)
+            del header
+        if fresh:
+            with open(path, "wb") as fh:
+                fh.truncate(size)
+        self._header = np.memmap(path, dtype=np.int64, mode="r+", shape=(_HEADER,))
+        self._ts = np.memmap(path, dtype=np.float64, mode="r+", offset=8 * _HEADER, shape=(self.capacity,))
+        self._values = np.memmap(path, dtype=np.float32, mode="r+",
+                                 offset=8 * _HEADER + 8 * self.capacity, shape=(ncols, self.capacity))
+        if fresh:
+            self._header[:] = [_MAGIC, _VERSION, self.capacity, ncols, 0, 0, 0, 0]
+        self._head = int(self._header[_H_HEAD])
+        self._count = int(self._header[_H_COUNT])
+        self._col_index = {c: i for i, c in enumerate(self.columns)}
+
+    # ---- escritura ----
+    def append(self, ts: float, values: Dict[str, Optional[float]]) -> None:
+        """Una fila; las columnas ausentes o None quedan como NaN."""
+        row = [values.get(c) for c in self.columns]
+        with self._lock:
+            i = self._head
+            self._ts[i] = ts
+            self._values[:, i] = [np.nan if v is None else v for v in row]
+            self._head = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._header[_H_HEAD] = self._head
+            self._header[_H_COUNT] = self._count
+
+    def flush(self) -> None:
+        with self._lock:
+            self._header.flush()
+            self._ts.flush()
+            self._values.flush()
+
+    # ---- lectura ----
+    def _ordered(self, t0: float, t1: float, cols: List[int]):
+        """Copia (ts, valores) dentro de [t0, t1] en orden de escritura."""
+        with self._lock:
+            count, head = self._count, self._head
+            if count < self.capacity:
+                order = np.arange(count)
+            else:
+                order = np.concatenate([np.arange(head, self.capacity), np.arange(0, head)])
+            ts = self._ts[order]
+            mask = (ts >= t0) & (ts <= t1)
+            idx = order[mask]
+            return ts[mask], self._values[np.ix_(cols, idx)]
+
+    def query(self, t0: float, t1: float, points: int = 500,
+              columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        names = [c for c in (columns or self.columns) if c in self._col_index]
+        points = max(1, int(points))
+        span = max(t1 - t0, 1e-9)
+        ts, values = self._ordered(t0, t1, [self._col_index[c] for c in names])
+        out: Dict[str, Any] = {
+            "from": t0,
+            "to": t1,
+            "resolution": span / points,
+            "rows": int(ts.size),
+            "ts": [],
+            "count": [],
+            "series": {c: {"min": [], "max": []} for c in names},
+        }
+        if ts.size == 0:
+            return out
+        bins = np.minimum(((ts - t0) / span * points).astype(np.int64), points - 1)
+        # Orden estable por bin (el reloj de pared puede retroceder un poco)
+        order = np.argsort(bins, kind="stable")
+        bins, values = bins[order], values[:, order]
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        counts = np.diff(np.r_[starts, bins.size])
+        with np.errstate(invalid="ignore"):
+            mins = np.fmin.reduceat(values, starts, axis=1)
+            maxs = np.fmax.reduceat(values, starts, axis=1)
+        out["ts"] = np.round(t0 + bins[starts] * (span / points), 3).tolist()
+        out["count"] = counts.tolist()
+        for i, c in enumerate(names):
+            out["series"][c] = {
+                "min": [None if np.isnan(v) else round(float(v), 4) for v in mins[i]],
+                "max": [None if np.isnan(v) else round(float(v), 4) for v in maxs[i]],
+            }
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, head = self._count, self._head
+            oldest = float(self._ts[head if count == self.capacity else 0]) if count else None
+            newest = float(self._ts[(head - 1) % self.capacity]) if count else None
+        return {
+            "path": self.path,
+            "capacity": self.capacity,
+            "rows": count,
+            "oldest": round(oldest, 3) if oldest is not None else None,
+            "newest": round(newest, 3) if newest is not None else None,
+        }
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            del self._header, self._ts, self._values
@@ -0,0 +1,146 @@
+# runtime/ws_protocol.py
+"""
+Protocolo de /ws.
+
+- "json" (legado): un único mensaje de texto JSON por tick con las vistas previa
+  en base64 (rawFrame/processedFrame/landmarksFrame). Es el que usan los clientes
+  Flutter existentes y el valor por defecto.
+- "bin.v1": las métricas/eventos viajan como JSON de texto pequeño y cada vista
+  previa como mensaje binario: cabecera fija + bytes JPEG crudos.
+
+La negociación ocurre al conectar: subprotocolo WebSocket "somno.bin.v1"
+(Sec-WebSocket-Protocol) o, si el cliente no puede fijar cabeceras, ?protocol=bin.v1.
+
+/ingest (cliente -> servidor) usa la misma cabecera binaria, con el timestamp de
+captura del cliente y un payload según el tipo:
+- MSG_INGEST_JPEG: bytes JPEG del frame
+- MSG_INGEST_LANDMARKS: ancho, alto (uint16 big-endian) + N x 3 float32
+  little-endian con los landmarks normalizados (N = 0: sin rostro). Con rostro,
+  N debe cubrir todos los índices que usa el análisis (478 de FaceMesh con
+  refine_landmarks); con menos, el servidor cierra /ingest con 1003.
+"""
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "bin.v1"
+
+SUBPROTOCOLS = {
+    "somno.json": PROTOCOL_JSON,
+    "somno.bin.v1": PROTOCOL_BINARY,
+}
+
+BINARY_VERSION = 1
+
+# Tipos de mensaje binario
+MSG_FRAME = 1
+MSG_INGEST_JPEG = 2
+MSG_INGEST_LANDMARKS = 3
+
+# Ids de stream de vista previa
+STREAM_IDS: Dict[str, int] = {"raw": 1, "processed": 2, "landmarks": 3}
+STREAM_NAMES: Dict[int, str] = {v: k for k, v in STREAM_IDS.items()}
+
+# version, tipo, stream, flags, frame_id, ts (ms epoch) -> 16 bytes, big-endian
+HEADER = struct.Struct("!BBBBIQ")
+
+
+# ancho, alto del frame de origen de los landmarks
+LANDMARKS_HEADER = struct.Struct("!HH")
+_LANDMARK_DTYPE = np.dtype("<f4")
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class LandmarkCountError(ProtocolError):
+    """Landmarks con rostro pero menos de los que necesita el análisis."""
+
+
+def negotiate(subprotocols, query_protocol: Optional[str]) -> Tuple[str, Optional[str]]:
+    """
+    Elige el protocolo del cliente.
+    Retorna (protocolo, subprotocolo a confirmar en accept() o None).
+    """
+    for offered in subprotocols or []:
+        proto = SUBPROTOCOLS.get(offered.strip())
+        if proto is not None:
+            return proto, offered.strip()
+    if query_protocol and query_protocol in (PROTOCOL_JSON, PROTOCOL_BINARY):
+        return query_protocol, None
+    return PROTOCOL_JSON, None
+
+
+def pack_frame(stream: str, frame_id: int, ts: float, jpeg: bytes) -> bytes:
+    """Mensaje binario de vista previa: cabecera + JPEG."""
+    header = HEADER.pack(
+        BINARY_VERSION,
+        MSG_FRAME,
+        STREAM_IDS[stream],
+        0,
+        frame_id & 0xFFFFFFFF,
+        int(ts * 1000),
+    )
+    return header + jpeg
+
+
+def unpack_frame(data: bytes) -> Tuple[Dict[str, object], memoryview]:
+    """Inverso de pack_frame: (cabecera, payload)."""
+    if len(data) < HEADER.size:
+        raise ProtocolError("mensaje binario demasiado corto")
+    version, msg_type, stream_id, flags, frame_id, ts_ms = HEADER.unpack_from(data)
+    if version != BINARY_VERSION:
+        raise ProtocolError(f"versión binaria no soportada: {version}")
+    header = {
+        "version": version,
+        "type": msg_type,
+        "stream": STREAM_NAMES.get(stream_id, stream_id),
+        "flags": flags,
+        "frame_id": frame_id,
+        "ts": ts_ms / 1000.0,
+    }
+    return header, memoryview(data)[HEADER.size:]
+
+
+def pack_ingest_jpeg(frame_id: int, ts: float, jpeg: bytes) -> bytes:
+    """Frame JPEG de un cliente remoto con su timestamp de captura (s epoch)."""
+    return HEADER.pack(BINARY_VERSION, MSG_INGEST_JPEG, 0, 0, frame_id & 0xFFFFFFFF, int(ts * 1000)) + jpeg
+
+
+def pack_ingest_landmarks(frame_id: int, ts: float, width: int, height: int,
+                          points: Optional[np.ndarray]) -> bytes:
+    """Landmarks (N, 3) normalizados ya inferidos en el cliente; None = sin rostro."""
+    header = HEADER.pack(BINARY_VERSION, MSG_INGEST_LANDMARKS, 0, 0, frame_id & 0xFFFFFFFF, int(ts * 1000))
+    body = b"" if points is None else np.ascontiguousarray(points[:, :3], dtype=_LANDMARK_DTYPE).tobytes()
+    return header + LANDMARKS_HEADER.pack(width, height) + body
+
+
+def unpack_ingest(data: bytes, min_landmarks: int = 0) -> Tuple[int, int, float, Any]:
+    """
+    Mensaje de /ingest -> (tipo, frame_id, ts, payload). El payload es el JPEG
+    (memoryview) o (ancho, alto, arreglo (N, 3) float32 | None) para landmarks.
+    Con rostro, N < min_landmarks levanta LandmarkCountError.
+    """
+    header, payload = unpack_frame(data)
+    msg_type = header["type"]
+    if msg_type == MSG_INGEST_JPEG:
+        if not len(payload):
+            raise ProtocolError("frame JPEG vacío")
+        return msg_type, header["frame_id"], header["ts"], payload
+    if msg_type == MSG_INGEST_LANDMARKS:
+        if len(payload) < LANDMARKS_HEADER.size:
+            raise ProtocolError("payload de landmarks demasiado corto")
+        width, height = LANDMARKS_HEADER.unpack_from(payload)
+        body = payload[LANDMARKS_HEADER.size:]
+        if len(body) % (3 * _LANDMARK_DTYPE.itemsize):
+            raise ProtocolError("payload de landmarks no es N x 3 float32")
+        if not width or not height:
+            raise ProtocolError("tamaño de frame inválido")
+        points = np.frombuffer(body, dtype=_LANDMARK_DTYPE).reshape(-1, 3) if len(body) else None
+        if points is not None and len(points) < min_landmarks:
+            raise LandmarkCountError(f"landmarks: se requieren {min_landmarks}, llegaron {len(points)}")
+        return msg_type, header["frame_id"], header["ts"], (width, height, points)
+    raise ProtocolError(f"tipo de mensaje de ingesta no soportado: {msg_type}")
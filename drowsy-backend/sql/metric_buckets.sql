@@ -0,0 +1,27 @@
+-- sql/metric_buckets.sql
+-- Tabla de métricas agregadas por ventana (runtime/metric_buckets.py, MetricBucketer).
+-- Crear en el proyecto Supabase antes de desplegar el backend que las sube:
+--     psql "$SUPABASE_DB_URL" -f sql/metric_buckets.sql
+-- (o pegarlo en el SQL editor). Mientras no exista, las filas esperan en el
+-- spool local (acotado por SPOOL_MAX_ROWS) sin frenar la subida de eventos.
+--
+-- stats:     {señal: [min, max, media, último]} para ear, mar, yaw, pitch, roll, fused_score
+-- stage_s:   {nivel: segundos en ese nivel dentro de la ventana}
+-- reason_mask: bits estables de razón (REASON_BITS / STAGE_CRITERIA_BITS en metric_buckets.py)
+
+create table if not exists public.metric_buckets (
+    id                 bigint generated by default as identity primary key,
+    session_id         bigint not null references public.sessions (id) on delete cascade,
+    bucket_ts          double precision not null,      -- inicio de la ventana, epoch en segundos
+    bucket_s           real not null,
+    frames             integer not null,
+    stats              jsonb not null default '{}'::jsonb,
+    stage_s            jsonb not null default '{}'::jsonb,
+    drowsy_s           real not null default 0,
+    is_drowsy          boolean not null default false,
+    closed_frames_max  integer not null default 0,
+    reason_mask        integer not null default 0,
+    created_at         timestamptz not null default now()
+);
+
+create index if not exists metric_buckets_session_ts on public.metric_buckets (session_id, bucket_ts);
@@ -0,0 +1,98 @@
+# tests/test_clients.py
+"""
+WsClient: coalescencia de ticks, orden de prioritarios y desalojo de clientes
+lentos (cola llena sostenida o un envío colgado).
+
+Ejecutar desde drowsy-backend/:
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.clients import KIND_EVENT, KIND_PRIORITY, KIND_TICK, WsClient  # noqa: E402
+
+
+class FakeWs:
+    """WebSocket de prueba: registra lo enviado; `hang` deja cada envío colgado."""
+
+    def __init__(self, hang: bool = False):
+        self.hang = hang
+        self.sent = []
+        self.closed_code = None
+
+    async def send_text(self, m):
+        if self.hang:
+            await asyncio.sleep(3600)
+        self.sent.append(m)
+
+    async def send_bytes(self, m):
+        await self.send_text(m)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_code = code
+
+
+def test_ticks_coalesce_and_priority_jumps_ahead():
+    async def go():
+        ws = FakeWs()
+        client = WsClient(ws, max_queue=32)
+        client.enqueue(["tick-1"], KIND_TICK)
+        client.enqueue(["event-1"], KIND_EVENT)
+        client.enqueue(["tick-2"], KIND_TICK)
+        client.enqueue(["tick-3"], KIND_TICK)
+        client.enqueue(["alarm"], KIND_PRIORITY)
+        assert client.coalesced == 2
+        client.start()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        client.close()
+        return ws, client
+
+    ws, client = asyncio.run(go())
+    # Solo sobrevive el último tick; el prioritario sale primero y el evento no se pierde
+    assert ws.sent == ["alarm", "event-1", "tick-3"]
+    assert client.sent == 3
+
+
+def test_sustained_overflow_evicts_with_1013():
+    async def go():
+        ws = FakeWs()
+        client = WsClient(ws, max_queue=2, evict_after_s=0.0)
+        # Sin tarea emisora: la cola solo crece (los eventos nunca se descartan)
+        for i in range(3):
+            client.enqueue([f"event-{i}"], KIND_EVENT)
+        assert not client.closed          # primera vez por encima: empieza a contar
+        client.enqueue(["event-3"], KIND_EVENT)
+        await asyncio.sleep(0)
+        return ws, client
+
+    ws, client = asyncio.run(go())
+    assert client.closed and ws.closed_code == 1013
+    assert client.stats()["queue"] == 0
+
+
+def test_short_overflow_is_tolerated():
+    async def go():
+        client = WsClient(FakeWs(), max_queue=2, evict_after_s=60.0)
+        for i in range(5):
+            client.enqueue([f"event-{i}"], KIND_EVENT)
+        return client
+
+    assert not asyncio.run(go()).closed
+
+
+def test_hung_send_evicts_with_1013():
+    async def go():
+        ws = FakeWs(hang=True)
+        client = WsClient(ws, max_queue=32, evict_after_s=0.05)
+        client.start()
+        client.enqueue(["event"], KIND_EVENT)
+        await asyncio.sleep(0.2)
+        return ws, client
+
+    ws, client = asyncio.run(go())
+    assert client.closed and ws.closed_code == 1013
+    assert ws.sent == []
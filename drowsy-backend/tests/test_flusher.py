@@ -0,0 +1,99 @@
+# tests/test_flusher.py
+"""
+Flusher sobre un Spool real (SQLite en un directorio temporal) con un insert
+simulado: una fila que el servidor rechaza siempre y un timeout a mitad del
+aislamiento. Nada de lo ya subido se debe volver a subir.
+
+Ejecutar desde drowsy-backend/:
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.flusher import Flusher  # noqa: E402
+from runtime.rest_writer import WriteError  # noqa: E402
+from runtime.spool import Spool  # noqa: E402
+
+POISON = 3
+
+
+def _flusher(spool, insert, limit=8):
+    async def read_batch(table, n):
+        return spool.read_batch(table, n)
+
+    async def prepare(table, batch):
+        return [row for _, _, row in batch]
+
+    async def ack(table, batch):
+        spool.ack(table, batch[-1][0])
+
+    async def quarantine(table, batch, error):
+        spool.quarantine(table, [seq for seq, _, _ in batch], error)
+
+    return Flusher({"metrics": limit}, read_batch, prepare, insert, ack, quarantine=quarantine)
+
+
+def test_isolation_does_not_reinsert_after_retryable_failure(tmp_path):
+    spool = Spool(str(tmp_path / "spool.db"))
+    for i in range(8):
+        spool.append("metrics", "cam:1", {"i": i})
+    spool.sync()
+
+    inserted = []
+    timeouts = []
+
+    async def insert(table, rows):
+        ids = [r["i"] for r in rows]
+        if POISON in ids:
+            raise WriteError("HTTP 400 columna inexistente", status=400, retryable=False)
+        if 6 in ids and not timeouts:
+            # Segunda mitad del lote: la primera vez se corta la red
+            timeouts.append(ids)
+            raise WriteError("ReadTimeout")
+        inserted.extend(ids)
+        return True
+
+    flusher = _flusher(spool, insert)
+    assert asyncio.run(flusher.drain()) is False
+    assert timeouts == [[4, 5, 6, 7]]
+    # Lo confirmado antes del timeout ya salió del spool; queda solo la parte que falló
+    assert [row["i"] for _, _, row in spool.read_batch("metrics", 100)] == [4, 5, 6, 7]
+
+    assert asyncio.run(flusher.drain(force={"metrics"})) is True
+    assert sorted(inserted) == [0, 1, 2, 4, 5, 6, 7]
+    assert len(inserted) == len(set(inserted))
+    assert spool.backlog()["metrics"] == 0
+    assert spool.stats()["quarantined"] == {"metrics": 1}
+    assert flusher.table_stats["metrics"].quarantined == 1
+    spool.close()
+
+
+def test_failed_table_backs_off_alone(tmp_path):
+    spool = Spool(str(tmp_path / "spool.db"))
+    spool.append("metrics", "cam:1", {"i": 0})
+    spool.append("events", "cam:1", {"i": 1})
+    spool.sync()
+
+    async def read_batch(table, n):
+        return spool.read_batch(table, n)
+
+    async def prepare(table, batch):
+        return [row for _, _, row in batch]
+
+    async def insert(table, rows):
+        if table == "metrics":
+            raise WriteError("HTTP 503", status=503)
+        return True
+
+    async def ack(table, batch):
+        spool.ack(table, batch[-1][0])
+
+    flusher = Flusher({"metrics": 10, "events": 10}, read_batch, prepare, insert, ack)
+    assert asyncio.run(flusher.drain()) is False
+    assert flusher.table_stats["metrics"].backoff_s > 0
+    assert flusher.table_stats["events"].backoff_s == 0
+    assert spool.backlog() == {"metrics": 1, "metric_buckets": 0, "events": 0, "window_reports": 0}
+    spool.close()
@@ -0,0 +1,95 @@
+# tests/test_rest_writer.py
+"""
+PostgrestWriter contra un PostgREST simulado con httpx.MockTransport: reintento
+ante 503, vuelta a JSON sin comprimir ante 415 y WriteError ante un 4xx definitivo.
+
+Ejecutar desde drowsy-backend/:
+    python -m pytest -q tests
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.rest_writer import PostgrestWriter, WriteError  # noqa: E402
+
+ROWS = [{"session_id": 1, "ts": 1700000000000 + i, "ear": 0.25} for i in range(3)]
+
+
+def _writer(handler, **kwargs):
+    # backoff 0: los reintentos no duermen
+    return PostgrestWriter("http://postgrest.test", transport=httpx.MockTransport(handler),
+                           backoff_s=0.0, backoff_max_s=0.0, **kwargs)
+
+
+def _body(request: httpx.Request):
+    raw = request.content
+    if request.headers.get("Content-Encoding") == "gzip":
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
+
+def _run(writer, coro):
+    async def go():
+        try:
+            return await coro
+        finally:
+            await writer.aclose()
+    return asyncio.run(go())
+
+
+def test_retries_503_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503, text="unavailable")
+        return httpx.Response(201)
+
+    writer = _writer(handler)
+    assert _run(writer, writer.insert("metrics", ROWS)) == []
+    assert len(calls) == 2
+    assert [_body(r) for r in calls] == [ROWS, ROWS]
+    assert calls[0].url.path == "/metrics"
+    assert calls[0].headers["Prefer"] == "return=minimal"
+    assert writer.retries == 1 and writer.failures == 0
+
+
+def test_415_on_gzip_falls_back_to_plain_json():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if request.headers.get("Content-Encoding") == "gzip":
+            return httpx.Response(415, text="unsupported media type")
+        return httpx.Response(201, json=[{"id": 7}])
+
+    writer = _writer(handler, gzip_min_bytes=0)
+    assert _run(writer, writer.insert("events", ROWS, returning=True)) == [{"id": 7}]
+    assert [r.headers.get("Content-Encoding") for r in calls] == ["gzip", None]
+    assert json.loads(calls[1].content) == ROWS
+    # El 415 no cuenta como reintento y gzip queda apagado para lo que sigue
+    assert writer.gzip is False and writer.retries == 0
+
+
+def test_4xx_raises_write_error_without_retry():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"message": "column \"ear\" does not exist"})
+
+    writer = _writer(handler)
+    with pytest.raises(WriteError) as info:
+        _run(writer, writer.insert("metrics", ROWS))
+    assert info.value.status == 400
+    assert info.value.retryable is False
+    assert len(calls) == 1
+    assert writer.failures == 1 and writer.retries == 0
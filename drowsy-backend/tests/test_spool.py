@@ -0,0 +1,106 @@
+# tests/test_spool.py
+"""
+Spool local (SQLite WAL): append/sync, lectura por cursor y ack, reapertura,
+tope de filas con descarte de tablas no críticas y cuarentena.
+
+Ejecutar desde drowsy-backend/:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.spool import Spool  # noqa: E402
+
+
+def _fill(spool, table, n, start=0):
+    for i in range(start, start + n):
+        spool.append(table, "cam:1", {"i": i})
+
+
+def _ids(spool, table, limit=10_000):
+    return [row["i"] for _, _, row in spool.read_batch(table, limit)]
+
+
+def test_append_sync_read_ack(tmp_path):
+    spool = Spool(str(tmp_path / "spool.db"))
+    _fill(spool, "metrics", 5)
+    _fill(spool, "events", 2)
+    # append() solo encola en memoria
+    assert spool.pending == 7 and _ids(spool, "metrics") == []
+    assert spool.sync() == 7
+    assert spool.pending == 0
+
+    batch = spool.read_batch("metrics", 3)
+    assert [row["i"] for _, _, row in batch] == [0, 1, 2]
+    assert all(key == "cam:1" for _, key, _ in batch)
+    spool.ack("metrics", batch[-1][0])
+    assert _ids(spool, "metrics") == [3, 4]
+    assert _ids(spool, "events") == [0, 1]
+    assert spool.backlog()["metrics"] == 2
+    assert spool.stats()["uploaded"] == 3
+    spool.close()
+
+
+def test_reopen_keeps_cursor_backlog_and_sessions(tmp_path):
+    path = str(tmp_path / "spool.db")
+    spool = Spool(path)
+    _fill(spool, "metrics", 4)
+    spool.sync()
+    spool.ack("metrics", spool.read_batch("metrics", 2)[-1][0])
+    spool.bind_session("cam:1", 42)
+    _fill(spool, "events", 1)
+    spool.close()   # close() también sincroniza lo pendiente
+
+    spool = Spool(path)
+    assert _ids(spool, "metrics") == [2, 3]
+    assert _ids(spool, "events") == [0]
+    assert spool.backlog()["metrics"] == 2 and spool.backlog()["events"] == 1
+    assert spool.remote_session("cam:1") == 42
+    spool.close()
+
+
+def test_trim_drops_oldest_metrics_first(tmp_path):
+    spool = Spool(str(tmp_path / "spool.db"), max_rows=1000)
+    _fill(spool, "metrics", 900)
+    _fill(spool, "metric_buckets", 200)
+    _fill(spool, "events", 50)
+    spool.sync()
+    assert spool.backlog() == {"metrics": 750, "metric_buckets": 200, "events": 50, "window_reports": 0}
+    assert _ids(spool, "metrics")[0] == 150
+    assert spool.stats()["trimmed"] == 150
+    spool.close()
+
+
+def test_trim_continues_with_metric_buckets_and_keeps_events(tmp_path):
+    spool = Spool(str(tmp_path / "spool.db"), max_rows=1000)
+    _fill(spool, "metrics", 100)
+    _fill(spool, "metric_buckets", 1000)
+    _fill(spool, "events", 50)
+    spool.sync()
+    assert spool.backlog() == {"metrics": 0, "metric_buckets": 950, "events": 50, "window_reports": 0}
+    assert _ids(spool, "metric_buckets")[0] == 50
+    assert _ids(spool, "events") == list(range(50))
+    spool.close()
+
+
+def test_quarantine_moves_rows_out_of_the_upload_path(tmp_path):
+    spool = Spool(str(tmp_path / "spool.db"), max_quarantine=2)
+    _fill(spool, "events", 5)
+    spool.sync()
+    seqs = [seq for seq, _, _ in spool.read_batch("events", 5)]
+
+    assert spool.quarantine("events", [seqs[1]], "HTTP 400 columna inexistente") == 1
+    assert _ids(spool, "events") == [0, 2, 3, 4]
+    assert spool.backlog()["events"] == 4
+    assert spool.stats()["quarantined"] == {"events": 1}
+
+    # Solo se conservan las últimas max_quarantine
+    spool.quarantine("events", [seqs[2], seqs[3]], "HTTP 400")
+    assert spool.stats()["quarantined"] == {"events": 2}
+    assert _ids(spool, "events") == [0, 4]
+    # Un seq de otra tabla no se toca
+    assert spool.quarantine("metrics", [seqs[0]], "x") == 0
+    assert _ids(spool, "events") == [0, 4]
+    spool.close()
@@ -0,0 +1,76 @@
+# tests/test_timeseries.py
+"""
+TimeSeriesStore: ring sobre archivo mapeado en memoria. Vuelta completa del
+ring, reapertura del mismo archivo y recreación si cambia la forma.
+
+Ejecutar desde drowsy-backend/:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.timeseries import TimeSeriesStore  # noqa: E402
+
+COLUMNS = ("ear", "mar")
+
+
+def test_wrap_around_keeps_the_newest_rows(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "ts.bin"), COLUMNS, capacity=5)
+    for i in range(8):
+        store.append(float(i), {"ear": i / 10, "mar": None})
+    stats = store.stats()
+    assert stats["rows"] == 5
+    assert (stats["oldest"], stats["newest"]) == (3.0, 7.0)
+
+    out = store.query(0.0, 10.0, points=10)
+    assert out["rows"] == 5
+    assert out["ts"] == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert out["series"]["ear"]["min"] == [0.3, 0.4, 0.5, 0.6, 0.7]
+    # Columna nunca escrita: NaN -> None
+    assert out["series"]["mar"]["max"] == [None] * 5
+    store.close()
+
+
+def test_reopen_resumes_where_it_left(tmp_path):
+    path = str(tmp_path / "ts.bin")
+    store = TimeSeriesStore(path, COLUMNS, capacity=4)
+    for i in range(6):
+        store.append(float(i), {"ear": float(i), "mar": 1.0})
+    store.close()
+
+    store = TimeSeriesStore(path, COLUMNS, capacity=4)
+    assert store.stats()["rows"] == 4
+    store.append(6.0, {"ear": 6.0, "mar": 1.0})
+    out = store.query(0.0, 10.0, points=10)
+    assert out["ts"] == [3.0, 4.0, 5.0, 6.0]
+    assert out["series"]["ear"]["max"] == [3.0, 4.0, 5.0, 6.0]
+    store.close()
+
+
+def test_shape_change_recreates_the_file(tmp_path):
+    path = str(tmp_path / "ts.bin")
+    store = TimeSeriesStore(path, COLUMNS, capacity=4)
+    store.append(1.0, {"ear": 0.2, "mar": 0.3})
+    store.close()
+
+    store = TimeSeriesStore(path, COLUMNS, capacity=8)
+    assert store.stats()["rows"] == 0
+    store.close()
+    store = TimeSeriesStore(path, COLUMNS + ("pitch",), capacity=8)
+    assert store.stats()["rows"] == 0
+    store.close()
+
+
+def test_query_decimates_by_min_max(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "ts.bin"), COLUMNS, capacity=100)
+    for i in range(100):
+        # Un pico de un solo frame no se pierde al decimar
+        store.append(i / 10, {"ear": 0.9 if i == 42 else 0.3, "mar": 0.5})
+    out = store.query(0.0, 10.0, points=5)
+    assert out["rows"] == 100
+    assert sum(out["count"]) == 100 and len(out["count"]) == 5
+    assert max(out["series"]["ear"]["max"]) == 0.9
+    assert min(out["series"]["ear"]["min"]) == 0.3
+    store.close()
@@ -0,0 +1,89 @@
+# tests/test_ws_protocol.py
+"""
+Formato binario de /ws y /ingest: ida y vuelta de pack_frame/unpack_frame y de
+los mensajes de ingesta, y rechazo de landmarks insuficientes.
+
+Ejecutar desde drowsy-backend/:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.ws_protocol import (  # noqa: E402
+    HEADER, MSG_FRAME, MSG_INGEST_JPEG, MSG_INGEST_LANDMARKS,
+    LandmarkCountError, ProtocolError,
+    pack_frame, pack_ingest_jpeg, pack_ingest_landmarks, unpack_frame, unpack_ingest,
+)
+
+JPEG = b"\xff\xd8fake-jpeg\xff\xd9"
+
+
+def test_frame_round_trip():
+    data = pack_frame("processed", 7, 1700000000.123, JPEG)
+    assert len(data) == HEADER.size + len(JPEG)
+    header, payload = unpack_frame(data)
+    assert header["type"] == MSG_FRAME
+    assert header["stream"] == "processed"
+    assert header["frame_id"] == 7
+    assert header["ts"] == pytest.approx(1700000000.123, abs=1e-3)
+    assert bytes(payload) == JPEG
+
+
+def test_frame_id_wraps_to_32_bits():
+    header, _ = unpack_frame(pack_frame("raw", 2 ** 32 + 5, 1.0, JPEG))
+    assert header["frame_id"] == 5
+
+
+def test_unpack_frame_rejects_short_and_unknown_version():
+    with pytest.raises(ProtocolError):
+        unpack_frame(b"\x01\x01")
+    data = bytearray(pack_frame("raw", 1, 1.0, JPEG))
+    data[0] = 99
+    with pytest.raises(ProtocolError):
+        unpack_frame(bytes(data))
+
+
+def test_ingest_jpeg_round_trip():
+    msg_type, frame_id, ts, payload = unpack_ingest(pack_ingest_jpeg(3, 12.5, JPEG))
+    assert (msg_type, frame_id) == (MSG_INGEST_JPEG, 3)
+    assert ts == pytest.approx(12.5)
+    assert bytes(payload) == JPEG
+    with pytest.raises(ProtocolError):
+        unpack_ingest(pack_ingest_jpeg(3, 12.5, b""))
+
+
+def test_ingest_landmarks_round_trip():
+    points = np.random.default_rng(0).random((478, 3)).astype(np.float32)
+    msg_type, frame_id, ts, (w, h, out) = unpack_ingest(
+        pack_ingest_landmarks(9, 2.0, 640, 480, points), min_landmarks=474)
+    assert (msg_type, frame_id, w, h) == (MSG_INGEST_LANDMARKS, 9, 640, 480)
+    assert out.dtype == np.float32 and out.shape == (478, 3)
+    assert np.array_equal(out, points)
+
+
+def test_ingest_landmarks_without_face():
+    _, _, _, (w, h, out) = unpack_ingest(pack_ingest_landmarks(1, 0.0, 640, 480, None), min_landmarks=474)
+    assert (w, h, out) == (640, 480, None)
+
+
+def test_ingest_landmarks_below_required_count():
+    data = pack_ingest_landmarks(1, 0.0, 640, 480, np.zeros((468, 3), dtype=np.float32))
+    with pytest.raises(LandmarkCountError, match="474.*468"):
+        unpack_ingest(data, min_landmarks=474)
+    # Sin mínimo pedido se acepta tal cual
+    assert unpack_ingest(data)[3][2].shape == (468, 3)
+
+
+def test_ingest_landmarks_malformed():
+    good = pack_ingest_landmarks(1, 0.0, 640, 480, np.zeros((10, 3), dtype=np.float32))
+    with pytest.raises(ProtocolError):
+        unpack_ingest(good[:-2])            # no es N x 3 float32
+    with pytest.raises(ProtocolError):
+        unpack_ingest(pack_ingest_landmarks(1, 0.0, 0, 480, None))   # tamaño inválido
+    with pytest.raises(ProtocolError):
+        unpack_ingest(pack_frame("raw", 1, 1.0, JPEG))               # tipo no de ingesta
@@ -21,6 +21,8 @@ class DrowsySocket {
   bool _disposed = false;
   int _retryAttempts = 0;
   bool _connected = false;
+  // Umbrales/pesos/cámara del último mensaje 'config': las métricas solo traen configVersion
+  Map<String, dynamic> _configFields = const {};
 
   final _metricsController = StreamController<MetricsPayload>.broadcast();
   final _eventsController = StreamController<DrowsyEvent>.broadcast();
@@ -96,6 +98,13 @@ class DrowsySocket {
       }
 
       final messageType = decoded['message_type'] as String?;
+      if (messageType == 'config') {
+        final fields = decoded['metrics'];
+        if (fields is Map<String, dynamic>) {
+          _configFields = fields;
+        }
+        return;
+      }
       if (messageType == 'event' || decoded.containsKey('type')) {
         final event = _parseEvent(decoded);
         if (event != null && !_eventsController.isClosed) {
@@ -105,7 +114,7 @@ class DrowsySocket {
       }
 
       if (!_metricsController.isClosed) {
-        final payload = MetricsPayload.fromJson(decoded);
+        final payload = MetricsPayload.fromJson({..._configFields, ...decoded});
         _metricsController.add(payload);
       }
     } catch (_) {
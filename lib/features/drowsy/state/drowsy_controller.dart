@@ -193,6 +193,8 @@ class DrowsyController extends AsyncNotifier<DrowsyMetrics?> {
   bool _audioUnlocked = !kIsWeb; // en web arrancamos bloqueados
   Timer? _reconnectTimer;
   int _reconnectAttempts = 0;
+  // Umbrales/pesos/cámara del último mensaje 'config': las métricas solo traen configVersion
+  Map<String, dynamic> _configFields = const {};
   static const int _maxReconnectAttempts = 5;
   final _eventsCtrl = StreamController<DrowsyEvent>.broadcast();
 
@@ -254,6 +256,10 @@ class DrowsyController extends AsyncNotifier<DrowsyMetrics?> {
           final rawType = map['type'] as String?;
 
           if (messageType == 'config') {
+            final fields = map['metrics'];
+            if (fields is Map<String, dynamic>) {
+              _configFields = fields;
+            }
             return;
           }
 
@@ -266,7 +272,7 @@ class DrowsyController extends AsyncNotifier<DrowsyMetrics?> {
             return;
           }
 
-          final metrics = DrowsyMetrics.fromMap(map);
+          final metrics = DrowsyMetrics.fromMap({..._configFields, ...map});
           state = AsyncValue.data(metrics);
           _reconnectAttempts = 0;
 